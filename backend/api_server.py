@@ -31,7 +31,11 @@ import datetime
 import sqlite3
 from urllib.parse import urlencode
 from werkzeug.middleware.proxy_fix import ProxyFix
-from backend.destinations.destination_router import push_to_destination
+from backend.destinations.destination_router import (
+    push_to_destination,
+    begin_buffered_pushes,
+    flush_buffered_pushes,
+)
 # Google OAuth
 from dotenv import load_dotenv
 from google_auth_oauthlib.flow import Flow
@@ -533,7 +537,9 @@ CORS(
 
 # Start scheduler moved below init_db
 
-from flask import g
+from flask import g, has_request_context
+from backend.db.postgres import acquire_connection, release_connection
+from backend.db.migrations import apply_index_migrations
 
 _system_initialized = False
 
@@ -542,6 +548,12 @@ def load_logged_user():
     global _system_initialized
     if not _system_initialized:
         init_db()
+        if os.getenv("SQL_WARM_TABLE_METADATA", "1") == "1":
+            try:
+                tables = sqlite3.warm_table_metadata()
+                print(f"[DB] Warmed table metadata for {tables} tables", flush=True)
+            except Exception as e:
+                print("[DB METADATA WARM ERROR]", e, flush=True)
         seed_test_user()
         start_scheduler()
         _system_initialized = True
@@ -559,7 +571,7 @@ def load_logged_user():
     if not session_id:
         return
 
-    con = sqlite3.connect(DB_PATH)
+    con = get_db()
     cur = con.cursor()
 
     cur.execute("""
@@ -671,10 +683,69 @@ def usage_sync_finish(response):
 
     return response
 
+# ---------------- DESTINATION WRITE BUFFER ----------------
+# Sync requests coalesce their destination pushes into right-sized batches
+# (see backend/destinations/write_buffer.py); the remainder is written when
+# the request finishes. Registered after usage_sync_finish so it runs first
+# and a failed final flush is reflected in the sync_runs status.
+
+def _is_sync_path(path):
+    return path.endswith("/sync") or "/sync/" in path
+
+@app.before_request
+def begin_destination_buffer():
+
+    if not _is_sync_path(request.path):
+        return
+
+    begin_buffered_pushes()
+
+@app.after_request
+def flush_destination_buffer(response):
+
+    if not _is_sync_path(request.path):
+        return response
+
+    try:
+        flush_buffered_pushes()
+
+    except Exception as e:
+        print("[BUFFER FLUSH ERROR]", e, flush=True)
+
+        response = jsonify({
+            "status": "failed",
+            "error": f"Destination write failed: {e}"
+        })
+        response.status_code = 500
+
+    return response
+
 @app.route("/__ping")
 def ping():
     return "IDENTITY OK"
 
+def _require_login():
+    # Internal diagnostics: a signed-in session or internal caller only.
+    if not getattr(g, "user_id", None):
+        return jsonify({"error": "unauthorized"}), 401
+    return None
+
+@app.route("/__db_pool")
+def db_pool_stats():
+    denied = _require_login()
+    if denied:
+        return denied
+    from backend.db.postgres import pool_stats
+    return jsonify(pool_stats())
+
+@app.route("/__dest_clients")
+def dest_client_stats():
+    denied = _require_login()
+    if denied:
+        return denied
+    from backend.destinations.client_pool import client_pool_stats
+    return jsonify(client_pool_stats())
+
 @auth.route("/auth/me")
 def me():
 
@@ -755,6 +826,19 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.getenv("DB_PATH", "identity.db")
 def get_db():
 
+    # Inside a request every get_db() shares one pooled connection, released
+    # in release_request_db(). Callers still get their own wrapper, so
+    # row_factory and close() stay local to each call site. It is also bound
+    # for the shim's connect(), so connectors called from the request reuse
+    # it instead of waiting on the pool for a second one.
+    if has_request_context():
+        raw = g.get("_db_raw")
+        if raw is None:
+            raw = acquire_connection()
+            g._db_raw = raw
+            sqlite3.bind_connection(raw)
+        return sqlite3.Connection(isolation_level=None, raw=raw)
+
     con = sqlite3.connect(
         DB,
         timeout=60,
@@ -768,6 +852,25 @@ def get_db():
 
     return con
 
+
+@app.teardown_request
+def release_request_db(exc):
+    raw = g.pop("_db_raw", None)
+    if raw is not None:
+        sqlite3.unbind_connection()
+        release_connection(raw)
+
+# Registered after release_request_db so it runs first (teardowns run in
+# reverse order). after_request is skipped when a sync view raised; still
+# write what the connector had already handed over, as unbuffered pushes
+# would have.
+@app.teardown_request
+def flush_destination_buffer_on_error(exc):
+    try:
+        flush_buffered_pushes()
+    except Exception as e:
+        print("[BUFFER FLUSH ERROR]", e, flush=True)
+
 from flask import request, g
 
 
@@ -1499,6 +1602,16 @@ def init_db():
     )
     """)
 
+    # Upsert key for the merging writers, comma separated ("id" or
+    # "account_id,event_id"), and write_mode "merge" / "append"; NULL
+    # for both = append (see destinations/record_keys.py).
+    cur.execute("PRAGMA table_info(destination_configs)")
+    columns = [col[1] for col in cur.fetchall()]
+    if "merge_key" not in columns:
+        cur.execute("ALTER TABLE destination_configs ADD COLUMN merge_key TEXT")
+    if "write_mode" not in columns:
+        cur.execute("ALTER TABLE destination_configs ADD COLUMN write_mode TEXT")
+
 
     # Drive
     cur.execute("""
@@ -4257,6 +4370,12 @@ def init_db():
     )
     """)
 
+    # ---------------- INDEXES (versioned) ----------------
+    try:
+        apply_index_migrations()
+    except Exception as e:
+        print("[MIGRATIONS ERROR]", e, flush=True)
+
     con.commit()
     con.close()
 
@@ -14892,6 +15011,22 @@ def save_destination():
     username = data.get("username")
     password = data.get("password")
     database = data.get("database")
+
+    # -------- MERGE KEY --------
+    # Optional upsert key ("id", "account_id,event_id" or a list);
+    # unset keeps the destination append-only.
+    merge_key = data.get("merge_key") or ""
+    if isinstance(merge_key, str):
+        merge_key = merge_key.split(",")
+    merge_key = ",".join(str(k).strip() for k in merge_key if str(k).strip()) or None
+
+    write_mode = (data.get("write_mode") or "").strip().lower() or None
+    if write_mode not in (None, "merge", "append"):
+        return jsonify({
+            "status": "error",
+            "message": "write_mode must be 'merge' or 'append'"
+        }), 400
+
     # -------- FORMAT CONTROL --------
     format_value = data.get("format")
 
@@ -14985,9 +15120,11 @@ def save_destination():
                 database_name,
                 is_active,
                 created_at,
-                format
+                format,
+                merge_key,
+                write_mode
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             uid,
             source,
@@ -14999,7 +15136,9 @@ def save_destination():
             database,
             1,   # active
             datetime.datetime.utcnow().isoformat(),
-            format_value
+            format_value,
+            merge_key,
+            write_mode
         ))
 
 
@@ -6,7 +6,10 @@ import os
 
 from urllib.parse import urlencode
 from dotenv import load_dotenv
-from backend.destinations.destination_router import push_to_destination
+from backend.destinations.destination_router import (
+    push_to_destination,
+    get_active_destinations,
+)
 
 
 DB = os.getenv("DB_PATH", "identity.db")
@@ -98,34 +101,6 @@ def save_repo_state(uid, repo_full, last_sha):
     con.close()
 
 
-# ---------------- DESTINATION ---------------- #
-
-def get_active_destination(uid):
-    con = get_db()
-    cur = con.cursor()
-
-    cur.execute("""
-        SELECT dest_type, host, port, username, password, database_name, format
-        FROM destination_configs
-        WHERE uid=? AND source=? AND is_active=1
-        LIMIT 1
-    """, (uid, SOURCE))
-
-    row = cur.fetchone()
-    con.close()
-
-    if not row:
-        return None
-
-    return {
-        "type": row[0],
-        "host": row[1],
-        "port": row[2],
-        "username": row[3],
-        "password": row[4],
-        "database_name": row[5]
-    }
-
 from backend.security.secure_fetch import fetchone_secure
 
 
@@ -355,8 +330,8 @@ def sync_github(uid):
 
             all_rows.extend(repo_new_commits)
 
-    # Push to destination
-    dest_cfg = get_active_destination(uid)
+    # Push to every active destination (one extraction, fanned out)
+    dest_cfg = get_active_destinations(uid, SOURCE)
 
     if not dest_cfg:
         return {"status": "error", "message": "No active destination"}
@@ -6,7 +6,10 @@ import time
 
 import requests
 
-from backend.destinations.destination_router import push_to_destination
+from backend.destinations.destination_router import (
+    push_to_destination,
+    get_active_destinations,
+)
 from backend.security.crypto import encrypt_value
 from backend.security.secure_fetch import fetchone_secure
 
@@ -174,34 +177,6 @@ def save_state(uid, state):
     con.close()
 
 
-def get_active_destination(uid):
-    con = get_db()
-    cur = con.cursor()
-    cur.execute(
-        """
-        SELECT dest_type, host, port, username, password, database_name, format
-        FROM destination_configs
-        WHERE uid=? AND source=? AND is_active=1
-        ORDER BY id DESC
-        LIMIT 1
-        """,
-        (uid, SOURCE),
-    )
-    row = fetchone_secure(cur)
-    con.close()
-    if not row:
-        return None
-    return {
-        "type": row.get("dest_type"),
-        "host": row.get("host"),
-        "port": row.get("port"),
-        "username": row.get("username"),
-        "password": row.get("password"),
-        "database_name": row.get("database_name"),
-        "format": row.get("format")
-    }
-
-
 def _account_display_name(account):
     profile = account.get("business_profile") or {}
     return (
@@ -348,7 +323,7 @@ def sync_stripe(uid, sync_type="historical"):
         next_sync_ts = max_created or int(datetime.datetime.utcnow().timestamp())
         save_state(uid, {"last_sync_ts": next_sync_ts})
 
-        dest_cfg = get_active_destination(uid)
+        dest_cfg = get_active_destinations(uid, SOURCE)
         if not dest_cfg:
             return {
                 "status": "success",
@@ -0,0 +1,171 @@
+"""
+Query-plan audit for the identity / metadata schema.
+
+Runs EXPLAIN over the statements the request hooks, connector status checks,
+scheduler, destination router and usage page issue most often, and reports
+every sequential scan. Each query is planned twice:
+
+  * normally — what the planner picks today (tiny tables legitimately
+    prefer a seq scan), and
+  * with enable_seqscan=off — if a Seq Scan survives, no index can serve
+    the predicate and the table is missing one.
+
+Usage (needs DATABASE_URL):
+
+    python -m backend.db.index_audit
+"""
+
+import json
+import sqlite3
+
+SAMPLE_UID = "index-audit-uid"
+SAMPLE_SOURCE = "github"
+SAMPLE_DOMAIN = "example.com"
+
+# (label, sql, params) — the real query mix, sqlite3-style placeholders
+AUDIT_QUERIES = [
+    ("session lookup",
+     "SELECT user_id FROM user_sessions WHERE session_id=?",
+     ("index-audit-session",)),
+    ("connector enabled",
+     "SELECT enabled FROM google_connections WHERE uid=? AND source=? LIMIT 1",
+     (SAMPLE_UID, SAMPLE_SOURCE)),
+    ("connector config exists",
+     "SELECT 1 FROM connector_configs WHERE uid=? AND connector=? LIMIT 1",
+     (SAMPLE_UID, SAMPLE_SOURCE)),
+    ("oauth completion",
+     "SELECT access_token FROM google_accounts WHERE uid=? AND source=? LIMIT 1",
+     (SAMPLE_UID, "gmail")),
+    ("active destination",
+     "SELECT dest_type, host FROM destination_configs "
+     "WHERE uid=? AND source=? AND is_active=1 ORDER BY id DESC LIMIT 1",
+     (SAMPLE_UID, SAMPLE_SOURCE)),
+    ("router active destinations",
+     "SELECT dest_type, host, port, username, password, database_name, format, merge_key, write_mode "
+     "FROM destination_configs WHERE uid=? AND source=? AND is_active=1 ORDER BY id DESC",
+     (SAMPLE_UID, SAMPLE_SOURCE)),
+    ("router format lookup",
+     "SELECT format FROM destination_configs "
+     "WHERE uid=? AND source=? AND dest_type=? AND is_active=1 ORDER BY id DESC LIMIT 1",
+     (SAMPLE_UID, SAMPLE_SOURCE, "s3")),
+    ("scheduler due jobs",
+     "SELECT cj.uid, cj.source, cj.sync_type, cj.schedule_time "
+     "FROM connector_jobs cj JOIN google_connections gc "
+     "ON cj.uid = gc.uid AND cj.source = gc.source "
+     "WHERE cj.enabled = 1 AND gc.enabled = 1",
+     ()),
+    ("connector job",
+     "SELECT sync_type, schedule_time FROM connector_jobs WHERE uid=? AND source=?",
+     (SAMPLE_UID, SAMPLE_SOURCE)),
+    ("usage: sessions",
+     "SELECT COUNT(*) FROM user_sessions WHERE user_id=?",
+     (SAMPLE_UID,)),
+    ("usage: api calls",
+     "SELECT COUNT(*) FROM api_usage_logs WHERE uid=?",
+     (SAMPLE_UID,)),
+    ("usage: failed syncs",
+     "SELECT COUNT(*) FROM sync_runs WHERE uid=? AND status='failed'",
+     (SAMPLE_UID,)),
+    ("usage: last push",
+     "SELECT MAX(pushed_at) FROM destination_push_logs WHERE uid=?",
+     (SAMPLE_UID,)),
+    ("sync run finish",
+     "UPDATE sync_runs SET status=? WHERE id=?",
+     ("success", "00000000-0000-0000-0000-000000000000")),
+    ("dashboard visits",
+     "SELECT uid, page_url, ts FROM visits WHERE domain=? ORDER BY ts DESC LIMIT 300",
+     (SAMPLE_DOMAIN,)),
+    ("dashboard events",
+     "SELECT uid, event, ts FROM web_events WHERE domain=? ORDER BY ts DESC LIMIT 500",
+     (SAMPLE_DOMAIN,)),
+    ("dashboard identities",
+     "SELECT uid, email FROM identity_map WHERE uid IN (?) ORDER BY created_at DESC",
+     (SAMPLE_UID,)),
+    ("recovery read",
+     "SELECT data FROM connector_sync_log WHERE uid=? AND source=? ORDER BY created_at ASC",
+     (SAMPLE_UID, SAMPLE_SOURCE)),
+]
+
+
+def _seq_scans(plan):
+    """Yield (relation, estimated rows, filter) for every Seq Scan node."""
+    if plan.get("Node Type") == "Seq Scan":
+        yield (
+            plan.get("Relation Name"),
+            plan.get("Plan Rows"),
+            plan.get("Filter"),
+        )
+    for child in plan.get("Plans", []):
+        yield from _seq_scans(child)
+
+
+def _explain(cur, sql, params):
+    cur.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+    doc = cur.fetchone()[0]
+    if isinstance(doc, str):
+        doc = json.loads(doc)
+    return doc[0]["Plan"]
+
+
+def audit_query_plans(queries=None):
+    """
+    Plan every audit query and return one finding per query:
+
+        {label, sql, seq_scans, missing_index, error}
+
+    `missing_index` lists relations that are still sequentially scanned
+    with enable_seqscan=off.
+    """
+    queries = queries or AUDIT_QUERIES
+    con = sqlite3.connect(isolation_level="DEFERRED")
+    cur = con.cursor()
+    findings = []
+
+    try:
+        for label, sql, params in queries:
+            finding = {"label": label, "sql": sql, "seq_scans": [], "missing_index": [], "error": None}
+            try:
+                finding["seq_scans"] = list(_seq_scans(_explain(cur, sql, params)))
+
+                cur.execute("SET LOCAL enable_seqscan = off")
+                forced = list(_seq_scans(_explain(cur, sql, params)))
+                finding["missing_index"] = sorted({rel for rel, _, _ in forced if rel})
+            except Exception as e:
+                finding["error"] = str(e)
+            finally:
+                # Resets enable_seqscan and clears any aborted transaction.
+                con.rollback()
+            findings.append(finding)
+    finally:
+        con.close()
+
+    return findings
+
+
+def print_report(findings):
+    missing = 0
+    for f in findings:
+        if f["error"]:
+            status = "ERROR"
+        elif f["missing_index"]:
+            status = "MISSING INDEX"
+            missing += 1
+        elif f["seq_scans"]:
+            status = "seq scan (index available)"
+        else:
+            status = "ok"
+
+        print(f"[{status}] {f['label']}")
+        for rel, rows, flt in f["seq_scans"]:
+            print(f"    Seq Scan on {rel} (est. rows={rows}) filter={flt}")
+        if f["missing_index"]:
+            print(f"    no usable index on: {', '.join(f['missing_index'])}")
+        if f["error"]:
+            print(f"    {f['error']}")
+
+    print(f"\n{len(findings)} queries audited, {missing} without a usable index")
+    return missing
+
+
+if __name__ == "__main__":
+    print_report(audit_query_plans())
@@ -0,0 +1,157 @@
+"""
+Versioned index migrations for the identity / metadata schema.
+
+init_db() only creates tables; the secondary indexes the hot request,
+scheduler and usage paths rely on live here. Each migration runs once and
+is recorded in schema_migrations, and every statement is idempotent
+(IF NOT EXISTS), so a half-applied migration is safe to re-run.
+
+Indexes are built with CREATE INDEX CONCURRENTLY on a dedicated
+autocommit connection (it cannot run inside a transaction), so building
+one on visits / web_events / api_usage_logs doesn't block writes.
+
+Primary keys already cover user_sessions(session_id),
+google_connections(uid, source) and connector_state(uid, source), and
+connector_jobs has a UNIQUE (uid, source) constraint, so those are not
+repeated here.
+"""
+
+import datetime
+import re
+import sqlite3  # the PostgreSQL-backed shim at the project root
+
+# (version, name, statements) — append only, never edit an applied entry
+INDEX_MIGRATIONS = [
+    (
+        1,
+        "connector and destination lookups",
+        [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_connector_configs_uid_connector "
+            "ON connector_configs(uid, connector)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_google_accounts_uid_source "
+            "ON google_accounts(uid, source)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_destination_configs_uid_source_active "
+            "ON destination_configs(uid, source, is_active)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_destination_configs_source_type_active "
+            "ON destination_configs(source, dest_type, is_active)",
+        ],
+    ),
+    (
+        2,
+        "scheduler",
+        [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_connector_jobs_enabled "
+            "ON connector_jobs(enabled)",
+        ],
+    ),
+    (
+        3,
+        "usage metrics",
+        [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_sessions_user_id "
+            "ON user_sessions(user_id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_destination_push_logs_uid_pushed_at "
+            "ON destination_push_logs(uid, pushed_at)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sync_runs_uid_status "
+            "ON sync_runs(uid, status)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_api_usage_logs_uid "
+            "ON api_usage_logs(uid)",
+        ],
+    ),
+    (
+        4,
+        "tracking dashboard",
+        [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_visits_domain_ts "
+            "ON visits(domain, ts)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_web_events_domain_ts "
+            "ON web_events(domain, ts)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_identity_map_uid "
+            "ON identity_map(uid)",
+        ],
+    ),
+    (
+        5,
+        "router lookups are per uid",
+        [
+            # The router's format lookup filters on uid now, which
+            # idx_destination_configs_uid_source_active serves; nothing
+            # queries by (source, dest_type) alone any more.
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_destination_configs_source_type_active",
+        ],
+    ),
+]
+
+# Serialises migrations across gunicorn workers starting at the same time.
+_MIGRATION_LOCK_KEY = 720_115_001
+
+
+_INDEX_NAME_RE = re.compile(r"(?i)\bIF NOT EXISTS\s+(\w+)")
+
+
+def _drop_invalid_index(cur, stmt):
+    # An interrupted CONCURRENTLY build leaves an INVALID index behind,
+    # which IF NOT EXISTS would skip; drop it so the build is retried.
+    match = _INDEX_NAME_RE.search(stmt)
+    if not match:
+        return
+    cur.execute("""
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = ? AND NOT i.indisvalid
+    """, (match.group(1),))
+    if cur.fetchone():
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}")
+
+
+def apply_index_migrations():
+    """
+    Apply every pending index migration on its own autocommit connection.
+
+    Returns the list of versions applied by this call.
+    """
+    con = sqlite3.connect(isolation_level=None)
+    cur = con.cursor()
+
+    try:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT,
+                applied_at TEXT
+            )
+        """)
+
+        # Session-level lock: held across the autocommitted statements.
+        cur.execute("SELECT pg_advisory_lock(?)", (_MIGRATION_LOCK_KEY,))
+        applied_now = []
+
+        try:
+            cur.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cur.fetchall()}
+
+            for version, name, statements in INDEX_MIGRATIONS:
+                if version in applied:
+                    continue
+
+                for stmt in statements:
+                    _drop_invalid_index(cur, stmt)
+                    cur.execute(stmt)
+
+                cur.execute("""
+                    INSERT OR IGNORE INTO schema_migrations
+                    (version, name, applied_at)
+                    VALUES (?, ?, ?)
+                """, (version, name, datetime.datetime.utcnow().isoformat()))
+
+                applied_now.append(version)
+                print(f"[MIGRATIONS] Applied index migration {version}: {name}", flush=True)
+
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(?)", (_MIGRATION_LOCK_KEY,))
+
+        return applied_now
+
+    finally:
+        con.close()
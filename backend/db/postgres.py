@@ -1,10 +1,222 @@
 import os
+import time
+import threading
+from collections import deque
+
 import psycopg2
-from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.pool import PoolError
 import atexit
 
+# Pool sizing / behaviour, all overridable from the environment
+POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))            # seconds to wait for a free connection
+POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "1800"))          # max connection age in seconds (0 = never)
+POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))      # validate with SELECT 1 after this much idle time
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
+
+
+class BlockingConnectionPool:
+    """
+    Thread-safe psycopg2 pool that waits for a free connection instead of
+    raising as soon as maxconn is reached.
+
+    Connections are validated on checkout (closed / idle ping), replaced once
+    older than `recycle` seconds, and every checkout is timed so stats() can
+    report wait time, hold time and saturation.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=20, timeout=30.0,
+                 recycle=1800.0, ping_after=30.0, **connect_kwargs):
+        self.dsn = dsn
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()          # (conn, last_used)
+        self._created_at = {}         # id(conn) -> creation time
+        self._checked_out = {}        # id(conn) -> checkout time
+        self._size = 0
+        self._closed = False
+
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "checkout_time_total": 0.0,
+            "checkout_time_max": 0.0,
+            "created": 0,
+            "recycled": 0,
+            "discarded": 0,
+            "peak_in_use": 0,
+        }
+
+        for _ in range(self.minconn):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic()))
+
+    # ---------------- internals ----------------
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        with self._cond:
+            self._size += 1
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats["created"] += 1
+        return conn
+
+    def _discard(self, conn, reason="discarded"):
+        with self._cond:
+            if self._created_at.pop(id(conn), None) is not None:
+                self._size -= 1
+            self._stats[reason] += 1
+            self._cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, conn, last_used):
+        if conn.closed:
+            return False
+        if self.ping_after and (time.monotonic() - last_used) >= self.ping_after:
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT 1")
+                cur.close()
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _is_expired(self, conn):
+        if not self.recycle:
+            return False
+        created = self._created_at.get(id(conn))
+        return created is not None and (time.monotonic() - created) > self.recycle
+
+    # ---------------- public API ----------------
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        while True:
+            conn = None
+            last_used = None
+            with self._cond:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolError(
+                            f"timed out after {self.timeout}s waiting for a "
+                            f"database connection (maxconn={self.maxconn})"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    # Reserve the slot before connecting outside the lock.
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created_at[id(conn)] = time.monotonic()
+                    self._stats["created"] += 1
+            elif self._is_expired(conn):
+                self._discard(conn, "recycled")
+                continue
+            elif not self._is_usable(conn, last_used):
+                self._discard(conn)
+                continue
+
+            now = time.monotonic()
+            wait = now - start
+            with self._cond:
+                self._checked_out[id(conn)] = now
+                s = self._stats
+                s["checkouts"] += 1
+                s["wait_time_total"] += wait
+                s["wait_time_max"] = max(s["wait_time_max"], wait)
+                if waited:
+                    s["waits"] += 1
+                s["peak_in_use"] = max(s["peak_in_use"], len(self._checked_out))
+            return conn
+
+    def putconn(self, conn, close=False):
+        with self._cond:
+            taken = self._checked_out.pop(id(conn), None)
+            if taken is not None:
+                held = time.monotonic() - taken
+                self._stats["checkout_time_total"] += held
+                self._stats["checkout_time_max"] = max(self._stats["checkout_time_max"], held)
+
+        broken = close or conn.closed or self._closed
+        if not broken and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            # Anything other than a clean idle session is not safe to reuse.
+            broken = True
+
+        if broken or self._is_expired(conn):
+            self._discard(conn, "discarded" if broken else "recycled")
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = [c for c, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            in_use = len(self._checked_out)
+            checkouts = s["checkouts"] or 1
+            s.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": in_use,
+                "minconn": self.minconn,
+                "maxconn": self.maxconn,
+                "saturation": in_use / self.maxconn,
+                "wait_time_avg": s["wait_time_total"] / checkouts,
+                "checkout_time_avg": s["checkout_time_total"] / checkouts,
+            })
+        return s
+
+
 # Global pool instance
 _pool = None
+_pool_lock = threading.Lock()
 
 def _get_pool():
     global _pool
@@ -12,12 +224,17 @@ def _get_pool():
         db_url = os.getenv("DATABASE_URL")
         # Ensure we don't accidentally initialize without knowing the URL
         if db_url:
-            _pool = ThreadedConnectionPool(
-                minconn=1,
-                maxconn=5,
-                dsn=db_url,
-                sslmode="require"
-            )
+            with _pool_lock:
+                if _pool is None:
+                    _pool = BlockingConnectionPool(
+                        db_url,
+                        minconn=POOL_MIN,
+                        maxconn=POOL_MAX,
+                        timeout=POOL_TIMEOUT,
+                        recycle=POOL_RECYCLE,
+                        ping_after=POOL_PING_AFTER,
+                        sslmode=DB_SSLMODE,
+                    )
     return _pool
 
 def acquire_connection():
@@ -26,7 +243,7 @@ def acquire_connection():
         # Fallback if DATABASE_URL is somehow not set but called (unlikely in prod)
         return psycopg2.connect(
             os.getenv("DATABASE_URL"),
-            sslmode="require",
+            sslmode=DB_SSLMODE,
         )
     return pool.getconn()
 
@@ -40,10 +257,15 @@ def release_connection(conn):
         except:
             pass
         finally:
-            pool.putconn(conn, close=False)
+            pool.putconn(conn)
     else:
         conn.close()
 
+def pool_stats():
+    """Wait-time, checkout-duration and saturation metrics for the metadata DB pool."""
+    pool = _get_pool()
+    return pool.stats() if pool is not None else {}
+
 # Ensure pool gets closed on app exit
 @atexit.register
 def _close_pool():
@@ -1,11 +1,17 @@
-import os
-import tempfile
-import time
 from datetime import datetime
 
-import pandas as pd
 from azure.storage.filedatalake import DataLakeServiceClient
 
+from backend.destinations.client_pool import lease_client
+from backend.destinations.object_store_writer import encode_parts, object_key
+
+
+def _connect(account_name, account_key):
+    return DataLakeServiceClient(
+        account_url=f"https://{account_name}.dfs.core.windows.net",
+        credential=account_key,
+    )
+
 
 def push_azure_datalake(dest, source, rows):
 
@@ -20,77 +26,57 @@ def push_azure_datalake(dest, source, rows):
     account_key  = dest["password"]
     base_path    = (dest.get("username") or "").strip("/")
 
-    service = DataLakeServiceClient(
-        account_url=f"https://{account_name}.dfs.core.windows.net",
-        credential=account_key,
-    )
-
-    fs_client = service.get_file_system_client(file_system=file_system)
-    try:
-        fs_client.create_file_system()
-    except Exception:
-        pass  # container already exists — safe to ignore
-
-    df = pd.DataFrame(rows)
-    for col in df.columns:
-        df[col] = df[col].astype(str)
-    df["fetched_at"] = pd.Timestamp.utcnow()
+    if fmt not in ("parquet", "iceberg", "hudi", "json"):
+        raise Exception(f"Unsupported ADLS format: {fmt}")
 
     # ------------------------------------------------------------------ #
     # FILE CREATION                                                        #
     # "iceberg" and "hudi" both write identical Parquet files.            #
-    # Table-format semantics live entirely in the lakehouse registry —    #
-    # no external catalog calls, no JVM dependency.                       #
+    # For "iceberg" the files are then committed to an Iceberg table      #
+    # (manifests + metadata, see iceberg_metadata) — no external catalog  #
+    # calls, no JVM dependency.                                           #
+    # Parts are encoded in memory and uploaded one at a time.             #
     # ------------------------------------------------------------------ #
-    if fmt in ("parquet", "iceberg", "hudi"):
-
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".parquet")
-        file_path = tmp.name
-        tmp.close()
-
-        df.to_parquet(file_path, engine="pyarrow", index=False)
-
-        extension = "parquet"
-
-    elif fmt == "json":
-
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".json")
-        file_path = tmp.name
-        tmp.close()
+    now = datetime.utcnow()
+    uploaded = 0
 
-        df.to_json(file_path, orient="records", lines=True)
+    with lease_client(dest, "azure_datalake", lambda: _connect(account_name, account_key)) as service:
+        fs_client = service.get_file_system_client(file_system=file_system)
+        try:
+            fs_client.create_file_system()
+        except Exception:
+            pass  # container already exists — safe to ignore
 
-        extension = "json"
+        table = None
+        if fmt == "iceberg":
+            from backend.destinations.iceberg_metadata import AdlsStore, IcebergTable
+            table_prefix = f"{base_path}/{source}" if base_path else source
+            table = IcebergTable(AdlsStore(fs_client, account_name), table_prefix)
+        data_files = []
 
-    else:
-        raise Exception(f"Unsupported ADLS format: {fmt}")
+        for part in encode_parts(rows, fmt, arrow_schema=table.arrow_schema() if table else None):
 
-    # ------------------------------------------------------------------ #
-    # PARTITION PATH  →  source/year=YYYY/month=MM/day=DD/file.parquet    #
-    # ------------------------------------------------------------------ #
-    now = datetime.utcnow()
+            # PARTITION PATH  →  source/year=YYYY/month=MM/day=DD/file.parquet
+            rel_path = object_key(source, part, now)
+            adls_path = f"{base_path}/{rel_path}" if base_path else rel_path
 
-    rel_path = (
-        f"{source}/"
-        f"year={now.year}/"
-        f"month={now.month:02d}/"
-        f"day={now.day:02d}/"
-        f"{source}_{int(time.time())}.{extension}"
-    )
+            print(f"[ADLS] Uploading: {adls_path} ({part.num_rows} rows, {part.size} bytes)", flush=True)
 
-    adls_path = f"{base_path}/{rel_path}" if base_path else rel_path
-    print("[ADLS] Uploading:", adls_path, flush=True)
+            file_client = fs_client.get_file_client(adls_path)
+            file_client.upload_data(part.reader(), length=part.size, overwrite=True)
+            uploaded += 1
 
-    file_client = fs_client.get_file_client(adls_path)
-    with open(file_path, "rb") as fh:
-        file_client.upload_data(fh, overwrite=True)
+            if table:
+                data_files.append(table.data_file(adls_path, part))
 
-    os.unlink(file_path)
+        if table:
+            snapshot_id = table.append(data_files)
+            print(f"[ADLS] Committed Iceberg snapshot {snapshot_id} (v{table.version}) → {table.location}", flush=True)
 
-    print(f"[ADLS] Uploaded {len(rows)} rows → adls://{file_system}/{adls_path}", flush=True)
+    print(f"[ADLS] Uploaded {len(rows)} rows in {uploaded} file(s) → adls://{file_system}/{base_path + '/' if base_path else ''}{source}/", flush=True)
 
     # ------------------------------------------------------------------ #
-    # LAKEHOUSE REGISTRATION (metadata only — no data written here)       #
+    # LAKEHOUSE REGISTRATION (registry row only — no data written here)  #
     # Canonical ABFSS URI is what Spark / Trino / Dremio expect when they #
     # later read the registry to discover the table location.             #
     # ------------------------------------------------------------------ #
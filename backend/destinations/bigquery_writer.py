@@ -1,13 +1,49 @@
 print("### BIGQUERY FORMAT-AWARE WRITER LOADED ###", flush=True)
 
 import json
+import atexit
 import tempfile
 import os
+import threading
+import time
 import pandas as pd
+import pyarrow as pa
 
 from google.cloud import bigquery
 from google.oauth2 import service_account
 
+from backend.destinations.client_pool import lease_client
+from backend.destinations.object_store_writer import rows_to_arrow
+
+# "load" = temp file + load job per batch (the original path),
+# "storage" = Storage Write API with Arrow batches and real column types.
+# Per destination with format "storage" or dest["write_method"].
+BIGQUERY_WRITE_METHOD = os.getenv("BIGQUERY_WRITE_METHOD", "load").lower()
+
+# "committed": rows are visible as soon as each append returns.
+# "pending": nothing is visible until the sync finishes and every stream
+# of the sync is committed together.
+BIGQUERY_STREAM_TYPE = os.getenv("BIGQUERY_STREAM_TYPE", "committed").lower()
+
+# AppendRows requests are capped at 10 MB; stay under it.
+BIGQUERY_APPEND_MAX_BYTES = int(os.getenv("BIGQUERY_APPEND_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# A sync's write session untouched for this many seconds was abandoned
+# (its sync never reached finish_write_streams): its streams are closed
+# and, for pending streams, discarded uncommitted.
+BIGQUERY_SESSION_TTL = float(os.getenv("BIGQUERY_SESSION_TTL", "3600"))
+
+
+def _connect(creds_dict, project_id):
+    credentials = service_account.Credentials.from_service_account_info(
+        creds_dict
+    )
+
+    return bigquery.Client(
+        credentials=credentials,
+        project=project_id
+    )
+
 
 # ---------------------------------------------------
 # FORCE STRING NORMALIZATION (CRITICAL FIX)
@@ -49,14 +85,22 @@ def push_bigquery(dest, source, rows):
     except Exception:
         raise Exception("Invalid JSON credentials")
 
-    credentials = service_account.Credentials.from_service_account_info(
-        creds_dict
-    )
+    with lease_client(dest, "bigquery", lambda: _connect(creds_dict, dest.get("host"))) as client:
+        if _write_method(dest, fmt) == "storage":
+            return _stream_rows(client, creds_dict, dest, source, rows)
+        return _load_rows(client, dest, source, rows, fmt)
+
+
+def _write_method(dest, fmt):
+    if fmt == "storage":
+        return "storage"
+    method = (dest.get("write_method") or BIGQUERY_WRITE_METHOD).lower()
+    if method not in ("load", "storage"):
+        raise Exception(f"Unsupported BigQuery write method: {method}")
+    return method
 
-    client = bigquery.Client(
-        credentials=credentials,
-        project=dest.get("host")
-    )
+
+def _load_rows(client, dest, source, rows, fmt):
 
     project_id = dest.get("host")
     dataset_id = dest.get("database_name")
@@ -67,11 +111,7 @@ def push_bigquery(dest, source, rows):
         f"{project_id}.{dataset_id}"
     )
 
-    try:
-        client.create_dataset(dataset_ref)
-    except Exception:
-        import traceback; traceback.print_exc()
-        print('Exception caught', flush=True)
+    client.create_dataset(dataset_ref, exists_ok=True)
 
     # ==================================================
     # 🔥 NORMALIZE DATA BEFORE ANY FORMAT WRITING
@@ -172,3 +212,370 @@ def push_bigquery(dest, source, rows):
     print(f"[BIGQUERY] Loaded {len(rows)} rows ({fmt})", flush=True)
 
     return len(rows)
+
+
+
+# ---------------------------------------------------
+# STORAGE WRITE API
+# ---------------------------------------------------
+# One write stream per (sync, table) is opened on the first batch and
+# reused by every later batch of that sync; finish_write_streams() closes
+# (and for pending streams commits) them when the sync ends. Pushes made
+# outside a sync open and finish a stream per call.
+
+_LEGACY_TYPES = {"INTEGER": "INT64", "FLOAT": "FLOAT64", "BOOLEAN": "BOOL"}
+
+_ARROW_TYPES = {
+    "INT64": pa.int64(),
+    "FLOAT64": pa.float64(),
+    "BOOL": pa.bool_(),
+    "STRING": pa.string(),
+    "BYTES": pa.binary(),
+    "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+    "DATETIME": pa.timestamp("us"),
+    "DATE": pa.date32(),
+    "TIME": pa.time64("us"),
+    "NUMERIC": pa.decimal128(38, 9),
+}
+
+
+def _bq_type(arrow_type):
+    if pa.types.is_boolean(arrow_type):
+        return "BOOL"
+    if pa.types.is_integer(arrow_type):
+        return "INT64"
+    if pa.types.is_floating(arrow_type):
+        return "FLOAT64"
+    if pa.types.is_decimal(arrow_type):
+        return "NUMERIC"
+    if pa.types.is_timestamp(arrow_type):
+        return "TIMESTAMP" if arrow_type.tz else "DATETIME"
+    if pa.types.is_date(arrow_type):
+        return "DATE"
+    if pa.types.is_time(arrow_type):
+        return "TIME"
+    if pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type):
+        return "BYTES"
+    return "STRING"
+
+
+# Column type changes BigQuery makes in place (ALTER COLUMN SET DATA
+# TYPE) — the numeric drift schema.widen() resolves the same way. Other
+# mismatches are cast to the table's type by _conform, or rejected there.
+_WIDENINGS = {("INT64", "NUMERIC"), ("INT64", "FLOAT64"), ("NUMERIC", "FLOAT64")}
+
+
+def _needs_table(types, batch):
+    """Does the batch bring columns the table lacks or has to widen?"""
+    if types is None:
+        return True
+    return any(
+        f.name not in types or (types[f.name], _bq_type(f.type)) in _WIDENINGS
+        for f in batch.schema
+    )
+
+
+def _table_types(table):
+    types = {}
+    for field in table.schema:
+        field_type = _LEGACY_TYPES.get(field.field_type, field.field_type)
+        if field_type not in _ARROW_TYPES or field.mode == "REPEATED":
+            raise Exception(f"Unsupported BigQuery column for streaming: {field.name} {field.field_type}")
+        types[field.name] = field_type
+    return types
+
+
+def _ensure_table(client, table_id, batch):
+    """
+    Create the table from the batch schema, add columns it hasn't seen
+    (NULLABLE), widen numeric columns the batch outgrew (see _WIDENINGS)
+    and return {column: BigQuery type}.
+    """
+    schema = [
+        bigquery.SchemaField(f.name, _bq_type(f.type), mode="NULLABLE")
+        for f in batch.schema
+    ]
+    table = client.create_table(bigquery.Table(table_id, schema=schema), exists_ok=True)
+
+    existing = {f.name for f in table.schema}
+    added = [f for f in schema if f.name not in existing]
+    if added:
+        table.schema = list(table.schema) + added
+        table = client.update_table(table, ["schema"])
+        print(f"[BIGQUERY] Added columns to {table_id}: {', '.join(f.name for f in added)}", flush=True)
+
+    types = _table_types(table)
+    widened = [f for f in schema if (types.get(f.name), f.field_type) in _WIDENINGS]
+    if widened:
+        client.query(
+            f"ALTER TABLE `{table_id}` "
+            + ", ".join(f"ALTER COLUMN `{f.name}` SET DATA TYPE {f.field_type}" for f in widened)
+        ).result()
+        print(
+            f"[BIGQUERY] Widened columns in {table_id}: "
+            + ", ".join(f"{f.name} -> {f.field_type}" for f in widened),
+            flush=True,
+        )
+        types = _table_types(client.get_table(table_id))
+
+    return types
+
+
+def _conform(batch, types):
+    """Cast the batch to the table's columns, in table order, nulls for gaps."""
+    columns = []
+    for name, bq_type in types.items():
+        target = _ARROW_TYPES[bq_type]
+        if name not in batch.column_names:
+            columns.append(pa.nulls(batch.num_rows, type=target))
+            continue
+        column = batch.column(name)
+        if column.type != target:
+            try:
+                column = column.cast(target)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                raise Exception(f"Column {name} cannot be written as {bq_type}: {e}")
+        columns.append(column)
+    return pa.table(columns, names=list(types))
+
+
+class _WriteSession:
+    """A write stream on one table, reused across the batches of a sync."""
+
+    def __init__(self, creds_dict, table_id):
+        from google.cloud import bigquery_storage_v1
+
+        credentials = service_account.Credentials.from_service_account_info(creds_dict)
+        self.client = bigquery_storage_v1.BigQueryWriteClient(credentials=credentials)
+        project, dataset, table = table_id.split(".")
+        self.parent = self.client.table_path(project, dataset, table)
+        self.table_id = table_id
+        self.pending = BIGQUERY_STREAM_TYPE == "pending"
+
+        self.lock = threading.Lock()
+        self.types = None
+        self.schema = None
+        self.stream = None
+        self.append_stream = None
+        self.offset = 0
+        self.closed_streams = []
+        self.failed = False
+        self.rows = 0
+        self.touched = time.monotonic()
+
+    def _open(self, schema):
+        from google.cloud.bigquery_storage_v1 import types, writer
+
+        stream_type = types.WriteStream.Type.PENDING if self.pending else types.WriteStream.Type.COMMITTED
+        self.stream = self.client.create_write_stream(
+            parent=self.parent,
+            write_stream=types.WriteStream(type_=stream_type),
+        )
+
+        template = types.AppendRowsRequest(
+            write_stream=self.stream.name,
+            arrow_rows=types.AppendRowsRequest.ArrowData(
+                writer_schema=types.ArrowSchema(
+                    serialized_schema=schema.serialize().to_pybytes()
+                )
+            ),
+        )
+        self.append_stream = writer.AppendRowsStream(self.client, template)
+        self.schema = schema
+        self.offset = 0
+
+    def _close_stream(self):
+        if self.stream is None:
+            return
+        self.append_stream.close()
+        self.client.finalize_write_stream(name=self.stream.name)
+        self.closed_streams.append(self.stream.name)
+        self.stream = None
+        self.append_stream = None
+
+    def _abandon_stream(self):
+        # After a failed append some chunks may have landed and others not,
+        # so the stream's next offset is unknown: it is never appended to
+        # again (nor finalized into closed_streams for commit).
+        if self.stream is None:
+            return
+        try:
+            self.append_stream.close()
+        except Exception as e:
+            print(f"[BIGQUERY] Closing failed stream for {self.table_id} failed: {e}", flush=True)
+        self.stream = None
+        self.append_stream = None
+        self.schema = None
+
+    def append(self, batch):
+        from google.cloud.bigquery_storage_v1 import types
+
+        # Pending streams of a sync commit together or not at all; once
+        # one append failed, the rest of the sync can't be committed.
+        if self.failed and self.pending:
+            raise Exception(
+                f"A write stream for {self.table_id} failed earlier in this sync; "
+                "its pending rows will not be committed"
+            )
+
+        # The writer schema is fixed per stream; a new column means a new
+        # stream (the old one is finalized and still committed at the end).
+        if self.schema is None or not batch.schema.equals(self.schema):
+            self._close_stream()
+            self._open(batch.schema)
+
+        row_bytes = max(1, batch.nbytes // max(1, batch.num_rows))
+        chunk_rows = max(1, BIGQUERY_APPEND_MAX_BYTES // row_bytes)
+
+        futures = []
+        try:
+            for record_batch in batch.to_batches(max_chunksize=chunk_rows):
+                request = types.AppendRowsRequest(
+                    offset=self.offset,
+                    arrow_rows=types.AppendRowsRequest.ArrowData(
+                        rows=types.ArrowRecordBatch(
+                            serialized_record_batch=record_batch.serialize().to_pybytes()
+                        )
+                    ),
+                )
+                futures.append(self.append_stream.send(request))
+                self.offset += record_batch.num_rows
+
+            for future in futures:
+                future.result()
+
+        except Exception:
+            self.failed = True
+            self._abandon_stream()
+            raise
+
+        self.rows += batch.num_rows
+        return len(futures)
+
+    def finish(self):
+        with self.lock:
+            self._close_stream()
+            if self.pending and self.closed_streams:
+                if self.failed:
+                    print(f"[BIGQUERY] Discarding pending streams for {self.table_id} after a failed append", flush=True)
+                    return
+                from google.cloud.bigquery_storage_v1 import types
+
+                response = self.client.batch_commit_write_streams(
+                    types.BatchCommitWriteStreamsRequest(
+                        parent=self.parent,
+                        write_streams=self.closed_streams,
+                    )
+                )
+                if response.stream_errors:
+                    raise Exception(f"BigQuery stream commit failed: {response.stream_errors[0]}")
+            print(f"[BIGQUERY] Closed write streams for {self.table_id} ({self.rows} rows)", flush=True)
+
+    def abort(self, reason):
+        """Close the streams without committing; pending rows are dropped."""
+        with self.lock:
+            try:
+                self._close_stream()
+            except Exception as e:
+                print(f"[BIGQUERY] Closing stream for {self.table_id} failed: {e}", flush=True)
+            if self.pending and self.closed_streams:
+                print(
+                    f"[BIGQUERY] Discarding {len(self.closed_streams)} uncommitted stream(s) "
+                    f"for {self.table_id} ({self.rows} rows): {reason}",
+                    flush=True,
+                )
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _session(sync_id, creds_dict, table_id):
+    if sync_id is None:
+        return _WriteSession(creds_dict, table_id)
+
+    _expire_sessions()
+    with _sessions_lock:
+        session = _sessions.get((sync_id, table_id))
+        if session is None:
+            session = _sessions[(sync_id, table_id)] = _WriteSession(creds_dict, table_id)
+        session.touched = time.monotonic()
+    return session
+
+
+def _expire_sessions():
+    if not BIGQUERY_SESSION_TTL:
+        return
+    now = time.monotonic()
+    with _sessions_lock:
+        stale = [k for k, sess in _sessions.items() if now - sess.touched > BIGQUERY_SESSION_TTL]
+        expired = [_sessions.pop(k) for k in stale]
+    for session in expired:
+        session.abort("sync was never finished")
+
+
+def finish_write_streams(sync_id):
+    """
+    Finalize (and commit, for pending streams) every stream of a sync.
+    Runs at the end of every sync, so it also expires abandoned sessions.
+    """
+    _expire_sessions()
+    with _sessions_lock:
+        keys = [k for k in _sessions if k[0] == sync_id]
+        sessions = [_sessions.pop(k) for k in keys]
+
+    first_error = None
+    for session in sessions:
+        try:
+            session.finish()
+        except Exception as e:
+            print(f"[BIGQUERY] Finishing streams for {session.table_id} failed: {e}", flush=True)
+            if first_error is None:
+                first_error = e
+
+    if first_error is not None:
+        raise first_error
+    return len(sessions)
+
+
+@atexit.register
+def _abort_write_streams():
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.abort("process exiting")
+
+
+def _stream_rows(client, creds_dict, dest, source, rows):
+
+    project_id = dest.get("host")
+    dataset_id = dest.get("database_name")
+    table_id = f"{project_id}.{dataset_id}.{source}_data"
+
+    client.create_dataset(bigquery.Dataset(f"{project_id}.{dataset_id}"), exists_ok=True)
+
+    batch = rows_to_arrow(rows)
+
+    sync_id = dest.get("sync_id")
+    session = _session(sync_id, creds_dict, table_id)
+
+    try:
+        with session.lock:
+            # The table is only re-read when the batch brings unseen columns
+            # or values a numeric column has to widen for.
+            if _needs_table(session.types, batch):
+                session.types = _ensure_table(client, table_id, batch)
+            batch = _conform(batch, session.types)
+            requests = session.append(batch)
+    except Exception:
+        if sync_id is None:
+            session.abort("append failed")
+        raise
+
+    if sync_id is None:
+        session.finish()
+
+    print(f"[BIGQUERY] Streamed {batch.num_rows} rows to {table_id} in {requests} append(s)", flush=True)
+
+    return batch.num_rows
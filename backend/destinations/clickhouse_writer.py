@@ -1,55 +1,225 @@
 import clickhouse_connect
+import datetime
 import json
-from datetime import datetime
+import os
+import random
+
+from backend.destinations.client_pool import lease_client
+from backend.destinations.record_keys import merge_fields, record_key, record_scope
+from backend.destinations.schema import column_type, evolve, forget, infer_schema, logical_from_db
+
+# Table engine for newly created tables. "ReplacingMergeTree" collapses
+# rows with the same record id on merge (keeping the latest sync), so
+# re-syncs deduplicate on the server. Per destination as dest["engine"].
+CLICKHOUSE_ENGINE = os.getenv("CLICKHOUSE_ENGINE", "MergeTree")
+
+_ENGINES = ("MergeTree", "ReplacingMergeTree")
+
+
+def _connect(dest):
+    return clickhouse_connect.get_client(
+        host=dest["host"],
+        port=int(dest["port"]),
+        username=dest["username"],
+        password=dest["password"],
+        database=dest["database_name"],
+        secure=True,
+        compress="lz4"
+    )
 
-def push_clickhouse(dest, source, rows):
 
+def _ping(client):
+    return client.ping()
+
+
+def push_clickhouse(dest, source, rows):
+    """
+    - format "columnar" -> one typed column per key, inserted column-wise
+    - anything else     -> the original (id, payload, fetched_at) table
+    Both order by a record id derived from the row, not its batch position.
+    """
     if not rows:
         return 0
 
+    columnar = (dest.get("format") or "").lower() == "columnar"
+
     try:
-        client = clickhouse_connect.get_client(
-            host=dest["host"],
-            port=int(dest["port"]),
-            username=dest["username"],
-            password=dest["password"],
-            database=dest["database_name"],
-            secure=True
+        with lease_client(dest, "clickhouse", lambda: _connect(dest), validate=_ping) as client:
+            if columnar:
+                return _write_columnar(client, dest, source, rows)
+            return _write_rows(client, dest, source, rows)
+
+    except Exception as e:
+        print("[CLICKHOUSE ERROR]", e, flush=True)
+        raise e
+
+
+def _engine(dest, version_column):
+    engine = dest.get("engine") or CLICKHOUSE_ENGINE
+    if engine not in _ENGINES:
+        raise Exception(f"Unsupported ClickHouse engine: {engine}")
+    if engine == "ReplacingMergeTree":
+        return f"ReplacingMergeTree({version_column})"
+    return "MergeTree()"
+
+
+def _key_func(dest, source):
+    # Always keyed, whatever the write mode: the sort key (and the
+    # ReplacingMergeTree dedupe) must be the same on every re-sync.
+    fields, scope = merge_fields(dest), record_scope(dest, source)
+    return lambda row: record_key(row, fields, scope)
+
+
+def _record_id(row, key_of):
+    # 64 bits of the scoped record key: stable across batches and syncs.
+    # Only rows with no record id at all get a random one.
+    key = key_of(row)
+    if key is None:
+        return random.getrandbits(64)
+    return int(key[:16], 16)
+
+
+def _write_rows(client, dest, source, rows):
+
+    table = f"{source}_data"
+
+    # Create table
+    client.command(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id UInt64,
+            payload String,
+            fetched_at DateTime
         )
+        ENGINE = {_engine(dest, "fetched_at")}
+        ORDER BY id
+    """)
+
+    now = datetime.datetime.utcnow()
+    key_of = _key_func(dest, source)
 
-        table = f"{source}_data"
+    data = []
+    for r in rows:
+        data.append([
+            _record_id(r, key_of),
+            json.dumps(r, default=str),
+            now
+        ])
 
-        # Create table
-        client.command(f"""
-            CREATE TABLE IF NOT EXISTS {table} (
-                id UInt64,
-                payload String,
-                fetched_at DateTime
+    client.insert(
+        table,
+        data,
+        column_names=["id", "payload", "fetched_at"]
+    )
+
+    print(f"[DEST] Pushed {len(rows)} rows to ClickHouse", flush=True)
+
+    return len(rows)
+
+
+# ---------------- COLUMNAR ----------------
+
+def _existing_columns(client, table):
+    result = client.query(
+        "SELECT name, type FROM system.columns "
+        "WHERE database = currentDatabase() AND table = {table:String}",
+        parameters={"table": table},
+    )
+    return {
+        name: logical_from_db(t, "clickhouse")
+        for name, t in result.result_rows
+        if name not in ("_record_id", "_synced_at")
+    }
+
+
+def _quote(name):
+    return "`" + str(name).replace("\\", "\\\\").replace("`", "\\`") + "`"
+
+
+def _column_values(rows, name, logical):
+    values = [r.get(name) for r in rows]
+    if column_type(logical, "clickhouse") != "String":
+        return values
+    return [
+        None if v is None
+        else v if isinstance(v, str)
+        else json.dumps(v, default=str) if isinstance(v, (dict, list, tuple))
+        else str(v)
+        for v in values
+    ]
+
+
+def _write_columnar(client, dest, source, rows):
+
+    table = f"{source}_data"
+
+    incoming = infer_schema(rows)
+    incoming.pop("_record_id", None)
+    incoming.pop("_synced_at", None)
+
+    change = evolve(source, dest, incoming, lambda: _existing_columns(client, table), table)
+
+    # A key whose type changed keeps the table's column when that type can
+    # hold the new values; otherwise the column is widened (see below).
+    columns = change.columns
+
+    def col_def(c):
+        return f"{_quote(c)} Nullable({column_type(columns[c], 'clickhouse')})"
+
+    try:
+        if change.new_table:
+            client.command(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    _record_id UInt64,
+                    _synced_at DateTime64(3),
+                    {", ".join(col_def(c) for c in columns)}
+                )
+                ENGINE = {_engine(dest, "_synced_at")}
+                ORDER BY _record_id
+            """)
+        elif change.added:
+            client.command(
+                f"ALTER TABLE {table} "
+                + ", ".join(f"ADD COLUMN IF NOT EXISTS {col_def(c)}" for c in change.added)
             )
-            ENGINE = MergeTree()
-            ORDER BY id
-        """)
+            print(f"[CLICKHOUSE] Added columns to {table}: {', '.join(change.added)}", flush=True)
 
-        now = datetime.utcnow()
+        modified = [
+            c for c, t in change.widened.items()
+            if column_type(t, "clickhouse") != column_type(change.conflicts[c][0], "clickhouse")
+        ]
+        if modified:
+            client.command(
+                f"ALTER TABLE {table} "
+                + ", ".join(f"MODIFY COLUMN {col_def(c)}" for c in modified)
+            )
+            print(
+                f"[CLICKHOUSE] Widened columns in {table}: "
+                + ", ".join(f"{c} -> {columns[c]}" for c in modified),
+                flush=True,
+            )
+
+        key_of = _key_func(dest, source)
+        now = datetime.datetime.utcnow()
 
-        data = []
-        for i, r in enumerate(rows):
-            data.append([
-                i,
-                json.dumps(r),
-                now
-            ])
+        names = ["_record_id", "_synced_at"] + list(columns)
+        data = [
+            [_record_id(r, key_of) for r in rows],
+            [now] * len(rows),
+        ] + [_column_values(rows, c, t) for c, t in columns.items()]
 
         client.insert(
             table,
             data,
-            column_names=["id", "payload", "fetched_at"]
+            column_names=names,
+            column_oriented=True
         )
 
-        print(f"[DEST] Pushed {len(rows)} rows to ClickHouse", flush=True)
+    except Exception:
+        forget(source, dest, table)
+        raise
 
-        return len(rows)
+    change.commit()
 
-    except Exception as e:
-        print("[CLICKHOUSE ERROR]", e, flush=True)
-        raise e
\ No newline at end of file
+    print(f"[DEST] Pushed {len(rows)} rows to ClickHouse ({table}, columnar, {len(columns)} columns)", flush=True)
+
+    return len(rows)
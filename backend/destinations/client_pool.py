@@ -0,0 +1,289 @@
+"""
+Keyed cache of warm destination clients / connections.
+
+Paginated syncs call push_to_destination once per page; without this every
+page opened a fresh warehouse connection or SDK client (TLS handshake +
+auth). Writers now lease a client for a destination key instead:
+
+    with lease_client(dest, "postgres", factory, validate=_ping) as conn:
+        ...
+
+  * clients are keyed by destination type + connection fields, so two
+    destinations never share a client and a rotated password gets a new one
+  * a lease is exclusive; at most DEST_CLIENT_MAX_PER_KEY clients exist per
+    key and further callers wait up to DEST_CLIENT_WAIT seconds
+  * idle clients are validated before reuse once idle longer than
+    DEST_CLIENT_PING_AFTER, and closed after DEST_CLIENT_IDLE_TTL — on the
+    next checkout, and by a background sweep every
+    DEST_CLIENT_EVICT_INTERVAL seconds (0 = checkout only); everything
+    left is closed at exit
+  * a lease that raises discards its client instead of returning it
+  * stats label destinations by type and a short key hash, never by
+    host or database name
+"""
+
+import atexit
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+MAX_PER_KEY = int(os.getenv("DEST_CLIENT_MAX_PER_KEY", "4"))
+WAIT_TIMEOUT = float(os.getenv("DEST_CLIENT_WAIT", "60"))
+IDLE_TTL = float(os.getenv("DEST_CLIENT_IDLE_TTL", "300"))
+PING_AFTER = float(os.getenv("DEST_CLIENT_PING_AFTER", "30"))
+EVICT_INTERVAL = float(os.getenv("DEST_CLIENT_EVICT_INTERVAL", "60"))
+
+_KEY_FIELDS = ("host", "port", "username", "password", "database_name")
+
+
+def client_key(dest, kind):
+    """Stable cache key for a destination; the password is hashed, not stored."""
+    parts = [kind]
+    for field in _KEY_FIELDS:
+        value = "" if dest.get(field) is None else str(dest.get(field))
+        if field == "password":
+            value = hashlib.sha256(value.encode("utf-8")).hexdigest()
+        parts.append(value)
+    return "|".join(parts)
+
+
+def _close_quietly(client, close):
+    try:
+        if close is not None:
+            close(client)
+        elif hasattr(client, "close"):
+            client.close()
+    except Exception:
+        pass
+
+
+class _Slot:
+    """Clients for one key."""
+
+    def __init__(self, label):
+        self.label = label
+        self.idle = []          # [(client, last_used, close)]
+        self.in_use = 0
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+
+class DestinationClientPool:
+
+    def __init__(self, max_per_key=MAX_PER_KEY, wait_timeout=WAIT_TIMEOUT,
+                 idle_ttl=IDLE_TTL, ping_after=PING_AFTER):
+        self.max_per_key = max(1, max_per_key)
+        self.wait_timeout = wait_timeout
+        self.idle_ttl = idle_ttl
+        self.ping_after = ping_after
+        self._slots = {}
+        self._cond = threading.Condition()
+
+    def _slot(self, key, label=None):
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _Slot(label or key.split("|", 1)[0])
+        return slot
+
+    def _evict_idle_locked(self, now):
+        expired = []
+        for slot in self._slots.values():
+            keep = []
+            for entry in slot.idle:
+                if self.idle_ttl and now - entry[1] > self.idle_ttl:
+                    expired.append(entry)
+                else:
+                    keep.append(entry)
+            slot.idle = keep
+        return expired
+
+    def _checkout(self, key, label, limit):
+        deadline = time.monotonic() + self.wait_timeout
+        with self._cond:
+            expired = self._evict_idle_locked(time.monotonic())
+            slot = self._slot(key, label)
+            while not slot.idle and slot.in_use >= limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Exception(
+                        f"Timed out waiting for a destination client "
+                        f"(limit {limit} per destination)"
+                    )
+                self._cond.wait(remaining)
+            slot.in_use += 1
+            entry = slot.idle.pop() if slot.idle else None
+
+        for client, _, close in expired:
+            _close_quietly(client, close)
+        return entry
+
+    def _release(self, key, client, close, healthy):
+        with self._cond:
+            slot = self._slot(key)
+            slot.in_use -= 1
+            if healthy:
+                slot.idle.append((client, time.monotonic(), close))
+            else:
+                slot.discarded += 1
+            self._cond.notify()
+        if not healthy:
+            _close_quietly(client, close)
+
+    @contextmanager
+    def lease(self, key, factory, validate=None, close=None, label=None, max_clients=None):
+        entry = self._checkout(key, label, max(1, max_clients or self.max_per_key))
+        client = None
+        try:
+            if entry is not None:
+                client, last_used, _ = entry
+                stale = validate is not None and time.monotonic() - last_used >= self.ping_after
+                if stale and not self._is_healthy(client, validate):
+                    _close_quietly(client, close)
+                    with self._cond:
+                        self._slot(key).discarded += 1
+                    client = None
+                else:
+                    with self._cond:
+                        self._slot(key).reused += 1
+
+            if client is None:
+                client = factory()
+                with self._cond:
+                    self._slot(key).created += 1
+
+        except Exception:
+            with self._cond:
+                self._slot(key).in_use -= 1
+                self._cond.notify()
+            raise
+
+        try:
+            yield client
+        except BaseException:
+            self._release(key, client, close, healthy=False)
+            raise
+        else:
+            self._release(key, client, close, healthy=True)
+
+    @staticmethod
+    def _is_healthy(client, validate):
+        try:
+            return validate(client) is not False
+        except Exception:
+            return False
+
+    def evict_idle(self):
+        """Close clients idle longer than the TTL; returns how many were closed."""
+        with self._cond:
+            expired = self._evict_idle_locked(time.monotonic())
+        for client, _, close in expired:
+            _close_quietly(client, close)
+        return len(expired)
+
+    def close_all(self):
+        with self._cond:
+            idle = [entry for slot in self._slots.values() for entry in slot.idle]
+            for slot in self._slots.values():
+                slot.idle = []
+        for client, _, close in idle:
+            _close_quietly(client, close)
+
+    def stats(self):
+        with self._cond:
+            return [
+                {
+                    "destination": slot.label,
+                    "idle": len(slot.idle),
+                    "in_use": slot.in_use,
+                    "created": slot.created,
+                    "reused": slot.reused,
+                    "discarded": slot.discarded,
+                }
+                for slot in self._slots.values()
+            ]
+
+
+_pool = DestinationClientPool()
+
+
+def lease_client(dest, kind, factory, validate=None, close=None, max_clients=None):
+    """
+    Lease a warm client for `dest`, creating it with `factory()` if needed.
+    `max_clients` lowers the per-destination limit, e.g. 1 for engines that
+    allow a single writer.
+    """
+    _start_evictor()
+    key = client_key(dest, kind)
+    label = f"{kind}:{hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]}"
+    return _pool.lease(
+        key, factory,
+        validate=validate, close=close, label=label, max_clients=max_clients,
+    )
+
+
+_evictor = None
+_evictor_lock = threading.Lock()
+
+
+def _evict_loop():
+    while True:
+        time.sleep(EVICT_INTERVAL)
+        try:
+            closed = _pool.evict_idle()
+            if closed:
+                print(f"[DEST CLIENTS] Closed {closed} idle client(s)", flush=True)
+        except Exception as e:
+            print("[DEST CLIENTS EVICT ERROR]", e, flush=True)
+
+
+def _start_evictor():
+    global _evictor
+    if _evictor is not None or EVICT_INTERVAL <= 0:
+        return
+    with _evictor_lock:
+        if _evictor is None:
+            _evictor = threading.Thread(target=_evict_loop, name="dest-client-evictor", daemon=True)
+            _evictor.start()
+
+
+def evict_idle_clients():
+    return _pool.evict_idle()
+
+
+def close_all_clients():
+    _pool.close_all()
+
+
+def client_pool_stats():
+    """Per-destination idle / in-use / created / reused / discarded counts."""
+    return _pool.stats()
+
+
+@atexit.register
+def _close_clients():
+    _pool.close_all()
+
+
+# ---------------------------------------------------------------------------
+# Health checks shared by writers
+# ---------------------------------------------------------------------------
+
+def ping_dbapi(conn):
+    """SELECT 1 on a DB-API connection (psycopg2, Redshift, Databricks SQL)."""
+    if getattr(conn, "closed", 0):
+        return False
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT 1")
+        cur.fetchall()
+    finally:
+        cur.close()
+    if hasattr(conn, "rollback"):
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+    return True
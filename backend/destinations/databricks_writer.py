@@ -1,7 +1,27 @@
 import databricks.sql
 import json
+import os
+import tempfile
 from datetime import datetime
 
+from backend.destinations.client_pool import lease_client, ping_dbapi
+from backend.destinations.record_keys import write_mode
+from backend.destinations.warehouse_stage import (
+    batch_id,
+    ensure_table,
+    forget_table,
+    gzip_ndjson,
+    stage_records,
+    use_file_stage,
+    values_chunks,
+)
+
+# Unity Catalog volume directory staged files are PUT into, e.g.
+# /Volumes/main/default/staging. Per destination as stage_volume; without
+# one, merges read the batch from multi-row VALUES instead.
+DATABRICKS_STAGE_VOLUME = os.getenv("DATABRICKS_STAGE_VOLUME", "")
+
+
 def push_databricks(dest, source, rows):
 
     if not rows:
@@ -17,56 +37,170 @@ def push_databricks(dest, source, rows):
         else:
             catalog, schema = "hive_metastore", db_name or "default"
 
-        connection = databricks.sql.connect(
-            server_hostname=dest["host"],
-            http_path=dest.get("port"),
-            access_token=dest["password"],
-            catalog=catalog,
-            schema=schema
+        volume = _stage_volume(dest)
+
+        def connect():
+            extra = {}
+            if volume:
+                # PUT only reads local files from allowed paths.
+                extra["staging_allowed_local_path"] = tempfile.gettempdir()
+            return databricks.sql.connect(
+                server_hostname=dest["host"],
+                http_path=dest.get("port"),
+                access_token=dest["password"],
+                catalog=catalog,
+                schema=schema,
+                **extra
+            )
+
+        with lease_client(dest, "databricks", connect, validate=ping_dbapi) as connection:
+            if fmt != "iceberg" and write_mode(dest) == "merge":
+                return _merge_rows(connection, dest, source, rows, volume)
+            return _write_rows(connection, dest, source, rows, fmt)
+
+    except Exception as e:
+        print("[DATABRICKS ERROR]", e, flush=True)
+        forget_table(dest, "databricks", f"{source}_data")
+        raise e
+
+
+def _stage_volume(dest):
+    return (dest.get("stage_volume") or DATABRICKS_STAGE_VOLUME).rstrip("/")
+
+
+def _create_table(cursor, table):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id BIGINT GENERATED ALWAYS AS IDENTITY,
+            record_key STRING,
+            payload STRING,
+            fetched_at TIMESTAMP
         )
+    """)
 
-        cursor = connection.cursor()
+    # Tables created before merge writes have no record_key yet.
+    cursor.execute(f"SHOW COLUMNS IN {table}")
+    columns = {str(r[0]).lower() for r in cursor.fetchall()}
+    if "record_key" not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN record_key STRING")
 
-        table = f"{source}_data"
 
-        # Create table if not exists
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS {table} (
-                id BIGINT GENERATED ALWAYS AS IDENTITY,
-                payload STRING,
-                fetched_at TIMESTAMP
-            )
-        """)
+def _write_rows(connection, dest, source, rows, fmt):
+
+    cursor = connection.cursor()
+
+    table = f"{source}_data"
+
+    ensure_table(dest, "databricks", table, lambda: _create_table(cursor, table))
+
+    if fmt == "iceberg":
+        from backend.destinations.lakehouse_writer import push_iceberg
+        print("[DATABRICKS] Writing Iceberg table", flush=True)
+        return push_iceberg(dest, source, rows)
+    
+    # Databricks SQL doesn't have a PARSE_JSON equivalent directly for inserts from string literals in the same way Snowflake does,
+    # but we can insert the JSON as a STRING (payload column) and parse it on read, which is very common in Delta tables.
+    insert_sql = f"""
+        INSERT INTO {table} (payload, fetched_at)
+        VALUES (%s, %s)
+    """
+
+    now = datetime.utcnow()
+
+    values = [
+        (json.dumps(r), now)
+        for r in rows
+    ]
+
+    cursor.executemany(insert_sql, values)
 
-        if fmt == "iceberg":
-            from backend.destinations.lakehouse_writer import push_iceberg
-            print("[DATABRICKS] Writing Iceberg table", flush=True)
-            return push_iceberg(dest, source, rows)
-        
-        # Databricks SQL doesn't have a PARSE_JSON equivalent directly for inserts from string literals in the same way Snowflake does,
-        # but we can insert the JSON as a STRING (payload column) and parse it on read, which is very common in Delta tables.
-        insert_sql = f"""
-            INSERT INTO {table} (payload, fetched_at)
-            VALUES (%s, %s)
-        """
+    connection.commit()
+    cursor.close()
 
-        now = datetime.utcnow()
+    print(f"[DEST] Batch pushed {len(rows)} rows to Databricks", flush=True)
 
-        values = [
-            (json.dumps(r), now)
-            for r in rows
-        ]
+    return len(rows)
 
-        cursor.executemany(insert_sql, values)
+
+# ---------------- STAGE + MERGE ----------------
+
+_MERGE_ACTIONS = """
+    ON t.record_key = s.record_key
+    WHEN MATCHED THEN UPDATE SET
+        t.payload = s.payload,
+        t.fetched_at = s.fetched_at
+    WHEN NOT MATCHED THEN INSERT (record_key, payload, fetched_at)
+        VALUES (s.record_key, s.payload, s.fetched_at)
+"""
+
+
+def _put_to_volume(cursor, table, records, volume):
+    """PUT one gzip NDJSON file into the volume and return its path."""
+    remote = f"{volume}/{table}/{batch_id()}.json.gz"
+
+    fd, local = tempfile.mkstemp(suffix=".json.gz")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(gzip_ndjson(records).getbuffer())
+        cursor.execute(f"PUT '{local}' INTO '{remote}' OVERWRITE")
+    finally:
+        os.remove(local)
+
+    return remote
+
+
+def _merge_rows(connection, dest, source, rows, volume):
+
+    cursor = connection.cursor()
+
+    table = f"{source}_data"
+    records = stage_records(dest, rows)
+
+    ensure_table(dest, "databricks", table, lambda: _create_table(cursor, table))
+
+    try:
+        if volume and use_file_stage(records):
+            # COPY INTO needs an existing target, so the batch gets its own
+            # Delta staging table that is dropped after the MERGE.
+            remote = _put_to_volume(cursor, table, records, volume)
+            stage = f"{table}_stage_{batch_id()}"
+            try:
+                cursor.execute(f"""
+                    CREATE TABLE {stage} (
+                        record_key STRING,
+                        payload STRING,
+                        fetched_at TIMESTAMP
+                    )
+                """)
+                cursor.execute(f"""
+                    COPY INTO {stage}
+                    FROM (
+                        SELECT record_key, payload, CAST(fetched_at AS TIMESTAMP) AS fetched_at
+                        FROM '{remote}'
+                    )
+                    FILEFORMAT = JSON
+                """)
+                cursor.execute(f"MERGE INTO {table} t USING {stage} s {_MERGE_ACTIONS}")
+            finally:
+                cursor.execute(f"DROP TABLE IF EXISTS {stage}")
+                cursor.execute(f"REMOVE '{remote}'")
+            via = "volume COPY"
+        else:
+            for chunk in values_chunks(records):
+                cursor.execute(
+                    f"MERGE INTO {table} t USING ("
+                    "SELECT * FROM VALUES "
+                    + ", ".join(["(%s, %s, %s)"] * len(chunk))
+                    + f" AS v(record_key, payload, fetched_at)) s {_MERGE_ACTIONS}",
+                    [v for record in chunk for v in record],
+                )
+            via = "VALUES"
 
         connection.commit()
-        cursor.close()
-        connection.close()
 
-        print(f"[DEST] Batch pushed {len(rows)} rows to Databricks", flush=True)
+    finally:
+        cursor.close()
 
-        return len(rows)
+    print(f"[DEST] Merged {len(records)} rows into Databricks ({table}, {via})", flush=True)
 
-    except Exception as e:
-        print("[DATABRICKS ERROR]", e, flush=True)
-        raise e
+    return len(records)
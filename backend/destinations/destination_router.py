@@ -1,6 +1,6 @@
 from backend.destinations.mysql_writer import push_to_mysql
 from backend.destinations.postgres_writer import push_postgres
-from backend.destinations.bigquery_writer import push_bigquery
+from backend.destinations.bigquery_writer import finish_write_streams, push_bigquery
 from backend.destinations.snowflake_writer import push_snowflake
 from backend.destinations.clickhouse_writer import push_clickhouse
 from backend.destinations.s3_writer import push_s3
@@ -11,14 +11,29 @@ from backend.destinations.mongodb_writer import push_mongodb
 from backend.destinations.elasticsearch_writer import push_elasticsearch
 from backend.destinations.duckdb_writer import push_duckdb
 from backend.destinations.gcs_writer import push_gcs
+from backend.destinations.write_buffer import BUFFER_ENABLED, WriteBuffer
+from backend.destinations.push_pipeline import ASYNC_PUSH_ENABLED, PushPipeline
+from backend.destinations.sync_context import (
+    DestinationHandle,
+    end_sync_context,
+    start_sync_context,
+    sync_context,
+)
 from flask import g, has_request_context
 
 import sqlite3
 import os
 import datetime
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.destinations.object_store_writer import shared_encoding
 
 DB = os.getenv("DB_PATH", "identity.db")
 
+# Concurrent writers when one batch fans out to several destinations.
+FANOUT_WORKERS = int(os.getenv("DEST_FANOUT_WORKERS", "4"))
+
 def validate_destination(dest):
 
     if not dest:
@@ -40,12 +55,64 @@ def validate_destination(dest):
     return dest
 
 
-def resolve_destination_format(dest_cfg, source):
+def get_active_destinations(uid, source):
+    """
+    Every active destination for (uid, source), newest first, decrypted.
+    Inside a sync the lookup runs once and later calls reuse it.
+    """
+    ctx = _request_sync_context()
+    if ctx is not None:
+        return ctx.active_destinations(uid, source, lambda: _load_active_destinations(uid, source))
+    return _load_active_destinations(uid, source)
+
+
+def _load_active_destinations(uid, source):
+    from backend.security.secure_fetch import fetchall_secure
+
+    con = sqlite3.connect(DB)
+    try:
+        cur = con.cursor()
+        cur.execute("""
+            SELECT dest_type, host, port, username, password, database_name, format, merge_key, write_mode
+            FROM destination_configs
+            WHERE uid=? AND source=? AND is_active=1
+            ORDER BY id DESC
+        """, (uid, source))
+        rows = fetchall_secure(cur)
+    finally:
+        con.close()
+
+    return [
+        {
+            "type": row.get("dest_type"),
+            "host": row.get("host"),
+            "port": row.get("port"),
+            "username": row.get("username"),
+            "password": row.get("password"),
+            "database_name": row.get("database_name"),
+            "format": row.get("format"),
+            "merge_key": row.get("merge_key"),
+            "write_mode": row.get("write_mode"),
+        }
+        for row in rows
+    ]
+
+
+def resolve_destination_format(dest_cfg, source, uid=None):
 
     dest_type = dest_cfg.get("type")
 
     # only needed for supported destinations
-    if dest_type not in ["s3", "bigquery", "azure_datalake", "gcs", "duckdb"]:
+    if dest_type not in ["s3", "bigquery", "azure_datalake", "gcs", "duckdb", "postgres", "clickhouse"]:
+        return dest_cfg
+
+    # Configs from get_active_destinations already carry their own row's
+    # format; only hand-built configs are looked up, and only for this uid.
+    if "format" in dest_cfg:
+        if dest_cfg["format"]:
+            dest_cfg["format"] = dest_cfg["format"].lower()
+        return dest_cfg
+    if not uid:
         return dest_cfg
 
     try:
@@ -55,12 +122,13 @@ def resolve_destination_format(dest_cfg, source):
         cur.execute("""
             SELECT format
             FROM destination_configs
-            WHERE source=?
+            WHERE uid=?
+            AND source=?
             AND dest_type=?
             AND is_active=1
             ORDER BY id DESC
             LIMIT 1
-        """, (source, dest_type))
+        """, (uid, source, dest_type))
 
         row = cur.fetchone()
         con.close()
@@ -74,27 +142,184 @@ def resolve_destination_format(dest_cfg, source):
 
     return dest_cfg
 
+def _request_uid():
+    if has_request_context():
+        return getattr(g, "user_id", None)
+    return None
+
+
+def _request_sync_context():
+    if has_request_context():
+        return sync_context(getattr(g, "_dest_sync_id", None))
+    return None
+
+
+# ---------------- SYNC WRITE BUFFER ----------------
+
+def begin_buffered_pushes():
+    """
+    Coalesce (DEST_BUFFER_ENABLED) and pipeline (DEST_PUSH_ASYNC)
+    push_to_destination calls for the rest of this request.
+    """
+    if not has_request_context():
+        return
+    if getattr(g, "_dest_sync_id", None):
+        return
+
+    # Per-sync state (destination handles, push logs, BigQuery write
+    # streams) is keyed by this id; it travels on the dest config.
+    g._dest_sync_id = uuid.uuid4().hex
+    start_sync_context(g._dest_sync_id)
+
+    pipeline = PushPipeline(_deliver) if ASYNC_PUSH_ENABLED else None
+    g._dest_push_pipeline = pipeline
+
+    if BUFFER_ENABLED:
+        g._dest_write_buffer = WriteBuffer(pipeline.submit if pipeline else _deliver)
+
+
+def flush_buffered_pushes():
+    """
+    Write out everything the request buffered and wait for queued writes.
+    Returns rows pushed; raises if any batch failed. The full result
+    ({rows_pushed, batches, errors}) is left on g.dest_push_result.
+    """
+    if not has_request_context():
+        return 0
+
+    sync_id = g.pop("_dest_sync_id", None)
+    buffer = g.pop("_dest_write_buffer", None)
+    pipeline = g.pop("_dest_push_pipeline", None)
+    if sync_id is None:
+        return 0
+
+    if buffer is None and pipeline is None:
+        # Pushes were written as they came; only per-sync state remains.
+        errors = _close_sync(sync_id)
+        if errors:
+            raise Exception(errors[0]["error"])
+        return 0
+
+    flush_error = None
+    pushed = 0
+
+    if buffer is not None:
+        try:
+            pushed = buffer.flush()
+        except Exception as e:
+            flush_error = e
+        stats = buffer.stats()
+        print(
+            f"[ROUTER BUFFER] {stats['pushes_in']} pushes coalesced into "
+            f"{stats['flushes']} writes ({stats['rows_flushed']} rows)",
+            flush=True,
+        )
+
+    if pipeline is not None:
+        try:
+            result = pipeline.wait()
+        except Exception as e:
+            # Still close the sync below: open write streams must not leak.
+            result = {"rows_pushed": 0, "batches": None, "errors": [{"error": str(e)}]}
+        pushed = result["rows_pushed"]
+        print(
+            f"[ROUTER PIPELINE] {result['batches']} batches, "
+            f"{result['rows_pushed']} rows pushed, {len(result['errors'])} failed",
+            flush=True,
+        )
+    else:
+        result = {"rows_pushed": pushed, "batches": None, "errors": []}
+
+    if flush_error is not None:
+        result["errors"].append({"error": str(flush_error)})
+
+    result["errors"].extend(_close_sync(sync_id))
+
+    g.dest_push_result = result
+
+    if result["errors"]:
+        first = result["errors"][0]
+        raise Exception(
+            f"{len(result['errors'])} destination batch(es) failed; "
+            f"first: {first['error']}"
+        )
+
+    return pushed
+
+
+def _close_sync(sync_id):
+    """Finish writer streams and write the sync's push logs; returns errors."""
+    errors = []
+    try:
+        finish_write_streams(sync_id)
+    except Exception as e:
+        errors.append({"error": str(e)})
+
+    ctx = end_sync_context(sync_id)
+    if ctx is not None:
+        try:
+            _write_push_logs(ctx.take_push_logs())
+        except Exception as e:
+            print("[ROUTER PUSH LOG ERROR]", e, flush=True)
+
+    return errors
+
+
 def push_to_destination(dest_cfg, source, rows, skip_storage=False):
+    """
+    Push rows to one destination config, or to every config in a list
+    (see get_active_destinations) from a single in-memory batch.
+    """
 
     if not rows:
         return 0
 
-    dest_cfg = validate_destination(dest_cfg)
-    
-    print(f"[ROUTER START] destination={source} | skip_storage={skip_storage}", flush=True)
+    if isinstance(dest_cfg, (list, tuple)):
+        dest_cfg = [validate_destination(d) for d in dest_cfg]
+        if len(dest_cfg) == 1:
+            dest_cfg = dest_cfg[0]
+    else:
+        dest_cfg = validate_destination(dest_cfg)
 
-    # CENTRAL FORMAT RESOLUTION
-    dest_cfg = resolve_destination_format(dest_cfg, source)
+    if has_request_context():
+        sync_id = getattr(g, "_dest_sync_id", None)
+        if sync_id:
+            dest_cfg = _with_sync_id(dest_cfg, sync_id)
 
-    dest_type = dest_cfg.get("type")
+        buffer = getattr(g, "_dest_write_buffer", None)
+        if buffer is not None:
+            return buffer.add(dest_cfg, source, rows, uid=_request_uid(), skip_storage=skip_storage)
 
-    # Extract uid for logging
-    uid = None
+        pipeline = getattr(g, "_dest_push_pipeline", None)
+        if pipeline is not None:
+            return pipeline.submit(dest_cfg, source, rows, skip_storage, _request_uid())
 
-    if has_request_context():
-        uid = getattr(g, "user_id", None)
+    return _deliver(dest_cfg, source, rows, skip_storage, _request_uid())
 
-    # ---------------- 24H RECOVERY HOOK ----------------
+
+def _with_sync_id(dest_cfg, sync_id):
+    if isinstance(dest_cfg, (list, tuple)):
+        return [dict(d, sync_id=sync_id) for d in dest_cfg]
+    return dict(dest_cfg, sync_id=sync_id)
+
+
+def _deliver(dest_cfg, source, rows, skip_storage=False, uid=None):
+    if isinstance(dest_cfg, list):
+        return _fan_out(dest_cfg, source, rows, skip_storage, uid)
+    return _dispatch(dest_cfg, source, rows, skip_storage, uid)
+
+
+# ---------------- MULTI-DESTINATION FAN-OUT ----------------
+
+def _fan_out(dest_cfgs, source, rows, skip_storage=False, uid=None):
+    """
+    Write one batch to several destinations concurrently.
+
+    The recovery buffer is written once and object-store encodings are
+    shared; every destination is dispatched (and logged) on its own, so one
+    failing sink doesn't stop the others. Returns len(rows) if at least one
+    destination succeeded, raises if all of them failed.
+    """
     if not skip_storage and uid:
         try:
             from backend.utils.sync_storage import store_sync_data
@@ -102,64 +327,115 @@ def push_to_destination(dest_cfg, source, rows, skip_storage=False):
         except Exception as e:
             print(f"[ROUTER AUTO BUFFER ERROR] {e}", flush=True)
 
-    # ---------------- FORMAT ISOLATION ----------------
-    if dest_type in ["bigquery", "s3", "azure_datalake", "databricks", "gcs", "duckdb"]:
-        dest_cfg["format"] = (
-            dest_cfg.get("format") or "parquet"
-        ).lower()
-    else:
-        dest_cfg.pop("format", None)
+    def one(cfg):
+        try:
+            return cfg.get("type"), _dispatch(dict(cfg), source, rows, True, uid), None
+        except Exception as e:
+            return cfg.get("type"), 0, e
 
-    try:
-        print(
-            f"[ROUTER] Dispatching rows "
-            f"(source={source}, dest_type={dest_type}, row_count={len(rows)})"
+    with shared_encoding(rows):
+        with ThreadPoolExecutor(max_workers=max(1, min(FANOUT_WORKERS, len(dest_cfgs)))) as pool:
+            results = list(pool.map(one, dest_cfgs))
+
+    failed = [(t, e) for t, _, e in results if e is not None]
+
+    print(
+        f"[ROUTER FANOUT] source={source} rows={len(rows)} "
+        f"destinations={len(results)} ok={len(results) - len(failed)} failed={len(failed)}",
+        flush=True,
+    )
+
+    if failed and len(failed) == len(results):
+        raise Exception(
+            "All destinations failed: "
+            + "; ".join(f"{t}: {e}" for t, e in failed)
         )
 
-        if dest_type == "mysql":
-            count = push_to_mysql(dest_cfg, source, rows)
+    return len(rows)
+
 
-        elif dest_type == "postgres":
-            count = push_postgres(dest_cfg, source, rows)
+# ---------------- DESTINATION HANDLES ----------------
 
-        elif dest_type == "bigquery":
-            count = push_bigquery(dest_cfg, source, rows)
+_WRITERS = {
+    "mysql": push_to_mysql,
+    "postgres": push_postgres,
+    "bigquery": push_bigquery,
+    "snowflake": push_snowflake,
+    "clickhouse": push_clickhouse,
+    "s3": push_s3,
+    "azure_datalake": push_azure_datalake,
+    "databricks": push_databricks,
+    "redshift": push_redshift,
+    "mongodb": push_mongodb,
+    "elasticsearch": push_elasticsearch,
+    "duckdb": push_duckdb,
+    "gcs": push_gcs,
+}
 
-        elif dest_type == "snowflake":
-            count = push_snowflake(dest_cfg, source, rows)
 
-        elif dest_type == "clickhouse":
-            count = push_clickhouse(dest_cfg, source, rows)
+def _prepare_destination(dest_cfg, source, uid=None):
+    """Resolve format and writer for a destination (once per sync)."""
 
-        elif dest_type == "s3":
-            count = push_s3(dest_cfg, source, rows)
+    # CENTRAL FORMAT RESOLUTION
+    dest_cfg = resolve_destination_format(dict(dest_cfg), source, uid)
+
+    # Writers that key records scope the keys by the owning user.
+    if uid:
+        dest_cfg.setdefault("uid", uid)
+
+    dest_type = dest_cfg.get("type")
 
-        elif dest_type == "azure_datalake":
-            count = push_azure_datalake(dest_cfg, source, rows)
+    # ---------------- FORMAT ISOLATION ----------------
+    if dest_type in ["bigquery", "s3", "azure_datalake", "databricks", "gcs", "duckdb"]:
+        dest_cfg["format"] = (
+            dest_cfg.get("format") or "parquet"
+        ).lower()
+    elif dest_type == "postgres":
+        # "typed" selects the column-per-key layout; anything else is JSONB
+        dest_cfg["format"] = (dest_cfg.get("format") or "jsonb").lower()
+    elif dest_type == "clickhouse":
+        # "columnar" selects typed columns; anything else is the payload table
+        dest_cfg["format"] = (dest_cfg.get("format") or "json").lower()
+    else:
+        dest_cfg.pop("format", None)
 
-        elif dest_type == "databricks":
-            count = push_databricks(dest_cfg, source, rows)
+    return DestinationHandle(dest_cfg, _WRITERS.get(dest_type))
 
-        elif dest_type == "redshift":
-            count = push_redshift(dest_cfg, source, rows)
 
-        elif dest_type == "mongodb":
-            count = push_mongodb(dest_cfg, source, rows)
+def _dispatch(dest_cfg, source, rows, skip_storage=False, uid=None):
 
-        elif dest_type == "elasticsearch":
-            count = push_elasticsearch(dest_cfg, source, rows)
+    print(f"[ROUTER START] destination={source} | skip_storage={skip_storage}", flush=True)
 
-        elif dest_type == "duckdb":
-            count = push_duckdb(dest_cfg, source, rows)
+    sync_id = dest_cfg.get("sync_id")
+    ctx = sync_context(sync_id)
+    if ctx is not None:
+        handle = ctx.handle(dest_cfg, source, lambda cfg, src: _prepare_destination(cfg, src, uid))
+    else:
+        handle = _prepare_destination(dest_cfg, source, uid)
 
-        elif dest_type == "gcs":
-            count = push_gcs(dest_cfg, source, rows)
+    dest_type = handle.type
 
-        else:
+    # ---------------- 24H RECOVERY HOOK ----------------
+    if not skip_storage and uid:
+        try:
+            from backend.utils.sync_storage import store_sync_data
+            store_sync_data(uid, source, rows)
+        except Exception as e:
+            print(f"[ROUTER AUTO BUFFER ERROR] {e}", flush=True)
+
+    try:
+        print(
+            f"[ROUTER] Dispatching rows "
+            f"(source={source}, dest_type={dest_type}, row_count={len(rows)})"
+        )
+
+        if handle.writer is None:
             raise Exception(
                 f"Unsupported destination: {dest_type}"
             )
 
+        count = handle.writer(dict(handle.cfg), source, rows)
+
         # SUCCESS LOG
         print(
             f"[ROUTER] Push successful "
@@ -170,7 +446,8 @@ def push_to_destination(dest_cfg, source, rows, skip_storage=False):
             source,
             dest_type,
             count,
-            "success"
+            "success",
+            sync_id=sync_id
         )
 
         return count
@@ -188,7 +465,8 @@ def push_to_destination(dest_cfg, source, rows, skip_storage=False):
             dest_type,
             0,
             "failed",
-            str(e)
+            str(e),
+            sync_id=sync_id
         )
 
         raise e
@@ -196,27 +474,44 @@ def push_to_destination(dest_cfg, source, rows, skip_storage=False):
 # ---------------- USAGE DESTINATION LOGGER ----------------
 
 def log_destination_push(uid, source, dest_type,
-                         rows, status, error=None):
+                         rows, status, error=None, sync_id=None):
+    """
+    Record one push. Inside a sync the row is kept in memory and written
+    with the rest of the sync's logs when it ends.
+    """
+    entry = (
+        uid,
+        source,
+        dest_type,
+        rows,
+        datetime.datetime.utcnow().isoformat(),
+        status,
+        error
+    )
+
+    ctx = sync_context(sync_id)
+    if ctx is not None:
+        ctx.log_push(entry)
+        return
+
+    _write_push_logs([entry])
+
+
+def _write_push_logs(entries):
+
+    if not entries:
+        return
 
     con = sqlite3.connect(DB)
     cur = con.cursor()
 
-    cur.execute("""
+    cur.executemany("""
         INSERT INTO destination_push_logs
         (uid, source, destination_type,
          rows_pushed, pushed_at,
          status, error)
         VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (
-        uid,
-        source,
-        dest_type,
-        rows,
-        datetime.datetime.utcnow().isoformat(),
-        status,
-        error
-    ))
+    """, entries)
 
     con.commit()
     con.close()
-
@@ -1,14 +1,30 @@
 import duckdb
-import pandas as pd
 import os
-import tempfile
-from datetime import datetime
+
+from backend.destinations.client_pool import lease_client
+from backend.destinations.object_store_writer import rows_to_arrow
+from backend.destinations.schema import column_type, fits, logical_from_db, widen
+
+_BATCH_VIEW = "_segmento_batch"
+
+
+def _connect(db_path):
+    # Ensure directory exists for the db path
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    return duckdb.connect(db_path)
+
+
+def _ping(conn):
+    conn.execute("SELECT 1").fetchall()
 
 
 def push_duckdb(dest, source, rows):
     """
     Push rows to DuckDB.
-    Supports parquet and json.
+    Rows are converted to an Arrow table and appended in one INSERT; the
+    parquet / json format setting no longer changes how they are loaded.
     Mapping:
     - file_path -> host
     """
@@ -16,65 +32,89 @@ def push_duckdb(dest, source, rows):
         return 0
 
     db_path = dest["host"]
-    fmt = (dest.get("format") or "parquet").lower()
+    if db_path != ":memory:":
+        db_path = os.path.realpath(db_path)
     table_name = f"{source}_data"
 
-    # Ensure directory exists for the db path
-    db_dir = os.path.dirname(db_path)
-    if db_dir:
-        os.makedirs(db_dir, exist_ok=True)
+    # DuckDB allows one writer per file: a single connection per path is
+    # kept open across batches and leased exclusively. The lease is keyed
+    # on the resolved path alone, so configs that differ only in other
+    # fields still share (and wait for) that one connection.
+    with lease_client({"host": db_path}, "duckdb", lambda: _connect(db_path), validate=_ping,
+                      close=lambda c: c.close(), max_clients=1) as conn:
+        count = _write_rows(conn, table_name, rows)
+
+    print(f"[DEST] Pushed {count} rows to DuckDB ({db_path}, table: {table_name})", flush=True)
+
+    return count
 
-    conn = duckdb.connect(db_path)
 
-    df = pd.DataFrame(rows)
-    df["fetched_at"] = pd.Timestamp.utcnow()
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
 
-    # We use a temporary file to leverage DuckDB's efficient file loading
-    # although for small/medium datasets we could also just register the DF.
-    # To keep it consistent with the "format" requirement:
-    
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=f".{fmt}")
-    file_path = tmp.name
-    tmp.close()
 
+def _write_rows(conn, table_name, rows):
+
+    batch = rows_to_arrow(rows)
+
+    conn.register(_BATCH_VIEW, batch)
     try:
-        if fmt == "parquet":
-            df.to_parquet(file_path, index=False)
-            conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM read_parquet(?)", [file_path])
-            # If table already exists, append
-            conn.execute(f"INSERT INTO {table_name} SELECT * FROM read_parquet(?)", [file_path])
-        elif fmt == "json":
-            df.to_json(file_path, orient="records", lines=True)
-            conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM read_json_auto(?)", [file_path])
-            conn.execute(f"INSERT INTO {table_name} SELECT * FROM read_json_auto(?)", [file_path])
-        else:
-            raise Exception(f"Unsupported DuckDB format: {fmt}")
-
-        # Note: CREATE TABLE AS ... might fail if table exists, so we handle it by catching or checking.
-        # Actually in DuckDB 0.9.x+ one can use:
-        # conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM ... LIMIT 0")
-        # But let's be safer:
-        
-        # Check if table exists
-        exists = conn.execute("SELECT count(*) FROM information_schema.tables WHERE table_name = ?", [table_name]).fetchone()[0]
-        
-        if not exists:
-             if fmt == "parquet":
-                 conn.execute(f"CREATE TABLE {table_name} AS SELECT * FROM read_parquet(?)", [file_path])
-             else:
-                 conn.execute(f"CREATE TABLE {table_name} AS SELECT * FROM read_json_auto(?)", [file_path])
-        else:
-             if fmt == "parquet":
-                 conn.execute(f"INSERT INTO {table_name} SELECT * FROM read_parquet(?)", [file_path])
-             else:
-                 conn.execute(f"INSERT INTO {table_name} SELECT * FROM read_json_auto(?)", [file_path])
-
-        count = len(rows)
-        print(f"[DEST] Pushed {count} rows to DuckDB ({db_path}, table: {table_name})", flush=True)
+        conn.execute("BEGIN TRANSACTION")
+
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table_name} AS "
+            f"SELECT * FROM {_BATCH_VIEW} LIMIT 0"
+        )
+
+        # Schema drift: columns the table hasn't seen yet are added with
+        # the type DuckDB infers for this batch, and columns whose type
+        # can't hold the batch's values are widened the way the typed SQL
+        # writers widen theirs (see schema.py) — INSERT would otherwise
+        # cast them down (DOUBLE into BIGINT rounds) or fail.
+        existing = dict(
+            conn.execute(
+                "SELECT column_name, data_type FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = ?",
+                [table_name],
+            ).fetchall()
+        )
+        batch_columns = conn.execute(f"DESCRIBE SELECT * FROM {_BATCH_VIEW}").fetchall()
+        added = [(name, col_type) for name, col_type, *_ in batch_columns if name not in existing]
+        for name, col_type in added:
+            conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {_quote(name)} {col_type}")
+        if added:
+            print(f"[DUCKDB] Added columns to {table_name}: {', '.join(n for n, _ in added)}", flush=True)
+
+        widened = []
+        for name, col_type, *_ in batch_columns:
+            if name not in existing:
+                continue
+            table_type = logical_from_db(existing[name], "duckdb")
+            batch_type = logical_from_db(col_type, "duckdb")
+            if batch_type and not fits(table_type, batch_type):
+                widened.append((name, widen(table_type, batch_type)))
+        for name, logical in widened:
+            conn.execute(
+                f"ALTER TABLE {table_name} ALTER COLUMN {_quote(name)} "
+                f"TYPE {column_type(logical, 'duckdb')}"
+            )
+        if widened:
+            print(
+                f"[DUCKDB] Widened columns in {table_name}: "
+                + ", ".join(f"{n} -> {t}" for n, t in widened),
+                flush=True,
+            )
+
+        # BY NAME: columns missing from this batch are left NULL.
+        conn.execute(f"INSERT INTO {table_name} BY NAME SELECT * FROM {_BATCH_VIEW}")
+
+        conn.execute("COMMIT")
+
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
 
     finally:
-        if os.path.exists(file_path):
-            os.unlink(file_path)
-        conn.close()
+        conn.unregister(_BATCH_VIEW)
 
-    return count
+    return batch.num_rows
@@ -1,6 +1,32 @@
 from elasticsearch import Elasticsearch, helpers
 from datetime import datetime
 import json
+import os
+
+from backend.destinations.client_pool import lease_client
+from backend.destinations.record_keys import merge_fields, record_key, record_scope
+
+# Bulk request sizing. ES_BULK_THREADS > 1 uses parallel_bulk; 1 uses
+# streaming_bulk, which also retries 429 rejections with backoff.
+ES_BULK_CHUNK_SIZE = int(os.getenv("ES_BULK_CHUNK_SIZE", "500"))
+ES_BULK_MAX_BYTES = int(os.getenv("ES_BULK_MAX_BYTES", str(10 * 1024 * 1024)))
+ES_BULK_THREADS = int(os.getenv("ES_BULK_THREADS", "4"))
+ES_BULK_MAX_RETRIES = int(os.getenv("ES_BULK_MAX_RETRIES", "3"))
+
+
+def _connect(endpoint, user, pwd):
+    if user and pwd:
+        # Assuming https if no scheme provided, or follow host exactly
+        return Elasticsearch(
+            [endpoint],
+            basic_auth=(user, pwd),
+            verify_certs=False # Typically needed for internal dev endpoints
+        )
+    return Elasticsearch([endpoint])
+
+
+def _ping(es):
+    return es.ping()
 
 
 def push_elasticsearch(dest, source, rows):
@@ -23,32 +49,66 @@ def push_elasticsearch(dest, source, rows):
     pwd = dest.get("password")
     index_name = dest["database_name"].lower() # ES indices must be lowercase
 
-    # Build connection
-    if user and pwd:
-        # Assuming https if no scheme provided, or follow host exactly
-        es = Elasticsearch(
-            [endpoint],
-            basic_auth=(user, pwd),
-            verify_certs=False # Typically needed for internal dev endpoints
-        )
-    else:
-        es = Elasticsearch([endpoint])
+    with lease_client(dest, "elasticsearch", lambda: _connect(endpoint, user, pwd), validate=_ping) as es:
+        return _write_rows(es, index_name, rows, _key_func(dest, source))
+
+
+def _key_func(dest, source):
+    # Always keyed (not tied to the warehouse write mode), and scoped by
+    # source: one index holds every connector's documents.
+    fields, scope = merge_fields(dest), record_scope(dest, source)
+    return lambda row: record_key(row, fields, scope)
 
+
+def _actions(index_name, rows, key_of):
+    """
+    Index actions keyed on the record key, so a retry or re-sync
+    overwrites; rows without a record id get an id from Elasticsearch.
+    """
     now = datetime.utcnow().isoformat()
-    
-    actions = []
+
     for r in rows:
         row = dict(r)
         if "fetched_at" not in row:
             row.update({"fetched_at": now})
-        
-        actions.append({
+
+        action = {
+            "_op_type": "index",
             "_index": index_name,
             "_source": row
-        })
+        }
+        key = key_of(r)
+        if key is not None:
+            action["_id"] = key
+        yield action
+
+
+def _bulk(es, actions):
+    options = dict(
+        chunk_size=ES_BULK_CHUNK_SIZE,
+        max_chunk_bytes=ES_BULK_MAX_BYTES,
+        raise_on_error=False,
+        raise_on_exception=True,
+    )
+    if ES_BULK_THREADS > 1:
+        return helpers.parallel_bulk(es, actions, thread_count=ES_BULK_THREADS, **options)
+    return helpers.streaming_bulk(es, actions, max_retries=ES_BULK_MAX_RETRIES, **options)
+
+
+def _write_rows(es, index_name, rows, key_of=lambda row: None):
+
+    success = 0
+    failed = []
+
+    for ok, info in _bulk(es, _actions(index_name, rows, key_of)):
+        if ok:
+            success += 1
+        else:
+            failed.append(info)
+
+    print(f"[DEST] Pushed {success} rows to Elasticsearch (index: {index_name}). Failed: {len(failed)}", flush=True)
 
-    success, failed = helpers.bulk(es, actions)
-    
-    print(f"[DEST] Pushed {success} rows to Elasticsearch (index: {index_name}). Failed: {len(failed) if isinstance(failed, list) else failed}", flush=True)
+    if failed:
+        raise Exception(f"Elasticsearch bulk failed for {len(failed)} rows, first: {json.dumps(failed[0], default=str)[:500]}")
 
     return success
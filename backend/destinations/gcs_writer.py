@@ -1,14 +1,24 @@
 print("### GCS FORMAT-AWARE WRITER LOADED ###", flush=True)
 
 import json
-import tempfile
-import os
-import time
-import pandas as pd
 from google.cloud import storage
 from google.oauth2 import service_account
 from datetime import datetime
 
+from backend.destinations.client_pool import lease_client
+from backend.destinations.object_store_writer import encode_parts, object_key
+
+
+def _connect(dest):
+    try:
+        key_json = json.loads(dest.get("password"))
+        creds = service_account.Credentials.from_service_account_info(key_json)
+        return storage.Client(credentials=creds)
+    except json.JSONDecodeError:
+        raise Exception("GCS destination requires a valid Service Account JSON key (Invalid JSON).")
+    except Exception as e:
+        raise Exception(f"Failed to initialize GCS client: {str(e)}")
+
 
 def push_gcs(dest, source, rows):
     """
@@ -31,74 +41,46 @@ def push_gcs(dest, source, rows):
     if not dest.get("password"):
         raise Exception("GCS destination requires a valid Service Account JSON key.")
 
-    try:
-        key_json = json.loads(dest.get("password"))
-        creds = service_account.Credentials.from_service_account_info(key_json)
-        client = storage.Client(credentials=creds)
-    except json.JSONDecodeError:
-        raise Exception("GCS destination requires a valid Service Account JSON key (Invalid JSON).")
-    except Exception as e:
-        raise Exception(f"Failed to initialize GCS client: {str(e)}")
+    if fmt not in ("parquet", "iceberg", "hudi", "json"):
+        raise Exception(f"Unsupported GCS format: {fmt}")
 
-    bucket = client.bucket(bucket_name)
+    # ------------------------------------------------------------------ #
+    # FILE CREATION                                                        #
+    # Parts are encoded in memory and streamed to the blob one at a time. #
+    # ------------------------------------------------------------------ #
+    now = datetime.utcnow()
+    uploaded = 0
 
-    df = pd.DataFrame(rows)
+    with lease_client(dest, "gcs", lambda: _connect(dest)) as client:
+        bucket = client.bucket(bucket_name)
 
-    for col in df.columns:
-        df[col] = df[col].astype(str)
+        # "iceberg": the uploaded files are committed to an Iceberg table
+        # at gs://bucket/source (see iceberg_metadata).
+        table = None
+        if fmt == "iceberg":
+            from backend.destinations.iceberg_metadata import GcsStore, IcebergTable
+            table = IcebergTable(GcsStore(bucket), source)
+        data_files = []
 
-    df["fetched_at"] = pd.Timestamp.utcnow()
+        for part in encode_parts(rows, fmt, arrow_schema=table.arrow_schema() if table else None):
 
-    # ------------------------------------------------------------------ #
-    # FILE CREATION                                                        #
-    # ------------------------------------------------------------------ #
-    if fmt in ("parquet", "iceberg", "hudi"):
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".parquet")
-        file_path = tmp.name
-        tmp.close()
-
-        df.to_parquet(
-            file_path,
-            engine="pyarrow",
-            index=False,
-        )
-        extension = "parquet"
-
-    elif fmt == "json":
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".json")
-        file_path = tmp.name
-        tmp.close()
-
-        df.to_json(
-            file_path,
-            orient="records",
-            lines=True,
-        )
-        extension = "json"
-
-    else:
-        raise Exception(f"Unsupported GCS format: {fmt}")
+            # PARTITION PATH  →  source/year=YYYY/month=MM/day=DD/file.parquet
+            key = object_key(source, part, now)
 
-    # ------------------------------------------------------------------ #
-    # PARTITION PATH  →  source/year=YYYY/month=MM/day=DD/file.parquet    #
-    # ------------------------------------------------------------------ #
-    now = datetime.utcnow()
-    key = (
-        f"{source}/"
-        f"year={now.year}/"
-        f"month={now.month:02d}/"
-        f"day={now.day:02d}/"
-        f"{source}_{int(time.time())}.{extension}"
-    )
+            print(f"[GCS] Uploading: {key} ({part.num_rows} rows, {part.size} bytes)", flush=True)
 
-    print("[GCS] Uploading:", key, flush=True)
+            blob = bucket.blob(key)
+            blob.upload_from_file(part.reader(), size=part.size)
+            uploaded += 1
 
-    blob = bucket.blob(key)
-    blob.upload_from_filename(file_path)
+            if table:
+                data_files.append(table.data_file(key, part))
 
-    os.unlink(file_path)
+        if table:
+            snapshot_id = table.append(data_files)
+            print(f"[GCS] Committed Iceberg snapshot {snapshot_id} (v{table.version}) → {table.location}", flush=True)
 
-    print(f"[GCS] Uploaded {len(rows)} rows → gs://{bucket_name}/{key}", flush=True)
+    print(f"[GCS] Uploaded {len(rows)} rows in {uploaded} file(s) → gs://{bucket_name}/{source}/", flush=True)
 
     if fmt in ("iceberg", "hudi"):
         table_location = f"gs://{bucket_name}/{source}"
@@ -0,0 +1,968 @@
+"""
+Iceberg table metadata for the object-store destinations.
+
+The S3 / GCS / ADLS writers upload Parquet data files as before; with
+format "iceberg" they then commit those files to an Iceberg (format v2)
+table at the same location. No JVM, catalog service or pyiceberg:
+
+    table = IcebergTable(S3Store(s3, bucket), source)
+    for part in encode_parts(rows, "iceberg", arrow_schema=table.arrow_schema()):
+        s3.upload_fileobj(part.reader(), bucket, key)
+        files.append(table.data_file(key, part))
+    table.append(files)
+
+Each append writes one manifest listing the new files with their row
+counts, sizes, null counts and per-column lower/upper bounds (read from
+the Parquet footers), a manifest list that carries the previous
+snapshot's manifests forward, and metadata/v<N+1>.metadata.json.
+
+The metadata file is created with a create-if-absent write (O_EXCL
+locally, If-None-Match on S3, generation 0 on GCS, overwrite=False on
+ADLS), so two writers can't both commit version N+1; the loser reloads
+and retries. metadata/version-hint.text then points Hadoop-catalog
+readers (Spark, Trino, DuckDB iceberg_scan, pyiceberg StaticTable) at
+the new version.
+
+Tables are unpartitioned: readers prune on the per-file column bounds.
+Data files carry no Parquet field ids, so the table's name mapping
+(schema.name-mapping.default) resolves columns by name.
+
+  * ICEBERG_COMMIT_RETRIES  attempts before a contended commit fails
+  * ICEBERG_STRING_BOUND    characters kept in string lower/upper bounds
+"""
+
+import copy
+import datetime
+import json
+import os
+import random
+import struct
+import time
+import uuid
+import zlib
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+COMMIT_RETRIES = int(os.getenv("ICEBERG_COMMIT_RETRIES", "5"))
+STRING_BOUND = int(os.getenv("ICEBERG_STRING_BOUND", "16"))
+
+_FORMAT_VERSION = 2
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_UTC = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_EPOCH_DATE = datetime.date(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+# ---------------- STORES ----------------
+# Keys are object keys / paths relative to the store's root; uri() is the
+# absolute location written into the metadata.
+
+class _Store:
+
+    def uri(self, key):
+        raise NotImplementedError
+
+    def key(self, uri):
+        root = self.uri("")
+        if not uri.startswith(root):
+            raise Exception(f"{uri} is outside {root}")
+        return uri[len(root):]
+
+
+class LocalStore(_Store):
+    """Tables on a local (or mounted) filesystem."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def uri(self, key):
+        return os.path.join(self.root, key) if key else self.root + os.sep
+
+    def read(self, key):
+        try:
+            with open(self.uri(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _temp(self, key, data):
+        path = self.uri(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        return path, tmp
+
+    def write(self, key, data):
+        path, tmp = self._temp(key, data)
+        os.replace(tmp, path)
+
+    def create(self, key, data):
+        # link() fails if the target exists, and readers never see a
+        # partly written file.
+        path, tmp = self._temp(key, data)
+        try:
+            os.link(tmp, path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.unlink(tmp)
+
+
+def _s3_error(e):
+    return str(getattr(e, "response", {}).get("Error", {}).get("Code", ""))
+
+
+class S3Store(_Store):
+    """boto3 client + bucket. Needs S3 conditional writes (If-None-Match)."""
+
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+
+    def uri(self, key):
+        return f"s3://{self.bucket}/{key}"
+
+    def read(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except Exception as e:
+            if _s3_error(e) in ("NoSuchKey", "404"):
+                return None
+            raise
+
+    def write(self, key, data):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+    def create(self, key, data):
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=data, IfNoneMatch="*")
+            return True
+        except Exception as e:
+            if _s3_error(e) in ("PreconditionFailed", "ConditionalRequestConflict", "412", "409"):
+                return False
+            raise
+
+
+class GcsStore(_Store):
+    """google.cloud.storage Bucket."""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def uri(self, key):
+        return f"gs://{self.bucket.name}/{key}"
+
+    def read(self, key):
+        try:
+            return self.bucket.blob(key).download_as_bytes()
+        except Exception as e:
+            if getattr(e, "code", None) == 404:
+                return None
+            raise
+
+    def write(self, key, data):
+        self.bucket.blob(key).upload_from_string(data)
+
+    def create(self, key, data):
+        try:
+            self.bucket.blob(key).upload_from_string(data, if_generation_match=0)
+            return True
+        except Exception as e:
+            if getattr(e, "code", None) == 412:
+                return False
+            raise
+
+
+class AdlsStore(_Store):
+    """azure-storage-file-datalake FileSystemClient."""
+
+    def __init__(self, fs_client, account_name):
+        self.fs_client = fs_client
+        self.account_name = account_name
+
+    def uri(self, key):
+        return (
+            f"abfss://{self.fs_client.file_system_name}"
+            f"@{self.account_name}.dfs.core.windows.net/{key}"
+        )
+
+    def read(self, key):
+        try:
+            return self.fs_client.get_file_client(key).download_file().readall()
+        except Exception as e:
+            if getattr(e, "status_code", None) == 404:
+                return None
+            raise
+
+    def write(self, key, data):
+        self.fs_client.get_file_client(key).upload_data(data, overwrite=True)
+
+    def create(self, key, data):
+        try:
+            self.fs_client.get_file_client(key).upload_data(data, overwrite=False)
+            return True
+        except Exception as e:
+            if getattr(e, "status_code", None) == 409:
+                return False
+            raise
+
+
+# ---------------- AVRO ----------------
+# Just enough of the Avro object container format for manifests and
+# manifest lists: null / deflate codecs, records, arrays, unions and the
+# primitive types those files use.
+
+_AVRO_MAGIC = b"Obj\x01"
+
+
+def _write_long(out, n):
+    n = (n << 1) ^ (n >> 63)
+    while n & ~0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _write_bytes(out, data):
+    _write_long(out, len(data))
+    out += data
+
+
+def _field_value(record, field):
+    # Records read back from a manifest list are keyed by field id.
+    if field["name"] in record:
+        return record[field["name"]]
+    return record.get(field.get("field-id"))
+
+
+def _write_datum(out, schema, value):
+    if isinstance(schema, list):
+        index = schema.index("null") if value is None else next(
+            i for i, s in enumerate(schema) if s != "null"
+        )
+        _write_long(out, index)
+        _write_datum(out, schema[index], value)
+        return
+
+    kind = schema["type"] if isinstance(schema, dict) else schema
+
+    if kind == "null":
+        return
+    if kind == "boolean":
+        out.append(1 if value else 0)
+    elif kind in ("int", "long"):
+        _write_long(out, int(value))
+    elif kind == "double":
+        out += struct.pack("<d", value)
+    elif kind == "string":
+        _write_bytes(out, value.encode("utf-8"))
+    elif kind == "bytes":
+        _write_bytes(out, value)
+    elif kind == "record":
+        for field in schema["fields"]:
+            _write_datum(out, field["type"], _field_value(value, field))
+    elif kind == "array":
+        items = value
+        if isinstance(items, dict):
+            items = [{"key": k, "value": v} for k, v in items.items()]
+        if items:
+            _write_long(out, len(items))
+            for item in items:
+                _write_datum(out, schema["items"], item)
+        _write_long(out, 0)
+    else:
+        raise Exception(f"Unsupported Avro type: {kind}")
+
+
+def write_avro(schema, records, metadata):
+    """Avro object container file (one block, no codec) as bytes."""
+    sync = os.urandom(16)
+    header = {"avro.schema": json.dumps(schema), "avro.codec": "null", **metadata}
+
+    out = bytearray(_AVRO_MAGIC)
+    _write_long(out, len(header))
+    for k, v in header.items():
+        _write_bytes(out, k.encode("utf-8"))
+        _write_bytes(out, str(v).encode("utf-8"))
+    _write_long(out, 0)
+    out += sync
+
+    if records:
+        block = bytearray()
+        for record in records:
+            _write_datum(block, schema, record)
+        _write_long(out, len(records))
+        _write_long(out, len(block))
+        out += block
+        out += sync
+
+    return bytes(out)
+
+
+class _AvroReader:
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, n):
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+
+    def long(self):
+        shift = n = 0
+        while True:
+            b = self.data[self.pos]
+            self.pos += 1
+            n |= (b & 0x7F) << shift
+            shift += 7
+            if not b & 0x80:
+                return (n >> 1) ^ -(n & 1)
+
+    def bytes(self):
+        return self.read(self.long())
+
+    def datum(self, schema):
+        if isinstance(schema, list):
+            return self.datum(schema[self.long()])
+
+        kind = schema["type"] if isinstance(schema, dict) else schema
+
+        if kind == "null":
+            return None
+        if kind == "boolean":
+            return self.read(1) != b"\x00"
+        if kind in ("int", "long"):
+            return self.long()
+        if kind == "float":
+            return struct.unpack("<f", self.read(4))[0]
+        if kind == "double":
+            return struct.unpack("<d", self.read(8))[0]
+        if kind == "string":
+            return self.bytes().decode("utf-8")
+        if kind == "bytes":
+            return self.bytes()
+        if kind == "fixed":
+            return self.read(schema["size"])
+        if kind == "record":
+            return {
+                field.get("field-id", field["name"]): self.datum(field["type"])
+                for field in schema["fields"]
+            }
+        if kind in ("array", "map"):
+            items = [] if kind == "array" else {}
+            while True:
+                count = self.long()
+                if count == 0:
+                    return items
+                if count < 0:
+                    count = -count
+                    self.long()
+                for _ in range(count):
+                    if kind == "array":
+                        items.append(self.datum(schema["items"]))
+                    else:
+                        key = self.bytes().decode("utf-8")
+                        items[key] = self.datum(schema["values"])
+        raise Exception(f"Unsupported Avro type: {kind}")
+
+
+def read_avro(data):
+    """(header metadata, records) from an Avro object container file."""
+    reader = _AvroReader(data)
+    if reader.read(4) != _AVRO_MAGIC:
+        raise Exception("Not an Avro object container file")
+
+    header = reader.datum({"type": "map", "values": "bytes"})
+    schema = json.loads(header["avro.schema"])
+    codec = header.get("avro.codec", b"null")
+    sync = reader.read(16)
+
+    records = []
+    while reader.pos < len(data):
+        count = reader.long()
+        block = reader.read(reader.long())
+        if codec == b"deflate":
+            block = zlib.decompress(block, -15)
+        elif codec != b"null":
+            raise Exception(f"Unsupported Avro codec: {codec.decode()}")
+        block_reader = _AvroReader(block)
+        records.extend(block_reader.datum(schema) for _ in range(count))
+        if reader.read(16) != sync:
+            raise Exception("Avro sync marker mismatch")
+
+    return {k: v.decode("utf-8") for k, v in header.items()}, records
+
+
+# ---------------- MANIFEST SCHEMAS (format v2) ----------------
+
+def _optional(name, avro_type, field_id):
+    return {"name": name, "type": ["null", avro_type], "default": None, "field-id": field_id}
+
+
+def _int_map(name, field_id, key_id, value_id, value_type):
+    return _optional(name, {
+        "type": "array",
+        "logicalType": "map",
+        "items": {
+            "type": "record",
+            "name": f"k{key_id}_v{value_id}",
+            "fields": [
+                {"name": "key", "type": "int", "field-id": key_id},
+                {"name": "value", "type": value_type, "field-id": value_id},
+            ],
+        },
+    }, field_id)
+
+
+_DATA_FILE = {
+    "type": "record",
+    "name": "r2",
+    "fields": [
+        {"name": "content", "type": "int", "field-id": 134},
+        {"name": "file_path", "type": "string", "field-id": 100},
+        {"name": "file_format", "type": "string", "field-id": 101},
+        {"name": "partition", "type": {"type": "record", "name": "r102", "fields": []}, "field-id": 102},
+        {"name": "record_count", "type": "long", "field-id": 103},
+        {"name": "file_size_in_bytes", "type": "long", "field-id": 104},
+        _int_map("column_sizes", 108, 117, 118, "long"),
+        _int_map("value_counts", 109, 119, 120, "long"),
+        _int_map("null_value_counts", 110, 121, 122, "long"),
+        _int_map("nan_value_counts", 137, 138, 139, "long"),
+        _int_map("lower_bounds", 125, 126, 127, "bytes"),
+        _int_map("upper_bounds", 128, 129, 130, "bytes"),
+        _optional("key_metadata", "bytes", 131),
+        _optional("split_offsets", {"type": "array", "items": "long", "element-id": 133}, 132),
+        _optional("equality_ids", {"type": "array", "items": "int", "element-id": 136}, 135),
+        _optional("sort_order_id", "int", 140),
+    ],
+}
+
+MANIFEST_ENTRY = {
+    "type": "record",
+    "name": "manifest_entry",
+    "fields": [
+        {"name": "status", "type": "int", "field-id": 0},
+        _optional("snapshot_id", "long", 1),
+        _optional("sequence_number", "long", 3),
+        _optional("file_sequence_number", "long", 4),
+        {"name": "data_file", "type": _DATA_FILE, "field-id": 2},
+    ],
+}
+
+MANIFEST_FILE = {
+    "type": "record",
+    "name": "manifest_file",
+    "fields": [
+        {"name": "manifest_path", "type": "string", "field-id": 500},
+        {"name": "manifest_length", "type": "long", "field-id": 501},
+        {"name": "partition_spec_id", "type": "int", "field-id": 502},
+        {"name": "content", "type": "int", "field-id": 517},
+        {"name": "sequence_number", "type": "long", "field-id": 515},
+        {"name": "min_sequence_number", "type": "long", "field-id": 516},
+        {"name": "added_snapshot_id", "type": "long", "field-id": 503},
+        {"name": "added_files_count", "type": "int", "field-id": 504},
+        {"name": "existing_files_count", "type": "int", "field-id": 505},
+        {"name": "deleted_files_count", "type": "int", "field-id": 506},
+        {"name": "added_rows_count", "type": "long", "field-id": 512},
+        {"name": "existing_rows_count", "type": "long", "field-id": 513},
+        {"name": "deleted_rows_count", "type": "long", "field-id": 514},
+        _optional("partitions", {
+            "type": "array",
+            "element-id": 508,
+            "items": {
+                "type": "record",
+                "name": "r508",
+                "fields": [
+                    {"name": "contains_null", "type": "boolean", "field-id": 509},
+                    _optional("contains_nan", "boolean", 518),
+                    _optional("lower_bound", "bytes", 510),
+                    _optional("upper_bound", "bytes", 511),
+                ],
+            },
+        }, 507),
+        _optional("key_metadata", "bytes", 519),
+    ],
+}
+
+_ADDED = 1
+
+
+# ---------------- TYPES AND BOUNDS ----------------
+
+def iceberg_type(arrow_type):
+    if pa.types.is_boolean(arrow_type):
+        return "boolean"
+    if pa.types.is_int64(arrow_type):
+        return "long"
+    if pa.types.is_integer(arrow_type):
+        return "int"
+    if pa.types.is_float64(arrow_type):
+        return "double"
+    if pa.types.is_float32(arrow_type):
+        return "float"
+    if pa.types.is_decimal(arrow_type):
+        return f"decimal({arrow_type.precision}, {arrow_type.scale})"
+    if pa.types.is_timestamp(arrow_type):
+        return "timestamptz" if arrow_type.tz else "timestamp"
+    if pa.types.is_date(arrow_type):
+        return "date"
+    if pa.types.is_time(arrow_type):
+        return "time"
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return "string"
+    if pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type):
+        return "binary"
+    raise Exception(f"No Iceberg type for Arrow type {arrow_type}")
+
+
+_ARROW_TYPES = {
+    "boolean": pa.bool_(),
+    "int": pa.int32(),
+    "long": pa.int64(),
+    "float": pa.float32(),
+    "double": pa.float64(),
+    "timestamp": pa.timestamp("us"),
+    "timestamptz": pa.timestamp("us", tz="UTC"),
+    "date": pa.date32(),
+    "time": pa.time64("us"),
+    "string": pa.string(),
+    "binary": pa.binary(),
+}
+
+
+def arrow_type(ice_type):
+    if ice_type.startswith("decimal("):
+        precision, scale = ice_type[len("decimal("):-1].split(",")
+        return pa.decimal128(int(precision), int(scale))
+    return _ARROW_TYPES[ice_type]
+
+
+def _truncate(value, upper):
+    # Bounds may be shortened: a lower bound by cutting, an upper bound by
+    # cutting and bumping the last character (None if nothing can be bumped).
+    if len(value) <= STRING_BOUND:
+        return value
+    head = value[:STRING_BOUND]
+    if not upper:
+        return head
+    for i in range(len(head) - 1, -1, -1):
+        code = ord(head[i]) + 1
+        if 0xD800 <= code <= 0xDFFF:
+            code = 0xE000
+        if code <= 0x10FFFF:
+            return head[:i] + chr(code)
+    return None
+
+
+def _bound(ice_type, value, upper=False):
+    """Iceberg single-value serialization of a column bound, or None."""
+    if value is None:
+        return None
+    if ice_type == "boolean":
+        return b"\x01" if value else b"\x00"
+    if ice_type == "int":
+        return struct.pack("<i", value)
+    if ice_type == "long":
+        return struct.pack("<q", value)
+    if ice_type in ("float", "double"):
+        if value != value:
+            return None
+        return struct.pack("<f" if ice_type == "float" else "<d", value)
+    if ice_type == "date":
+        return struct.pack("<i", (value - _EPOCH_DATE).days)
+    if ice_type == "time":
+        micros = ((value.hour * 60 + value.minute) * 60 + value.second) * 1_000_000 + value.microsecond
+        return struct.pack("<q", micros)
+    if ice_type in ("timestamp", "timestamptz"):
+        epoch = _EPOCH_UTC if value.tzinfo else _EPOCH
+        return struct.pack("<q", (value - epoch) // _MICROSECOND)
+    if ice_type == "string":
+        value = _truncate(value, upper)
+        return None if value is None else value.encode("utf-8")
+    if ice_type == "binary":
+        if len(value) > STRING_BOUND:
+            return None if upper else bytes(value[:STRING_BOUND])
+        return bytes(value)
+    if ice_type.startswith("decimal("):
+        scale = int(ice_type[:-1].split(",")[1])
+        unscaled = int(value.scaleb(scale))
+        return unscaled.to_bytes((unscaled.bit_length() + 8) // 8, "big", signed=True)
+    return None
+
+
+# ---------------- DATA FILES ----------------
+
+class ColumnStats:
+
+    def __init__(self, arrow_type, size, null_count, lower, upper):
+        self.arrow_type = arrow_type
+        self.size = size
+        self.null_count = null_count
+        self.lower = lower
+        self.upper = upper
+
+
+class DataFile:
+    """An uploaded Parquet file and the stats from its footer."""
+
+    def __init__(self, path, size, record_count, columns):
+        self.path = path
+        self.size = size
+        self.record_count = record_count
+        self.columns = columns
+
+
+def parquet_stats(reader):
+    """(record count, {column: ColumnStats}) from a Parquet footer."""
+    pf = pq.ParquetFile(reader)
+    md = pf.metadata
+    columns = {}
+
+    # Flat schemas only: leaf column i is field i.
+    for i, field in enumerate(pf.schema_arrow):
+        size = 0
+        nulls = 0
+        lower = upper = None
+        bounded = True
+
+        for g in range(md.num_row_groups):
+            chunk = md.row_group(g).column(i)
+            size += chunk.total_compressed_size
+            stats = chunk.statistics
+
+            if stats is None or not stats.has_null_count:
+                nulls = None
+                bounded = False
+                continue
+            if nulls is not None:
+                nulls += stats.null_count
+
+            if stats.has_min_max:
+                lower = stats.min if lower is None else min(lower, stats.min)
+                upper = stats.max if upper is None else max(upper, stats.max)
+            elif stats.null_count < md.row_group(g).num_rows:
+                bounded = False  # values without min/max: bounds unknown
+
+        if not bounded:
+            lower = upper = None
+        columns[field.name] = ColumnStats(field.type, size, nulls, lower, upper)
+
+    return md.num_rows, columns
+
+
+# ---------------- TABLE ----------------
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _snapshot_id():
+    return random.getrandbits(63)
+
+
+class IcebergTable:
+    """
+    A Hadoop-catalog style Iceberg table under `prefix` in `store`
+    (metadata in <prefix>/metadata/). Created on the first append.
+    """
+
+    def __init__(self, store, prefix):
+        self.store = store
+        self.prefix = prefix.strip("/")
+        self.location = store.uri(self.prefix)
+        self.version, self.metadata = self._load()
+
+    def _key(self, name):
+        return f"{self.prefix}/metadata/{name}"
+
+    def _read_version(self, version):
+        data = self.store.read(self._key(f"v{version}.metadata.json"))
+        return json.loads(data) if data else None
+
+    def _load(self):
+        hint = self.store.read(self._key("version-hint.text"))
+        version = int(hint.decode().strip()) if hint and hint.strip() else 0
+        metadata = self._read_version(version) if version else None
+
+        # The hint is written after the commit, so it can lag behind.
+        while True:
+            newer = self._read_version(version + 1)
+            if newer is None:
+                break
+            version, metadata = version + 1, newer
+
+        if metadata and metadata.get("format-version") != _FORMAT_VERSION:
+            raise Exception(
+                f"Iceberg table at {self.location} is format v{metadata.get('format-version')}; "
+                f"only v{_FORMAT_VERSION} tables can be appended to"
+            )
+        return version, metadata
+
+    def _schema(self):
+        if not self.metadata:
+            return None
+        schema_id = self.metadata["current-schema-id"]
+        return next(s for s in self.metadata["schemas"] if s["schema-id"] == schema_id)
+
+    def arrow_schema(self):
+        """The table's current columns as an Arrow schema (None before the first commit)."""
+        schema = self._schema()
+        if schema is None:
+            return None
+        return pa.schema([pa.field(f["name"], arrow_type(f["type"])) for f in schema["fields"]])
+
+    def data_file(self, key, part):
+        """DataFile for an EncodedPart uploaded to `key` in the same store."""
+        record_count, columns = parquet_stats(part.reader())
+        return DataFile(self.store.uri(key), part.size, record_count, columns)
+
+    # ---------------- COMMIT ----------------
+
+    def append(self, files):
+        """Commit `files` as one append snapshot; returns the snapshot id."""
+        if not files:
+            return None
+
+        for attempt in range(1, COMMIT_RETRIES + 1):
+            if attempt > 1:
+                time.sleep(random.uniform(0.05, 0.2) * attempt)
+                self.version, self.metadata = self._load()
+
+            metadata, snapshot_id = self._append_metadata(files, attempt)
+            data = json.dumps(metadata, indent=2).encode("utf-8")
+
+            if self.store.create(self._key(f"v{self.version + 1}.metadata.json"), data):
+                self.version += 1
+                self.metadata = metadata
+                try:
+                    self.store.write(self._key("version-hint.text"), str(self.version).encode())
+                except Exception as e:
+                    # Readers probing past the hint still find the new version.
+                    print(f"[ICEBERG] version-hint update failed for {self.location}: {e}", flush=True)
+                return snapshot_id
+
+            print(f"[ICEBERG] Commit conflict on {self.location} v{self.version + 1}, retrying", flush=True)
+
+        raise Exception(
+            f"Iceberg commit to {self.location} failed after {COMMIT_RETRIES} attempts "
+            f"(concurrent writers)"
+        )
+
+    def _evolve_schema(self, metadata, files):
+        """Add columns the files bring to the table schema; returns the schema."""
+        current = self._schema()
+        fields = copy.deepcopy(current["fields"]) if current else []
+        by_name = {f["name"]: f for f in fields}
+        last_id = metadata["last-column-id"]
+        added = False
+
+        for f in files:
+            for name, stats in f.columns.items():
+                ice_type = iceberg_type(stats.arrow_type)
+                field = by_name.get(name)
+                if field is None:
+                    last_id += 1
+                    field = {"id": last_id, "name": name, "required": False, "type": ice_type}
+                    fields.append(field)
+                    by_name[name] = field
+                    added = True
+                elif field["type"] != ice_type:
+                    raise Exception(
+                        f"Column {name} is {field['type']} in {self.location} "
+                        f"but {ice_type} in {f.path}"
+                    )
+
+        if not added and current is not None:
+            return current
+
+        schema = {
+            "type": "struct",
+            "schema-id": max((s["schema-id"] for s in metadata["schemas"]), default=-1) + 1,
+            "fields": fields,
+        }
+        metadata["schemas"].append(schema)
+        metadata["current-schema-id"] = schema["schema-id"]
+        metadata["last-column-id"] = last_id
+        metadata["properties"]["schema.name-mapping.default"] = json.dumps([
+            {"field-id": f["id"], "names": [f["name"]]} for f in fields
+        ])
+        return schema
+
+    def _new_metadata(self):
+        return {
+            "format-version": _FORMAT_VERSION,
+            "table-uuid": str(uuid.uuid4()),
+            "location": self.location,
+            "last-sequence-number": 0,
+            "last-updated-ms": _now_ms(),
+            "last-column-id": 0,
+            "current-schema-id": 0,
+            "schemas": [],
+            "default-spec-id": 0,
+            "partition-specs": [{"spec-id": 0, "fields": []}],
+            "last-partition-id": 999,
+            "default-sort-order-id": 0,
+            "sort-orders": [{"order-id": 0, "fields": []}],
+            "properties": {"write.format.default": "parquet"},
+            "refs": {},
+            "snapshots": [],
+            "snapshot-log": [],
+            "metadata-log": [],
+        }
+
+    def _manifest_entry(self, f, fields):
+        ids = {c["name"]: (c["id"], c["type"]) for c in fields}
+        sizes, values, nulls, lower, upper = {}, {}, {}, {}, {}
+
+        for name, stats in f.columns.items():
+            field_id, ice_type = ids[name]
+            sizes[field_id] = stats.size
+            values[field_id] = f.record_count
+            if stats.null_count is not None:
+                nulls[field_id] = stats.null_count
+            low = _bound(ice_type, stats.lower)
+            high = _bound(ice_type, stats.upper, upper=True)
+            if low is not None and high is not None:
+                lower[field_id] = low
+                upper[field_id] = high
+
+        # Table columns this file doesn't have read as nulls; saying so
+        # lets readers skip it for predicates on them.
+        for c in fields:
+            if c["name"] not in f.columns:
+                values[c["id"]] = f.record_count
+                nulls[c["id"]] = f.record_count
+
+        # snapshot_id and sequence numbers are null: ADDED entries inherit
+        # them from the manifest list, so a retried commit reuses the file.
+        return {
+            "status": _ADDED,
+            "snapshot_id": None,
+            "sequence_number": None,
+            "file_sequence_number": None,
+            "data_file": {
+                "content": 0,
+                "file_path": f.path,
+                "file_format": "PARQUET",
+                "partition": {},
+                "record_count": f.record_count,
+                "file_size_in_bytes": f.size,
+                "column_sizes": sizes,
+                "value_counts": values,
+                "null_value_counts": nulls,
+                "nan_value_counts": None,
+                "lower_bounds": lower,
+                "upper_bounds": upper,
+                "key_metadata": None,
+                "split_offsets": None,
+                "equality_ids": None,
+                "sort_order_id": None,
+            },
+        }
+
+    def _append_metadata(self, files, attempt):
+        metadata = copy.deepcopy(self.metadata) if self.metadata else self._new_metadata()
+        schema = self._evolve_schema(metadata, files)
+
+        snapshot_id = _snapshot_id()
+        sequence_number = metadata["last-sequence-number"] + 1
+        parent = next(
+            (s for s in metadata["snapshots"] if s["snapshot-id"] == metadata.get("current-snapshot-id")),
+            None,
+        )
+        now = _now_ms()
+
+        # Manifest with the new files.
+        manifest = write_avro(
+            MANIFEST_ENTRY,
+            [self._manifest_entry(f, schema["fields"]) for f in files],
+            {
+                "schema": json.dumps(schema),
+                "schema-id": schema["schema-id"],
+                "partition-spec": "[]",
+                "partition-spec-id": 0,
+                "format-version": _FORMAT_VERSION,
+                "content": "data",
+            },
+        )
+        manifest_key = self._key(f"{uuid.uuid4()}-m0.avro")
+        self.store.write(manifest_key, manifest)
+
+        added_rows = sum(f.record_count for f in files)
+        added_size = sum(f.size for f in files)
+        manifests = [{
+            "manifest_path": self.store.uri(manifest_key),
+            "manifest_length": len(manifest),
+            "partition_spec_id": 0,
+            "content": 0,
+            "sequence_number": sequence_number,
+            "min_sequence_number": sequence_number,
+            "added_snapshot_id": snapshot_id,
+            "added_files_count": len(files),
+            "existing_files_count": 0,
+            "deleted_files_count": 0,
+            "added_rows_count": added_rows,
+            "existing_rows_count": 0,
+            "deleted_rows_count": 0,
+            "partitions": [],
+            "key_metadata": None,
+        }]
+
+        # Manifest list: the new manifest plus everything the parent had.
+        if parent:
+            data = self.store.read(self.store.key(parent["manifest-list"]))
+            if data is None:
+                raise Exception(f"Manifest list missing: {parent['manifest-list']}")
+            manifests.extend(read_avro(data)[1])
+
+        manifest_list = write_avro(MANIFEST_FILE, manifests, {
+            "snapshot-id": snapshot_id,
+            "parent-snapshot-id": parent["snapshot-id"] if parent else "null",
+            "sequence-number": sequence_number,
+            "format-version": _FORMAT_VERSION,
+        })
+        list_key = self._key(f"snap-{snapshot_id}-{attempt}-{uuid.uuid4()}.avro")
+        self.store.write(list_key, manifest_list)
+
+        totals = parent["summary"] if parent else {}
+        snapshot = {
+            "snapshot-id": snapshot_id,
+            "sequence-number": sequence_number,
+            "timestamp-ms": now,
+            "manifest-list": self.store.uri(list_key),
+            "schema-id": schema["schema-id"],
+            "summary": {
+                "operation": "append",
+                "added-data-files": str(len(files)),
+                "added-records": str(added_rows),
+                "added-files-size": str(added_size),
+                "total-data-files": str(int(totals.get("total-data-files", 0)) + len(files)),
+                "total-records": str(int(totals.get("total-records", 0)) + added_rows),
+                "total-files-size": str(int(totals.get("total-files-size", 0)) + added_size),
+                "total-delete-files": "0",
+                "total-position-deletes": "0",
+                "total-equality-deletes": "0",
+            },
+        }
+        if parent:
+            snapshot["parent-snapshot-id"] = parent["snapshot-id"]
+
+        if self.version:
+            metadata["metadata-log"].append({
+                "timestamp-ms": metadata["last-updated-ms"],
+                "metadata-file": self.store.uri(self._key(f"v{self.version}.metadata.json")),
+            })
+        metadata["snapshots"].append(snapshot)
+        metadata["snapshot-log"].append({"timestamp-ms": now, "snapshot-id": snapshot_id})
+        metadata["current-snapshot-id"] = snapshot_id
+        metadata["refs"] = {**metadata.get("refs", {}), "main": {"snapshot-id": snapshot_id, "type": "branch"}}
+        metadata["last-sequence-number"] = sequence_number
+        metadata["last-updated-ms"] = now
+
+        return metadata, snapshot_id
@@ -13,8 +13,13 @@ Design contract
   * Does NOT use PyIceberg / Apache Hudi / Spark / any JVM dependency.
   * Only records table metadata in a local SQLite registry so the same
     (source, storage_type, table_format) triple is never registered twice.
-  * S3 and ADLS writers call register_*_table() AFTER they have already
+  * S3, GCS and ADLS writers call register_*_table() AFTER they have already
     uploaded the Parquet file themselves.
+  * Iceberg tables are real Iceberg tables: the writers commit each upload
+    as a snapshot (manifests with per-file column stats, vN.metadata.json,
+    version-hint.text) through iceberg_metadata.py, and table_location
+    here is the root a Hadoop-catalog reader opens. Hudi tables are still
+    loose Parquet files plus this registry row.
 
 Registry location
 -----------------
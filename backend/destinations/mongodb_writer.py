@@ -1,6 +1,18 @@
 import pymongo
+from pymongo import InsertOne, ReplaceOne
 from datetime import datetime
 import json
+import os
+
+from backend.destinations.client_pool import lease_client
+from backend.destinations.record_keys import merge_fields, record_key, record_scope
+
+# Writes per unordered bulk_write call.
+MONGO_BULK_PAGE = int(os.getenv("MONGO_BULK_PAGE", "1000"))
+
+
+def _ping(client):
+    client.admin.command("ping")
 
 
 def push_mongodb(dest, source, rows):
@@ -18,26 +30,55 @@ def push_mongodb(dest, source, rows):
     db_name = dest["database_name"]
     collection_name = f"{source}_data"
 
-    client = pymongo.MongoClient(uri)
-    db = client[db_name]
-    collection = db[collection_name]
+    with lease_client(dest, "mongodb", lambda: pymongo.MongoClient(uri), validate=_ping) as client:
+        return _write_rows(client[db_name][collection_name], db_name, collection_name, rows, _key_func(dest, source))
 
-    # MongoDB expects list of dicts. 
-    # Ensure all rows have fetched_at if not present.
+
+def _key_func(dest, source):
+    # Always keyed (not tied to the warehouse write mode): a retried or
+    # re-synced page replaces its documents instead of duplicating them.
+    fields, scope = merge_fields(dest), record_scope(dest, source)
+    return lambda row: record_key(row, fields, scope)
+
+
+def _pages(rows, key_of):
+    """
+    Pages of upserting ReplaceOne ops keyed on the record key; rows
+    without a record id are plain inserts.
+    """
     now = datetime.utcnow().isoformat()
-    
-    formatted_rows = []
+
+    page = []
     for r in rows:
         row = dict(r)
         if "fetched_at" not in row:
             row.update({"fetched_at": now})
-        formatted_rows.append(row)
 
-    result = collection.insert_many(formatted_rows)
-    count = len(result.inserted_ids)
+        key = key_of(r)
+        if key is None:
+            page.append(InsertOne(row))
+        else:
+            row["_id"] = key
+            page.append(ReplaceOne({"_id": key}, row, upsert=True))
+
+        if len(page) >= MONGO_BULK_PAGE:
+            yield page
+            page = []
+
+    if page:
+        yield page
+
+
+def _write_rows(collection, db_name, collection_name, rows, key_of=lambda row: None):
+
+    count = 0
 
-    client.close()
+    for page in _pages(rows, key_of):
+        # Unordered: the server applies the page in parallel and one bad
+        # document doesn't stop the rest (BulkWriteError lists failures).
+        result = collection.bulk_write(page, ordered=False)
+        count += result.inserted_count + result.upserted_count + result.matched_count
 
-    print(f"[DEST] Pushed {count} rows to MongoDB ({db_name}.{collection_name})", flush=True)
+    print(f"[DEST] Wrote {count} rows to MongoDB ({db_name}.{collection_name})", flush=True)
 
     return count
@@ -1,13 +1,18 @@
 import mysql.connector
-from datetime import datetime
+import json
+import os
+import time
+from datetime import datetime, timezone
 
+from backend.destinations.client_pool import lease_client
+from backend.destinations.schema import column_type, evolve, forget, infer_schema, logical_from_db, widen
 
-def push_to_mysql(dest, source, rows):
+# Rows per multi-row INSERT; keeps each statement under max_allowed_packet.
+MYSQL_INSERT_BATCH = int(os.getenv("MYSQL_INSERT_BATCH", "1000"))
 
-    if not rows:
-        return 0
 
-    conn = mysql.connector.connect(
+def _connect(dest):
+    return mysql.connector.connect(
         host=dest["host"],
         port=int(dest["port"]),
         user=dest["username"],
@@ -15,77 +20,174 @@ def push_to_mysql(dest, source, rows):
         database=dest["database_name"]
     )
 
-    cur = conn.cursor()
-
-    # ---------- Build Table Name ----------
-    table = f"{source}_data"
-
-    # ---------- Determine Columns ----------
-    columns = list(rows[0].keys())
-
-    # Check if fetched_at already exists
-    has_fetched_at = "fetched_at" in columns
 
-    col_defs = []
+def _ping(conn):
+    conn.ping(reconnect=False)
 
-    for c in columns:
-        col_defs.append(f"`{c}` TEXT")
 
-    if not has_fetched_at:
-        col_defs.append("fetched_at DATETIME")
+def push_to_mysql(dest, source, rows):
 
-    col_sql = ", ".join(col_defs)
+    if not rows:
+        return 0
 
-    # ---------- Create Table ----------
-    create_sql = f"""
-        CREATE TABLE IF NOT EXISTS {table} (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            {col_sql}
-        )
-    """
+    with lease_client(dest, "mysql", lambda: _connect(dest), validate=_ping) as conn:
+        return _write_rows(conn, dest, source, rows)
 
-    cur.execute(create_sql)
 
-    # ---------- Insert Rows ----------
-    cols = list(columns)
-    placeholders = ", ".join(["%s"] * len(cols))
-    col_names = ", ".join([f"`{c}`" for c in cols])
+def _quote(name):
+    return "`" + str(name).replace("`", "``") + "`"
 
-    now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
 
-    if has_fetched_at:
-        insert_sql = f"""
-            INSERT INTO {table}
-            ({col_names})
-            VALUES ({placeholders})
-        """
-    else:
-        insert_sql = f"""
-            INSERT INTO {table}
-            ({col_names}, fetched_at)
-            VALUES ({placeholders}, %s)
-        """
+def _value(v):
+    # The driver handles None / numbers / datetimes natively; only nested
+    # structures need serialising (str() turned them into Python reprs).
+    if isinstance(v, (dict, list)):
+        return json.dumps(v, default=str)
+    if isinstance(v, datetime) and v.tzinfo:
+        # DATETIME has no zone: store aware values as UTC.
+        return v.astimezone(timezone.utc).replace(tzinfo=None)
+    return v
 
-    count = 0
 
-    for r in rows:
-        try:
+def _text(v):
+    # TEXT columns (every column of tables from before typed writes, and
+    # columns widened to string) get text, as they always did.
+    v = _value(v)
+    return v if v is None or isinstance(v, str) else str(v)
 
-            values = [str(r.get(c)) for c in cols]
 
-            if not has_fetched_at:
-                values.append(now)
+def _existing_columns(cur, table):
+    cur.execute(
+        """
+        SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """,
+        (table,),
+    )
+    existing = {}
+    for name, data_type in cur.fetchall():
+        name = name.decode() if isinstance(name, (bytes, bytearray)) else name
+        data_type = data_type.decode() if isinstance(data_type, (bytes, bytearray)) else data_type
+        if name.lower() != "id":
+            existing[name.lower()] = logical_from_db(data_type, "mysql")
+    return existing
 
-            cur.execute(insert_sql, values)
 
-            count += 1
+def _write_rows(conn, dest, source, rows):
 
-        except Exception as e:
-            print("[MYSQL] Insert error:", e, flush=True)
+    start = time.monotonic()
+    cur = conn.cursor()
 
-    conn.commit()
-    conn.close()
+    # ---------- Build Table Name ----------
+    table = f"{source}_data"
 
-    print(f"[DEST] Pushed {count} rows to MySQL ({table})", flush=True)
+    # ---------- Determine Columns ----------
+    # MySQL column names are case-insensitive: match on lower case, read
+    # values with the row's own key.
+    keys = {}
+    incoming = {}
+    for k, t in infer_schema(rows).items():
+        keys.setdefault(k.lower(), []).append(k)
+        incoming[k.lower()] = t if k.lower() not in incoming else widen(incoming[k.lower()], t)
+
+    has_fetched_at = "fetched_at" in incoming
+    if not has_fetched_at:
+        incoming["fetched_at"] = "timestamp"
+
+    change = evolve(source, dest, incoming, lambda: _existing_columns(cur, table), table)
+    columns = change.columns
+
+    def name(c):
+        return _quote(keys[c][0] if c in keys else c)
+
+    try:
+        # ---------- Create Table / Evolve Columns ----------
+        if change.new_table:
+            col_sql = ", ".join(
+                f"{name(c)} {column_type(t, 'mysql')}" for c, t in columns.items()
+            )
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    {col_sql}
+                )
+            """)
+        elif change.added:
+            cur.execute(
+                f"ALTER TABLE {table} "
+                + ", ".join(f"ADD COLUMN {name(c)} {column_type(columns[c], 'mysql')}" for c in change.added)
+            )
+            print(f"[MYSQL] Added columns to {table}: {', '.join(change.added)}", flush=True)
+
+        # A column whose type can't take the batch (floats into BIGINT,
+        # strings into DATETIME) is widened first: inserting anyway rounds
+        # the values, or fails every batch under strict mode.
+        modified = [
+            c for c, t in change.widened.items()
+            if column_type(t, "mysql") != column_type(change.conflicts[c][0], "mysql")
+        ]
+        if modified:
+            cur.execute(
+                f"ALTER TABLE {table} "
+                + ", ".join(f"MODIFY COLUMN {name(c)} {column_type(columns[c], 'mysql')}" for c in modified)
+            )
+            print(
+                f"[MYSQL] Widened columns in {table}: "
+                + ", ".join(f"{c} -> {columns[c]}" for c in modified),
+                flush=True,
+            )
+
+        # ---------- Insert Rows ----------
+        wanted = list(columns)
+        placeholders = ", ".join(["%s"] * len(wanted))
+        col_names = ", ".join(name(c) for c in wanted)
+
+        insert_sql = f"INSERT INTO {table} ({col_names}) VALUES ({placeholders})"
+
+        now = datetime.utcnow()
+
+        convert = {c: _text if t == "string" else _value for c, t in columns.items()}
+
+        def value(r, c):
+            if c == "fetched_at" and not has_fetched_at:
+                return now
+            for k in keys[c]:
+                if r.get(k) is not None:
+                    return convert[c](r[k])
+            return None
+
+        values = [[value(r, c) for c in wanted] for r in rows]
+
+        count = 0
+        batches = 0
+
+        # executemany folds each chunk into one multi-row INSERT
+        for i in range(0, len(values), MYSQL_INSERT_BATCH):
+            chunk = values[i:i + MYSQL_INSERT_BATCH]
+            cur.executemany(insert_sql, chunk)
+            count += len(chunk)
+            batches += 1
+
+        conn.commit()
+
+    except Exception as e:
+        print(f"[MYSQL] Insert failed: {e}", flush=True)
+        conn.rollback()
+        forget(source, dest, table)
+        raise
+
+    finally:
+        cur.close()
+
+    change.commit()
+
+    elapsed = time.monotonic() - start
+    rate = count / elapsed if elapsed > 0 else float(count)
+
+    print(
+        f"[DEST] Pushed {count} rows to MySQL ({table}) in {batches} batch(es), "
+        f"{elapsed:.2f}s, {rate:,.0f} rows/s",
+        flush=True,
+    )
 
-    return count
\ No newline at end of file
+    return count
@@ -0,0 +1,293 @@
+"""
+Shared encoder for the object-store destinations (S3, GCS, ADLS).
+
+Rows go straight from dicts to an Arrow table with inferred column types
+(no pandas, no astype(str)) and are written as Parquet or NDJSON into
+in-memory buffers, split into parts of roughly OBJECT_STORE_TARGET_FILE_MB.
+Only one part is held in memory at a time and nothing touches local disk.
+
+    for part in encode_parts(rows, fmt):
+        client.upload(part.reader(), object_key(source, part))
+"""
+
+import datetime
+import decimal
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from backend.destinations.schema import infer_schema
+
+TARGET_FILE_MB = float(os.getenv("OBJECT_STORE_TARGET_FILE_MB", "128"))
+ROW_GROUP_SIZE = int(os.getenv("OBJECT_STORE_ROW_GROUP_SIZE", "100000"))
+COMPRESSION = os.getenv("OBJECT_STORE_COMPRESSION", "snappy").lower()
+
+_COMPRESSIONS = ("snappy", "zstd", "gzip", "lz4", "brotli", "none")
+
+
+class EncodedPart:
+    """One encoded object: bytes held in an Arrow buffer plus its stats."""
+
+    def __init__(self, batch_id, index, extension, buffer, num_rows):
+        self.batch_id = batch_id
+        self.index = index
+        self.extension = extension
+        self.buffer = buffer
+        self.num_rows = num_rows
+
+    @property
+    def size(self):
+        return self.buffer.size
+
+    def reader(self):
+        """Seekable file-like view over the buffer (no copy)."""
+        return pa.BufferReader(self.buffer)
+
+
+# ---------------- ARROW CONVERSION ----------------
+
+_ARROW_TYPES = {
+    "bool": pa.bool_(),
+    "int": pa.int64(),
+    "float": pa.float64(),
+    "timestamp": pa.timestamp("us"),
+    "timestamptz": pa.timestamp("us", tz="UTC"),
+    "date": pa.date32(),
+    "time": pa.time64("us"),
+}
+
+
+def _text(v):
+    # Nested values are kept as JSON text so a file's schema doesn't depend
+    # on which keys happened to appear inside them.
+    if isinstance(v, (dict, list, tuple, set)):
+        return json.dumps(v if not isinstance(v, set) else sorted(v, key=str), default=str)
+    return v if isinstance(v, str) else str(v)
+
+
+def _string_column(values):
+    return pa.array([None if v is None else _text(v) for v in values], type=pa.string())
+
+
+def _column(values, logical):
+    if logical in ("string", "json"):
+        return _string_column(values)
+    try:
+        if logical == "decimal":
+            # Fixed precision keeps the file schema stable across batches.
+            return pa.array([
+                None if v is None else v if isinstance(v, decimal.Decimal) else decimal.Decimal(str(v))
+                for v in values
+            ], type=pa.decimal128(38, 10))
+        return pa.array(values, type=_ARROW_TYPES[logical])
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, OverflowError, TypeError):
+        # A value outside the inferred sample didn't fit — text for this column only.
+        return _string_column(values)
+
+
+def rows_to_arrow(rows, fetched_at=None):
+    """
+    Build an Arrow table from row dicts.
+
+    Columns are the union of keys in first-seen order, typed by the shared
+    schema inference (see schema.py); missing keys become nulls. A
+    fetched_at UTC timestamp is appended unless the rows already carry one.
+    """
+    columns = {
+        name: _column([r.get(name) for r in rows], logical)
+        for name, logical in infer_schema(rows).items()
+    }
+
+    if "fetched_at" not in columns:
+        ts = fetched_at or datetime.datetime.now(datetime.timezone.utc)
+        columns["fetched_at"] = pa.array(
+            [ts] * len(rows), type=pa.timestamp("us", tz="UTC")
+        )
+
+    return pa.table(columns)
+
+
+def conform(table, schema):
+    """
+    Cast the columns `schema` also has to its types, so every file written
+    to one table agrees with it. A column that is null throughout the
+    batch takes the schema's type; values that don't cast raise — Iceberg
+    only promotes int -> long, float -> double and decimal precision, so
+    the widening the SQL writers do (schema.widen) has no equivalent here.
+    """
+    for i, field in enumerate(table.schema):
+        index = schema.get_field_index(field.name)
+        if index < 0 or schema.field(index).type == field.type:
+            continue
+        target = schema.field(index).type
+        column = table.column(i)
+        if column.null_count == len(column):
+            column = pa.nulls(len(column), type=target)
+        else:
+            try:
+                column = column.cast(target)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                raise Exception(
+                    f"Column {field.name} is {target} in the table but {field.type} in this batch: {e}"
+                )
+        table = table.set_column(i, pa.field(field.name, target), column)
+    return table
+
+
+# ---------------- ENCODERS ----------------
+
+def _compression(value):
+    value = (value or COMPRESSION).lower()
+    if value not in _COMPRESSIONS:
+        raise Exception(f"Unsupported compression: {value}")
+    return None if value == "none" else value
+
+
+def _parquet_parts(batch_id, table, target_bytes, row_group_size, compression):
+    index = 0
+    offset = 0
+    total = table.num_rows
+
+    while offset < total:
+        sink = pa.BufferOutputStream()
+        writer = pq.ParquetWriter(sink, table.schema, compression=compression)
+        rows_in_part = 0
+        try:
+            while offset < total and sink.tell() < target_bytes:
+                chunk = table.slice(offset, row_group_size)
+                writer.write_table(chunk, row_group_size=row_group_size)
+                offset += chunk.num_rows
+                rows_in_part += chunk.num_rows
+        finally:
+            writer.close()
+
+        yield EncodedPart(batch_id, index, "parquet", sink.getvalue(), rows_in_part)
+        index += 1
+
+
+def _json_parts(batch_id, table, target_bytes):
+    index = 0
+    sink = pa.BufferOutputStream()
+    rows_in_part = 0
+
+    for batch in table.to_batches(max_chunksize=10000):
+        for row in batch.to_pylist():
+            line = json.dumps(row, default=_json_default) + "\n"
+            sink.write(line.encode("utf-8"))
+            rows_in_part += 1
+
+            if sink.tell() >= target_bytes:
+                yield EncodedPart(batch_id, index, "json", sink.getvalue(), rows_in_part)
+                index += 1
+                sink = pa.BufferOutputStream()
+                rows_in_part = 0
+
+    if rows_in_part:
+        yield EncodedPart(batch_id, index, "json", sink.getvalue(), rows_in_part)
+
+
+def _json_default(v):
+    if isinstance(v, (datetime.datetime, datetime.date, datetime.time)):
+        return v.isoformat()
+    return str(v)
+
+
+# ---------------- SHARED ENCODING ----------------
+# When one batch fans out to several object stores, the first writer to ask
+# for a given encoding builds it and the others reuse the same buffers.
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+@contextmanager
+def shared_encoding(rows):
+    """Encode `rows` at most once per (format, options) inside this block."""
+    key = id(rows)
+    with _shared_lock:
+        _shared[key] = {"rows": rows, "lock": threading.Lock(), "parts": {}}
+    try:
+        yield
+    finally:
+        with _shared_lock:
+            _shared.pop(key, None)
+
+
+def _shared_parts(rows, options):
+    with _shared_lock:
+        entry = _shared.get(id(rows))
+    if entry is None or entry["rows"] is not rows:
+        return None
+    with entry["lock"]:
+        if options not in entry["parts"]:
+            entry["parts"][options] = list(_encode(rows, *options))
+        return iter(entry["parts"][options])
+
+
+def encode_parts(rows, fmt="parquet", target_file_mb=None,
+                 row_group_size=None, compression=None, arrow_schema=None):
+    """
+    Yield EncodedPart objects for a batch.
+
+    fmt "parquet" / "iceberg" / "hudi" -> Parquet (row groups of
+    row_group_size rows, compressed with snappy / zstd / gzip / ...);
+    fmt "json" -> newline-delimited JSON. A new part starts once the
+    current one reaches target_file_mb. With arrow_schema (an existing
+    table's columns), matching columns are conformed to it first.
+    """
+    fmt = (fmt or "parquet").lower()
+    if fmt in ("iceberg", "hudi"):
+        fmt = "parquet"
+    options = (
+        fmt,
+        target_file_mb or TARGET_FILE_MB,
+        max(1, row_group_size or ROW_GROUP_SIZE),
+        compression or COMPRESSION,
+        arrow_schema,
+    )
+    shared = _shared_parts(rows, options)
+    if shared is not None:
+        return shared
+    return _encode(rows, *options)
+
+
+def _encode(rows, fmt, target_file_mb, row_group_size, compression, arrow_schema=None):
+    target_bytes = int(target_file_mb * 1024 * 1024)
+    table = rows_to_arrow(rows)
+    if arrow_schema is not None:
+        table = conform(table, arrow_schema)
+    batch_id = uuid.uuid4().hex[:8]
+
+    if fmt == "parquet":
+        return _parquet_parts(
+            batch_id,
+            table,
+            target_bytes,
+            row_group_size,
+            _compression(compression),
+        )
+
+    if fmt == "json":
+        return _json_parts(batch_id, table, target_bytes)
+
+    raise Exception(f"Unsupported object store format: {fmt}")
+
+
+# ---------------- OBJECT KEYS ----------------
+
+def object_key(source, part, now=None):
+    """source/year=YYYY/month=MM/day=DD/source_<ts>_<batch>_<part>.<ext>"""
+    now = now or datetime.datetime.utcnow()
+    return (
+        f"{source}/"
+        f"year={now.year}/"
+        f"month={now.month:02d}/"
+        f"day={now.day:02d}/"
+        f"{source}_{int(time.time())}_{part.batch_id}_{part.index:04d}.{part.extension}"
+    )
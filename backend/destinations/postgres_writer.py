@@ -1,9 +1,23 @@
 import psycopg2
+import hashlib
 import json
+import datetime
+
+from backend.destinations.client_pool import lease_client, ping_dbapi
+from backend.destinations.record_keys import merge_fields
+from backend.destinations.schema import column_type, evolve, forget, infer_schema, logical_from_db
+
+# Characters COPY's text format treats specially.
+_COPY_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    "\t": "\\t",
+    "\n": "\\n",
+    "\r": "\\r",
+})
 
-def push_postgres(dest, source, rows):
 
-    conn = psycopg2.connect(
+def _connect(dest):
+    return psycopg2.connect(
         host=dest["host"],
         port=dest["port"],
         user=dest["username"],
@@ -11,11 +25,145 @@ def push_postgres(dest, source, rows):
         dbname=dest["database_name"]
     )
 
+
+def push_postgres(dest, source, rows):
+    """
+    Push rows to Postgres with COPY ... FROM STDIN.
+
+    - format "typed" -> one column per key, types inferred from the batch
+    - anything else  -> the original (id, payload JSONB) layout
+    - merge_key      -> the destination's merge_key setting; rows are
+                        staged in a temp table and upserted on that key
+                        instead of appended. Rows missing the key are
+                        appended.
+    """
+    if not rows:
+        return 0
+
+    typed = (dest.get("format") or "").lower() == "typed"
+    merge_key = merge_fields(dest) or []
+
+    with lease_client(dest, "postgres", lambda: _connect(dest), validate=ping_dbapi) as conn:
+        if typed:
+            count = _write_typed(conn, dest, source, rows, merge_key)
+        else:
+            count = _write_jsonb(conn, source, rows, merge_key)
+
+    mode = "upserted" if merge_key else "pushed"
+    print(f"[DEST] {mode.capitalize()} {count} rows to Postgres ({'typed' if typed else 'jsonb'})", flush=True)
+
+    return count
+
+
+def _ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+# ---------------- COPY STREAM ----------------
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, default=str)
+    elif isinstance(value, (datetime.datetime, datetime.date)):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return value.translate(_COPY_ESCAPES)
+
+
+class _CopyStream:
+    """File-like reader that encodes rows into COPY text lines on demand."""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buf = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buf) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buf += line
+        if size < 0:
+            out, self._buf = self._buf, ""
+        else:
+            out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+
+def _copy(cur, table, columns, lines):
+    cols = ", ".join(_ident(c) for c in columns)
+    cur.copy_expert(
+        f"COPY {table} ({cols}) FROM STDIN",
+        _CopyStream(lines),
+        size=1 << 16,
+    )
+
+
+def _dedupe_last(rows, merge_key):
+    """
+    Keep the last row per key — ON CONFLICT cannot touch a row twice.
+    Rows with a NULL key part never conflict, so they are all kept.
+    """
+    latest = {}
+    for i, r in enumerate(rows):
+        parts = tuple(r.get(k) for k in merge_key)
+        latest[tuple(map(str, parts)) if None not in parts else i] = r
+    return list(latest.values())
+
+
+def _merge_index(cur, table, pk, key_terms):
+    """
+    Build the unique index ON CONFLICT needs for this merge key.
+
+    It is named after the key, so changing the merge key builds a new
+    index (and drops the old one) instead of keeping a stale one. Rows
+    the table got before merging was turned on are deduplicated first,
+    keeping the latest per key, or the index could not be built.
+    """
+    terms = key_terms("")
+    prefix = f"{table[:40]}_merge_"
+    name = prefix + hashlib.sha1(", ".join(terms).encode("utf-8")).hexdigest()[:12]
+
+    cur.execute(
+        "SELECT indexname FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = %s",
+        (table,),
+    )
+    indexes = [r[0] for r in cur.fetchall()]
+    if name in indexes:
+        return
+
+    for old in indexes:
+        if old.startswith(prefix) or old == f"{table}_merge_key":
+            cur.execute(f"DROP INDEX IF EXISTS {_ident(old)}")
+
+    cur.execute(
+        f"DELETE FROM {table} a USING {table} b WHERE a.{pk} < b.{pk} AND "
+        + " AND ".join(f"{x} = {y}" for x, y in zip(key_terms("a."), key_terms("b.")))
+    )
+    if cur.rowcount:
+        print(
+            f"[POSTGRES] Removed {cur.rowcount} duplicate row(s) from {table} "
+            f"before merging on ({', '.join(terms)})",
+            flush=True,
+        )
+
+    cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {_ident(name)} ON {table} ({', '.join(terms)})")
+
+
+# ---------------- JSONB LAYOUT ----------------
+
+def _write_jsonb(conn, source, rows, merge_key):
+
     cur = conn.cursor()
 
     table = f"{source}_data"
 
-
     cur.execute(f"""
         CREATE TABLE IF NOT EXISTS {table} (
             id SERIAL PRIMARY KEY,
@@ -23,23 +171,152 @@ def push_postgres(dest, source, rows):
         )
     """)
 
+    dumps = json.JSONEncoder(default=str).encode
 
-    count = 0
+    if not merge_key:
+        _copy(cur, table, ["payload"], (
+            dumps(r).translate(_COPY_ESCAPES) + "\n" for r in rows
+        ))
+        conn.commit()
+        cur.close()
+        return len(rows)
 
-    for r in rows:
+    rows = _dedupe_last(rows, merge_key)
+    def key_terms(alias):
+        return [f"({alias}payload->>'{k.replace(chr(39), chr(39) * 2)}')" for k in merge_key]
 
+    key_exprs = ", ".join(key_terms(""))
+
+    _merge_index(cur, table, "id", key_terms)
+    cur.execute(
+        f"CREATE TEMP TABLE {table}_stage (payload JSONB) ON COMMIT DROP"
+    )
+    _copy(cur, f"{table}_stage", ["payload"], (
+        dumps(r).translate(_COPY_ESCAPES) + "\n" for r in rows
+    ))
+    cur.execute(f"""
+        INSERT INTO {table} (payload)
+        SELECT payload FROM {table}_stage
+        ON CONFLICT ({key_exprs})
+        DO UPDATE SET payload = EXCLUDED.payload
+    """)
+
+    conn.commit()
+    cur.close()
+    return len(rows)
+
+
+# ---------------- TYPED LAYOUT ----------------
+
+def _existing_columns(cur, table):
+    cur.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = %s",
+        (table,),
+    )
+    return {r[0]: logical_from_db(r[1], "postgres") for r in cur.fetchall()}
+
+
+def _write_typed(conn, dest, source, rows, merge_key):
+
+    cur = conn.cursor()
+
+    table = f"{source}_data"
+
+    incoming = infer_schema(rows)
+    if "fetched_at" not in incoming:
+        incoming["fetched_at"] = "timestamp"
+
+    # COPY parses text into the table's type (ISO strings into TIMESTAMP,
+    # digits into BIGINT); columns that can't take the batch's values are
+    # widened first (see _copy_typed).
+    change = evolve(source, dest, incoming, lambda: _existing_columns(cur, table), table)
+
+    try:
+        count = _copy_typed(conn, cur, table, rows, change, merge_key)
+    except Exception:
+        forget(source, dest, table)
+        raise
+    finally:
+        cur.close()
+
+    change.commit()
+    return count
+
+
+def _copy_typed(conn, cur, table, rows, change, merge_key):
+
+    columns = change.columns
+
+    if change.new_table:
+        col_defs = ", ".join(
+            f"{_ident(c)} {column_type(t, 'postgres')}" for c, t in columns.items()
+        )
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                _row_id BIGSERIAL PRIMARY KEY,
+                {col_defs}
+            )
+        """)
+    for c in change.added:
         cur.execute(
-            f"INSERT INTO {table} (payload) VALUES (%s)",
-            (json.dumps(r),)
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS "
+            f"{_ident(c)} {column_type(columns[c], 'postgres')}"
+        )
+    for c, t in change.widened.items():
+        pg_type = column_type(t, "postgres")
+        cur.execute(
+            f"ALTER TABLE {table} ALTER COLUMN {_ident(c)} "
+            f"TYPE {pg_type} USING {_ident(c)}::{pg_type}"
+        )
+    if change.widened:
+        print(
+            f"[POSTGRES] Widened columns in {table}: "
+            + ", ".join(f"{c} -> {t}" for c, t in change.widened.items()),
+            flush=True,
         )
 
-        count += 1
+    names = list(columns)
+    now = datetime.datetime.utcnow()
 
+    def lines(batch):
+        for r in batch:
+            yield "\t".join(
+                _copy_value(now if c == "fetched_at" and c not in r else r.get(c))
+                for c in names
+            ) + "\n"
 
-    conn.commit()
-    cur.close()
-    conn.close()
+    missing = [k for k in merge_key if k not in columns]
+    if merge_key and missing:
+        print(
+            f"[DEST] Merge key column(s) {', '.join(missing)} not in {table}; appending",
+            flush=True,
+        )
 
-    print(f"[DEST] Pushed {count} rows to Postgres", flush=True)
+    if not merge_key or missing:
+        _copy(cur, table, names, lines(rows))
+        conn.commit()
+        return len(rows)
 
-    return count
\ No newline at end of file
+    rows = _dedupe_last(rows, merge_key)
+    keys = ", ".join(_ident(k) for k in merge_key)
+    col_list = ", ".join(_ident(c) for c in names)
+    updates = ", ".join(
+        f"{_ident(c)} = EXCLUDED.{_ident(c)}" for c in names if c not in merge_key
+    ) or f"{_ident(merge_key[0])} = EXCLUDED.{_ident(merge_key[0])}"
+
+    _merge_index(cur, table, "_row_id", lambda alias: [f"{alias}{_ident(k)}" for k in merge_key])
+    cur.execute(
+        f"CREATE TEMP TABLE {table}_stage ON COMMIT DROP AS "
+        f"SELECT {col_list} FROM {table} WITH NO DATA"
+    )
+    _copy(cur, f"{table}_stage", names, lines(rows))
+    cur.execute(f"""
+        INSERT INTO {table} ({col_list})
+        SELECT {col_list} FROM {table}_stage
+        ON CONFLICT ({keys})
+        DO UPDATE SET {updates}
+    """)
+
+    conn.commit()
+    return len(rows)
@@ -0,0 +1,145 @@
+"""
+Pipelined destination pushes.
+
+Without this a connector's fetch loop stops on every push_to_destination
+call until the warehouse write returns, so API paging and destination
+writes never overlap. A PushPipeline gives each destination a bounded
+queue drained by its own worker threads:
+
+  * DEST_PUSH_QUEUE                batches that may wait per destination;
+                                   producers block when it is full
+  * DEST_PUSH_PARALLELISM          concurrent writes per destination
+  * DEST_PUSH_PARALLELISM_<TYPE>   override for one destination type,
+                                   e.g. DEST_PUSH_PARALLELISM_SNOWFLAKE=1
+
+wait() drains every queue and returns the real totals:
+
+    {"rows_pushed": int, "batches": int, "errors": [{...}, ...]}
+"""
+
+import os
+import queue
+import threading
+
+from backend.destinations.write_buffer import destination_key
+
+ASYNC_PUSH_ENABLED = os.getenv("DEST_PUSH_ASYNC", "0") == "1"
+QUEUE_SIZE = int(os.getenv("DEST_PUSH_QUEUE", "4"))
+PARALLELISM = int(os.getenv("DEST_PUSH_PARALLELISM", "2"))
+
+_STOP = object()
+
+
+def parallelism_for(dest_type):
+    value = os.getenv(f"DEST_PUSH_PARALLELISM_{(dest_type or '').upper()}")
+    return max(1, int(value) if value else PARALLELISM)
+
+
+def _parallelism(dest_cfg):
+    # A fan-out batch is limited by its most constrained destination.
+    if isinstance(dest_cfg, (list, tuple)):
+        return min(parallelism_for(d.get("type")) for d in dest_cfg)
+    return parallelism_for(dest_cfg.get("type"))
+
+
+def _dest_type(dest_cfg):
+    if isinstance(dest_cfg, (list, tuple)):
+        return ",".join(str(d.get("type")) for d in dest_cfg)
+    return dest_cfg.get("type")
+
+
+class _Lane:
+    """Queue + workers for one destination."""
+
+    def __init__(self, pipeline, workers):
+        self.queue = queue.Queue(maxsize=max(1, pipeline.queue_size))
+        self.threads = [
+            threading.Thread(target=pipeline._work, args=(self.queue,), daemon=True)
+            for _ in range(workers)
+        ]
+        for t in self.threads:
+            t.start()
+
+
+class PushPipeline:
+    """
+    `dispatch(dest_cfg, source, rows, skip_storage, uid)` performs the
+    actual write on a worker thread and returns the rows written.
+    """
+
+    def __init__(self, dispatch, queue_size=QUEUE_SIZE):
+        self.dispatch = dispatch
+        self.queue_size = queue_size
+        self._lanes = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.rows_pushed = 0
+        self.batches = 0
+        self.errors = []
+
+    def _lane(self, dest_cfg):
+        key = destination_key(dest_cfg)
+        with self._lock:
+            if self._closed:
+                raise Exception("Push pipeline already completed")
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = self._lanes[key] = _Lane(self, _parallelism(dest_cfg))
+            return lane
+
+    def submit(self, dest_cfg, source, rows, skip_storage=False, uid=None):
+        """Queue a batch; blocks while the destination's queue is full."""
+        if not rows:
+            return 0
+        self._lane(dest_cfg).queue.put((dest_cfg, source, rows, skip_storage, uid))
+        return len(rows)
+
+    def _work(self, q):
+        while True:
+            item = q.get()
+            try:
+                if item is _STOP:
+                    return
+
+                dest_cfg, source, rows, skip_storage, uid = item
+                try:
+                    count = self.dispatch(dest_cfg, source, rows, skip_storage, uid) or 0
+                    with self._lock:
+                        self.rows_pushed += count
+                        self.batches += 1
+                except Exception as e:
+                    with self._lock:
+                        self.batches += 1
+                        self.errors.append({
+                            "source": source,
+                            "dest_type": _dest_type(dest_cfg),
+                            "rows": len(rows),
+                            "error": str(e),
+                        })
+            finally:
+                q.task_done()
+
+    def wait(self):
+        """Drain every queue, stop the workers and return the totals."""
+        with self._lock:
+            self._closed = True
+            lanes = list(self._lanes.values())
+
+        for lane in lanes:
+            lane.queue.join()
+            for _ in lane.threads:
+                lane.queue.put(_STOP)
+        for lane in lanes:
+            for t in lane.threads:
+                t.join()
+
+        return self.result()
+
+    def result(self):
+        with self._lock:
+            return {
+                "rows_pushed": self.rows_pushed,
+                "batches": self.batches,
+                "errors": list(self.errors),
+            }
@@ -0,0 +1,113 @@
+"""
+Deterministic record keys for the writers that upsert.
+
+Document and ClickHouse sinks always key rows (MongoDB / Elasticsearch
+_id, ClickHouse's sort key), so a retried or re-synced batch overwrites
+instead of duplicating. The warehouses merge on the key only when opted
+in: a destination with a merge_key, or whose write_mode
+(dest["write_mode"], else DEST_WRITE_MODE) is "merge".
+
+A row's key comes from, in order:
+
+  * dest["merge_key"]        explicit comma separated fields, e.g. "id"
+                             or "account_id,event_id"
+  * the connector record id  first of DEST_RECORD_ID_FIELDS present in the
+                             row
+
+either one scoped by uid / source (the row's own fields, else the ones
+the batch is written for) and by the row's entity / object_type /
+table_name when it has one, so ids from different users, connectors or
+objects sharing a table or index never collide.
+
+A row with no record id has no key: it is appended, never merged into
+another row.
+
+Keys are hex sha256 digests: fixed width and safe in any engine's
+VARCHAR / STRING / document _id.
+"""
+
+import hashlib
+import json
+import os
+import uuid
+
+RECORD_ID_FIELDS = [
+    f.strip()
+    for f in os.getenv("DEST_RECORD_ID_FIELDS", "record_id,id,event_id,unique_id").split(",")
+    if f.strip()
+]
+
+# WAREHOUSE_WRITE_MODE is the older, warehouse-only name for the setting.
+WRITE_MODE = os.getenv("DEST_WRITE_MODE", os.getenv("WAREHOUSE_WRITE_MODE", "append")).lower()
+
+_SCOPE_FIELDS = ("uid", "source", "entity", "object_type", "table_name")
+
+
+def merge_fields(dest):
+    """Explicit merge key fields configured on the destination, or None."""
+    raw = (dest or {}).get("merge_key") or ""
+    fields = [k.strip() for k in raw.split(",") if k.strip()]
+    return fields or None
+
+
+def write_mode(dest):
+    """"merge" or "append" for this destination."""
+    mode = (dest or {}).get("write_mode") or ("merge" if merge_fields(dest) else WRITE_MODE)
+    mode = mode.lower()
+    if mode not in ("merge", "append"):
+        raise Exception(f"Unsupported write mode: {mode}")
+    return mode
+
+
+def record_scope(dest, source=None):
+    """The uid / source a batch is written for, to scope its keys."""
+    return {"uid": (dest or {}).get("uid"), "source": source}
+
+
+def _digest(parts):
+    text = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _present(value):
+    return value not in (None, "")
+
+
+def _scope(row, scope):
+    scope = scope or {}
+    return [[s, row.get(s) if _present(row.get(s)) else scope.get(s)] for s in _SCOPE_FIELDS]
+
+
+def record_key(row, fields=None, scope=None):
+    """The row's key, or None when it has no record id to be keyed on."""
+    if fields:
+        values = [row.get(f) for f in fields]
+        if not any(_present(v) for v in values):
+            return None
+        return _digest(_scope(row, scope) + [values])
+
+    for f in RECORD_ID_FIELDS:
+        value = row.get(f)
+        if _present(value):
+            return _digest(_scope(row, scope) + [f, value])
+
+    return None
+
+
+def keyed_rows(rows, fields=None, scope=None):
+    """
+    [(key, row)] with one entry per key, the last occurrence winning —
+    MERGE / ON CONFLICT cannot touch the same target row twice. Rows
+    without a record id get a fresh random key, so they are inserted as is.
+    """
+    latest = {}
+    unkeyed = 0
+    for r in rows:
+        key = record_key(r, fields, scope)
+        if key is None:
+            key = uuid.uuid4().hex
+            unkeyed += 1
+        latest[key] = r
+    if unkeyed:
+        print(f"[DEST] {unkeyed} row(s) have no record id; appending them", flush=True)
+    return list(latest.items())
@@ -1,7 +1,27 @@
 import json
+import os
 from datetime import datetime
 
 import psycopg2
+import psycopg2.extras
+
+from backend.destinations.client_pool import lease_client, ping_dbapi
+from backend.destinations.record_keys import write_mode
+from backend.destinations.warehouse_stage import (
+    VALUES_BATCH,
+    batch_id,
+    ensure_table,
+    forget_table,
+    gzip_ndjson,
+    stage_records,
+    use_file_stage,
+)
+
+# S3 prefix ("s3://bucket/prefix") and IAM role COPY reads staged files
+# with. Either can be set per destination as stage_bucket / iam_role;
+# without both, merges fill the staging table with multi-row INSERTs.
+REDSHIFT_STAGE_S3 = os.getenv("REDSHIFT_STAGE_S3", "")
+REDSHIFT_IAM_ROLE = os.getenv("REDSHIFT_IAM_ROLE", "")
 
 
 def _safe_ident(value):
@@ -31,46 +51,161 @@ def push_redshift(dest, source, rows):
     table = f"{_safe_ident(source)}_data"
     full_table = f"{schema}.{table}"
 
-    conn = psycopg2.connect(
-        host=host,
-        port=port,
-        user=user,
-        password=password,
-        dbname=database,
-        connect_timeout=15,
-        sslmode="prefer",
+    def connect():
+        return psycopg2.connect(
+            host=host,
+            port=port,
+            user=user,
+            password=password,
+            dbname=database,
+            connect_timeout=15,
+            sslmode="prefer",
+        )
+
+    with lease_client(dest, "redshift", connect, validate=ping_dbapi) as conn:
+        try:
+            with conn.cursor() as cur:
+                ensure_table(dest, "redshift", full_table, lambda: _create_table(cur, schema, table))
+
+            if write_mode(dest) == "append":
+                return _append_rows(conn, full_table, rows)
+            return _merge_rows(conn, dest, full_table, table, rows)
+
+        except Exception:
+            forget_table(dest, "redshift", full_table)
+            raise
+
+
+def _create_table(cur, schema, table):
+    cur.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {schema}.{table} (
+            id BIGINT IDENTITY(1,1),
+            record_key VARCHAR(64),
+            payload VARCHAR(65535),
+            fetched_at TIMESTAMP
+        )
+        """
     )
 
+    # Tables created before merge writes have no record_key yet.
+    cur.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s AND column_name = 'record_key'
+        """,
+        (schema, table),
+    )
+    if cur.fetchone() is None:
+        cur.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN record_key VARCHAR(64)")
+
+
+def _append_rows(conn, full_table, rows):
+    with conn.cursor() as cur:
+        now = datetime.utcnow()
+        values = [
+            (json.dumps(row), now)
+            for row in rows
+        ]
+
+        cur.executemany(
+            f"""
+            INSERT INTO {full_table} (payload, fetched_at)
+            VALUES (%s, %s)
+            """,
+            values,
+        )
+
+    conn.commit()
+    print(f"[REDSHIFT] Inserted {len(rows)} rows into {full_table}", flush=True)
+    return len(rows)
+
+
+# ---------------- STAGE + MERGE ----------------
+
+def _s3_stage(dest):
+    prefix = (dest.get("stage_bucket") or REDSHIFT_STAGE_S3).strip()
+    role = (dest.get("iam_role") or REDSHIFT_IAM_ROLE).strip()
+    if not prefix or not role:
+        return None
+    if not prefix.startswith("s3://"):
+        prefix = "s3://" + prefix
+    bucket, _, key_prefix = prefix[len("s3://"):].partition("/")
+    return bucket, key_prefix.strip("/"), role
+
+
+def _copy_from_s3(cur, stage, table, records, s3):
+    import boto3
+
+    bucket, prefix, role = s3
+    key = "/".join(p for p in (prefix, table, f"{batch_id()}.json.gz") if p)
+
+    client = boto3.client("s3")
+    client.upload_fileobj(gzip_ndjson(records), bucket, key)
+    try:
+        cur.execute(
+            f"""
+            COPY {stage} (record_key, payload, fetched_at)
+            FROM %s
+            IAM_ROLE %s
+            FORMAT AS JSON 'auto'
+            GZIP
+            TIMEFORMAT 'auto'
+            """,
+            (f"s3://{bucket}/{key}", role),
+        )
+    finally:
+        client.delete_object(Bucket=bucket, Key=key)
+
+
+def _merge_rows(conn, dest, full_table, table, rows):
+    stage = f"{table}_stage"
+    records = stage_records(dest, rows)
+    s3 = _s3_stage(dest) if use_file_stage(records) else None
+
     try:
         with conn.cursor() as cur:
-            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+            cur.execute(f"DROP TABLE IF EXISTS {stage}")
             cur.execute(
                 f"""
-                CREATE TABLE IF NOT EXISTS {full_table} (
-                    id BIGINT IDENTITY(1,1),
+                CREATE TEMP TABLE {stage} (
+                    record_key VARCHAR(64),
                     payload VARCHAR(65535),
                     fetched_at TIMESTAMP
                 )
                 """
             )
 
-            now = datetime.utcnow()
-            values = [
-                (json.dumps(row), now)
-                for row in rows
-            ]
+            if s3:
+                _copy_from_s3(cur, stage, table, records, s3)
+            else:
+                psycopg2.extras.execute_values(
+                    cur,
+                    f"INSERT INTO {stage} (record_key, payload, fetched_at) VALUES %s",
+                    records,
+                    page_size=VALUES_BATCH,
+                )
 
-            cur.executemany(
+            cur.execute(
                 f"""
-                INSERT INTO {full_table} (payload, fetched_at)
-                VALUES (%s, %s)
-                """,
-                values,
+                MERGE INTO {full_table} USING {stage} s
+                ON {full_table}.record_key = s.record_key
+                WHEN MATCHED THEN UPDATE SET
+                    payload = s.payload,
+                    fetched_at = s.fetched_at
+                WHEN NOT MATCHED THEN INSERT (record_key, payload, fetched_at)
+                    VALUES (s.record_key, s.payload, s.fetched_at)
+                """
             )
+            cur.execute(f"DROP TABLE {stage}")
 
         conn.commit()
-        print(f"[REDSHIFT] Inserted {len(rows)} rows into {full_table}", flush=True)
-        return len(rows)
 
-    finally:
-        conn.close()
+    except Exception:
+        conn.rollback()
+        raise
+
+    via = "S3 COPY" if s3 else "INSERT"
+    print(f"[REDSHIFT] Merged {len(records)} rows into {full_table} ({via})", flush=True)
+    return len(records)
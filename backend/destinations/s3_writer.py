@@ -1,14 +1,21 @@
 print("### S3 FORMAT-AWARE WRITER LOADED ###", flush=True)
 
-import json
-import tempfile
-import os
-import time
-import pandas as pd
 import boto3
 
 from datetime import datetime
 
+from backend.destinations.client_pool import lease_client
+from backend.destinations.object_store_writer import encode_parts, object_key
+
+
+def _connect(dest):
+    return boto3.client(
+        "s3",
+        aws_access_key_id=dest["username"],
+        aws_secret_access_key=dest["password"],
+        region_name=dest.get("port") or "us-east-1",
+    )
+
 
 def push_s3(dest, source, rows):
 
@@ -18,82 +25,48 @@ def push_s3(dest, source, rows):
     fmt = (dest.get("format") or "parquet").lower()
     print(f"[S3] Upload format: {fmt}", flush=True)
 
-    aws_access_key = dest["username"]
-    aws_secret_key = dest["password"]
-    bucket_name    = dest["host"]
-    region         = dest.get("port") or "us-east-1"
-
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=aws_access_key,
-        aws_secret_access_key=aws_secret_key,
-        region_name=region,
-    )
-
-    df = pd.DataFrame(rows)
+    bucket_name = dest["host"]
 
-    for col in df.columns:
-        df[col] = df[col].astype(str)
-
-    df["fetched_at"] = pd.Timestamp.utcnow()
+    if fmt not in ("parquet", "iceberg", "hudi", "json"):
+        raise Exception(f"Unsupported S3 format: {fmt}")
 
     # ------------------------------------------------------------------ #
     # FILE CREATION                                                        #
     # "iceberg" and "hudi" both write identical Parquet files.            #
-    # Table-format semantics live entirely in the lakehouse registry —    #
+    # For "iceberg" the files are then committed to an Iceberg table at   #
+    # s3://bucket/source (manifests + metadata, see iceberg_metadata) —   #
     # no PyArrow S3FileSystem, no Spark, no JVM dependency.               #
+    # Parts are encoded in memory and uploaded one at a time; boto3       #
+    # switches to a multipart upload for large parts on its own.          #
     # ------------------------------------------------------------------ #
-    if fmt in ("parquet", "iceberg", "hudi"):
-
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".parquet")
-        file_path = tmp.name
-        tmp.close()
-
-        df.to_parquet(
-            file_path,
-            engine="pyarrow",
-            index=False,
-        )
-
-        extension = "parquet"
-
-    elif fmt == "json":
-
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".json")
-        file_path = tmp.name
-        tmp.close()
-
-        df.to_json(
-            file_path,
-            orient="records",
-            lines=True,
-        )
+    now = datetime.utcnow()
+    uploaded = 0
 
-        extension = "json"
+    with lease_client(dest, "s3", lambda: _connect(dest)) as s3:
+        table = None
+        if fmt == "iceberg":
+            from backend.destinations.iceberg_metadata import IcebergTable, S3Store
+            table = IcebergTable(S3Store(s3, bucket_name), source)
+        data_files = []
 
-    else:
-        raise Exception(f"Unsupported S3 format: {fmt}")
+        for part in encode_parts(rows, fmt, arrow_schema=table.arrow_schema() if table else None):
 
-    # ------------------------------------------------------------------ #
-    # PARTITION PATH  →  source/year=YYYY/month=MM/day=DD/file.parquet    #
-    # ------------------------------------------------------------------ #
-    now = datetime.utcnow()
+            # PARTITION PATH  →  source/year=YYYY/month=MM/day=DD/file.parquet
+            key = object_key(source, part, now)
 
-    key = (
-        f"{source}/"
-        f"year={now.year}/"
-        f"month={now.month:02d}/"
-        f"day={now.day:02d}/"
-        f"{source}_{int(time.time())}.{extension}"
-    )
+            print(f"[S3] Uploading: {key} ({part.num_rows} rows, {part.size} bytes)", flush=True)
 
-    print("[S3] Uploading:", key, flush=True)
+            s3.upload_fileobj(part.reader(), bucket_name, key)
+            uploaded += 1
 
-    s3.upload_file(file_path, bucket_name, key)
+            if table:
+                data_files.append(table.data_file(key, part))
 
-    os.unlink(file_path)
+        if table:
+            snapshot_id = table.append(data_files)
+            print(f"[S3] Committed Iceberg snapshot {snapshot_id} (v{table.version}) → {table.location}", flush=True)
 
-    print(f"[S3] Uploaded {len(rows)} rows → s3://{bucket_name}/{key}", flush=True)
+    print(f"[S3] Uploaded {len(rows)} rows in {uploaded} file(s) → s3://{bucket_name}/{source}/", flush=True)
 
     if fmt in ("iceberg", "hudi"):
 
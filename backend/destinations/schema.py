@@ -0,0 +1,332 @@
+"""
+Schema inference and evolution shared by the typed destination writers.
+
+    incoming = infer_schema(rows)                  # {column: logical type}
+    change = evolve(source, dest, incoming, load_existing)
+    for column in change.added:
+        ALTER TABLE ... ADD COLUMN column column_type(change.columns[column], "postgres")
+    for column, logical in change.widened.items():
+        ALTER TABLE ... ALTER COLUMN column TYPE column_type(logical, "postgres")
+    change.commit()                                # cache what the table now has
+
+Logical types: bool, int, float, decimal, timestamp, timestamptz, date,
+time, json, string. A column seen with two types is widened (int + float
+-> float, timestamp + timestamptz -> timestamptz, anything else ->
+string), in a batch and between a batch and its table alike.
+
+  * SCHEMA_SAMPLE_ROWS  rows (spread over the batch) used to type columns;
+                        keys are still collected from every row
+  * SCHEMA_CACHE_TTL    seconds a table's known columns are trusted before
+                        the writer's loader re-reads them
+"""
+
+import datetime
+import decimal
+import os
+import threading
+import time
+
+SAMPLE_ROWS = int(os.getenv("SCHEMA_SAMPLE_ROWS", "10000"))
+CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "300"))
+
+_NUMERIC = ("int", "decimal", "float")
+
+
+# ---------------- INFERENCE ----------------
+
+def logical_type(value):
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int" if -(2 ** 63) <= value < 2 ** 63 else "decimal"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, decimal.Decimal):
+        return "decimal"
+    if isinstance(value, datetime.datetime):
+        return "timestamptz" if value.tzinfo else "timestamp"
+    if isinstance(value, datetime.date):
+        return "date"
+    if isinstance(value, datetime.time):
+        return "time"
+    if isinstance(value, (dict, list, tuple)):
+        return "json"
+    return "string"
+
+
+def widen(a, b):
+    """Narrowest logical type that holds values of both a and b."""
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    if a in _NUMERIC and b in _NUMERIC:
+        return "float" if "float" in (a, b) else "decimal"
+    if {a, b} == {"timestamp", "timestamptz"}:
+        return "timestamptz"
+    return "string"
+
+
+def _sample(rows, size):
+    if size <= 0 or len(rows) <= size:
+        return rows
+    step = len(rows) / size
+    return [rows[int(i * step)] for i in range(size)]
+
+
+def infer_schema(rows, sample_rows=None):
+    """
+    Ordered {column: logical type} for a batch. Every key in the batch
+    becomes a column; types come from a sample of the rows, and columns
+    that are null throughout the sample are typed from the rest.
+    """
+    columns = {}
+    for r in rows:
+        for k in r:
+            columns.setdefault(k, None)
+
+    for r in _sample(rows, SAMPLE_ROWS if sample_rows is None else sample_rows):
+        for k, v in r.items():
+            if v is not None:
+                columns[k] = widen(columns[k], logical_type(v))
+
+    untyped = {k for k, t in columns.items() if t is None}
+    if untyped:
+        for r in rows:
+            for k in untyped & r.keys():
+                if r[k] is not None:
+                    columns[k] = widen(columns[k], logical_type(r[k]))
+
+    return {k: (t or "string") for k, t in columns.items()}
+
+
+def fits(table_type, batch_type):
+    """Can a column of table_type take this batch's values unchanged?"""
+    return table_type is None or widen(table_type, batch_type) == table_type
+
+
+# ---------------- DIALECTS ----------------
+
+DIALECT_TYPES = {
+    "postgres": {
+        "bool": "BOOLEAN",
+        "int": "BIGINT",
+        "float": "DOUBLE PRECISION",
+        "decimal": "NUMERIC",
+        "timestamp": "TIMESTAMP",
+        "timestamptz": "TIMESTAMPTZ",
+        "date": "DATE",
+        "time": "TIME",
+        "json": "JSONB",
+        "string": "TEXT",
+    },
+    "mysql": {
+        "bool": "BOOLEAN",
+        "int": "BIGINT",
+        "float": "DOUBLE",
+        "decimal": "DECIMAL(38, 10)",
+        "timestamp": "DATETIME(6)",
+        "timestamptz": "DATETIME(6)",
+        "date": "DATE",
+        "time": "TIME(6)",
+        "json": "JSON",
+        "string": "TEXT",
+    },
+    "clickhouse": {
+        "bool": "Bool",
+        "int": "Int64",
+        "float": "Float64",
+        "decimal": "Decimal(38, 10)",
+        "timestamp": "DateTime64(6)",
+        "timestamptz": "DateTime64(6, 'UTC')",
+        "date": "Date32",
+        "time": "String",
+        "json": "String",
+        "string": "String",
+    },
+    "duckdb": {
+        "bool": "BOOLEAN",
+        "int": "BIGINT",
+        "float": "DOUBLE",
+        "decimal": "DECIMAL(38, 10)",
+        "timestamp": "TIMESTAMP",
+        "timestamptz": "TIMESTAMP WITH TIME ZONE",
+        "date": "DATE",
+        "time": "TIME",
+        "json": "VARCHAR",
+        "string": "VARCHAR",
+    },
+}
+
+# Type names as the engines report them back (information_schema /
+# system.columns), lower-cased and without length or precision.
+_DB_TYPES = {
+    "postgres": {
+        "boolean": "bool",
+        "smallint": "int",
+        "integer": "int",
+        "bigint": "int",
+        "double precision": "float",
+        "real": "float",
+        "numeric": "decimal",
+        "timestamp without time zone": "timestamp",
+        "timestamp with time zone": "timestamptz",
+        "date": "date",
+        "time without time zone": "time",
+        "jsonb": "json",
+        "json": "json",
+        "text": "string",
+        "character varying": "string",
+    },
+    "mysql": {
+        "tinyint": "bool",
+        "smallint": "int",
+        "int": "int",
+        "bigint": "int",
+        "double": "float",
+        "float": "float",
+        "decimal": "decimal",
+        "datetime": "timestamp",
+        "timestamp": "timestamp",
+        "date": "date",
+        "time": "time",
+        "json": "json",
+        "text": "string",
+        "mediumtext": "string",
+        "longtext": "string",
+        "varchar": "string",
+    },
+    "clickhouse": {
+        "bool": "bool",
+        "int64": "int",
+        "int32": "int",
+        "uint64": "int",
+        "float64": "float",
+        "float32": "float",
+        "decimal": "decimal",
+        "datetime64": "timestamp",
+        "datetime": "timestamp",
+        "date32": "date",
+        "date": "date",
+        "string": "string",
+    },
+    "duckdb": {
+        "boolean": "bool",
+        "tinyint": "int",
+        "smallint": "int",
+        "integer": "int",
+        "bigint": "int",
+        "double": "float",
+        "float": "float",
+        "decimal": "decimal",
+        "timestamp": "timestamp",
+        "timestamp with time zone": "timestamptz",
+        "date": "date",
+        "time": "time",
+        "json": "json",
+        "varchar": "string",
+    },
+}
+
+
+def column_type(logical, dialect):
+    return DIALECT_TYPES[dialect][logical]
+
+
+def logical_from_db(db_type, dialect):
+    """Logical type for a type name read back from the engine, or None."""
+    name = str(db_type or "").strip()
+    if name.startswith("Nullable(") and name.endswith(")"):
+        name = name[len("Nullable("):-1]
+    if dialect == "clickhouse" and name.startswith("DateTime64") and "UTC" in name:
+        return "timestamptz"
+    return _DB_TYPES[dialect].get(name.split("(", 1)[0].strip().lower())
+
+
+# ---------------- EVOLUTION ----------------
+
+class SchemaChange:
+    """
+    How a batch maps onto its table.
+
+    columns    {column: logical type} to write this batch with — the
+               table's type where it can take the values, else the
+               widened type
+    added      columns the table doesn't have yet (add them, then commit())
+    widened    {column: logical type} existing columns whose type has to
+               widen to take the batch (alter them, then commit())
+    conflicts  {column: (table type, batch type)} behind each widening
+    """
+
+    def __init__(self, key, known, incoming):
+        self._key = key
+        self.columns = {}
+        self.added = []
+        self.widened = {}
+        self.conflicts = {}
+
+        for c, t in incoming.items():
+            if c not in known:
+                self.added.append(c)
+                self.columns[c] = t
+            elif fits(known[c], t):
+                self.columns[c] = known[c] or t
+            else:
+                self.columns[c] = self.widened[c] = widen(known[c], t)
+                self.conflicts[c] = (known[c], t)
+
+        self._known = dict(known)
+
+    @property
+    def new_table(self):
+        return not self._known
+
+    def commit(self):
+        """Record the added and widened columns as present in the table."""
+        for c in self.added:
+            self._known[c] = self.columns[c]
+        self._known.update(self.widened)
+        with _lock:
+            entry = _cache.get(self._key)
+            loaded_at = entry[1] if entry else time.monotonic()
+            _cache[self._key] = (self._known, loaded_at)
+
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _cache_key(source, dest, table=None):
+    from backend.destinations.write_buffer import destination_key
+
+    return (source, table, destination_key(dest))
+
+
+def evolve(source, dest, incoming, load_existing, table=None):
+    """
+    Compare a batch schema with the table's known columns.
+
+    `load_existing()` returns {column: logical type or None} for the table
+    as it stands ({} if it doesn't exist); it is only called when the
+    (source, destination) cache is empty or older than SCHEMA_CACHE_TTL.
+    """
+    key = _cache_key(source, dest, table)
+    now = time.monotonic()
+
+    with _lock:
+        entry = _cache.get(key)
+
+    if entry is None or (CACHE_TTL and now - entry[1] > CACHE_TTL):
+        known = load_existing()
+        with _lock:
+            _cache[key] = (known, now)
+    else:
+        known = entry[0]
+
+    return SchemaChange(key, known, incoming)
+
+
+def forget(source, dest, table=None):
+    """Drop the cached columns, e.g. after a write failed on them."""
+    with _lock:
+        _cache.pop(_cache_key(source, dest, table), None)
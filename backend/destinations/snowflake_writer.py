@@ -2,56 +2,164 @@ import snowflake.connector
 import json
 from datetime import datetime
 
+from backend.destinations.client_pool import lease_client
+from backend.destinations.record_keys import write_mode
+from backend.destinations.warehouse_stage import (
+    batch_id,
+    ensure_table,
+    forget_table,
+    gzip_ndjson,
+    stage_records,
+    use_file_stage,
+    values_chunks,
+)
+
+
+def _connect(dest):
+    return snowflake.connector.connect(
+        user=dest["username"],
+        password=dest["password"],
+        account=dest["host"],
+        warehouse=dest.get("port") or "COMPUTE_WH",
+        database=dest["database_name"],
+        schema="PUBLIC"
+    )
+
+
+def _ping(conn):
+    return not conn.is_closed()
+
+
 def push_snowflake(dest, source, rows):
 
     if not rows:
         return 0
 
     try:
-        conn = snowflake.connector.connect(
-            user=dest["username"],
-            password=dest["password"],
-            account=dest["host"],
-            warehouse=dest.get("port") or "COMPUTE_WH",
-            database=dest["database_name"],
-            schema="PUBLIC"
+        with lease_client(dest, "snowflake", lambda: _connect(dest), validate=_ping) as conn:
+            if write_mode(dest) == "append":
+                return _write_rows(conn, dest, source, rows)
+            return _merge_rows(conn, dest, source, rows)
+
+    except Exception as e:
+        print("[SNOWFLAKE ERROR]", e, flush=True)
+        forget_table(dest, "snowflake", f"{source}_data")
+        raise e
+
+
+def _create_table(cur, table):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER AUTOINCREMENT,
+            record_key STRING,
+            payload VARIANT,
+            fetched_at TIMESTAMP_NTZ
         )
+    """)
+    # Tables created before merge writes have no record_key yet.
+    cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS record_key STRING")
 
-        cur = conn.cursor()
 
-        table = f"{source}_data"
+def _write_rows(conn, dest, source, rows):
 
-        # Create table if not exists
-        cur.execute(f"""
-            CREATE TABLE IF NOT EXISTS {table} (
-                id INTEGER AUTOINCREMENT,
-                payload VARIANT,
-                fetched_at TIMESTAMP_NTZ
-            )
-        """)
+    cur = conn.cursor()
+
+    table = f"{source}_data"
+
+    ensure_table(dest, "snowflake", table, lambda: _create_table(cur, table))
+
+    insert_sql = f"""
+        INSERT INTO {table}(payload, fetched_at)
+        SELECT PARSE_JSON(%s), %s
+    """
+
+    now = datetime.utcnow()
+
+    values = [
+        (json.dumps(r), now)
+        for r in rows
+    ]
 
-        insert_sql = f"""
-            INSERT INTO {table}(payload, fetched_at)
-            SELECT PARSE_JSON(%s), %s
-        """
+    cur.executemany(insert_sql, values)
 
-        now = datetime.utcnow()
+    conn.commit()
+    cur.close()
 
-        values = [
-            (json.dumps(r), now)
-            for r in rows
-        ]
+    print(f"[DEST] Batch pushed {len(rows)} rows to Snowflake", flush=True)
 
-        cur.executemany(insert_sql, values)
+    return len(rows)
+
+
+# ---------------- STAGE + MERGE ----------------
+
+def _merge_rows(conn, dest, source, rows):
+
+    cur = conn.cursor()
+
+    table = f"{source}_data"
+    stage = f"{table}_stage"
+    records = stage_records(dest, rows)
+
+    ensure_table(dest, "snowflake", table, lambda: _create_table(cur, table))
+
+    cur.execute(f"""
+        CREATE OR REPLACE TEMPORARY TABLE {stage} (
+            record_key STRING,
+            payload VARIANT,
+            fetched_at TIMESTAMP_NTZ
+        )
+    """)
+
+    try:
+        if use_file_stage(records):
+            # One gzip file PUT to the user stage, then a single COPY.
+            path = f"@~/segmento/{table}/{batch_id()}"
+            cur.execute(
+                f"PUT file://{table}.json.gz {path} "
+                "AUTO_COMPRESS=FALSE SOURCE_COMPRESSION=GZIP OVERWRITE=TRUE",
+                file_stream=gzip_ndjson(records),
+            )
+            cur.execute(f"""
+                COPY INTO {stage} (record_key, payload, fetched_at)
+                FROM (
+                    SELECT $1:record_key::STRING,
+                           PARSE_JSON($1:payload::STRING),
+                           $1:fetched_at::TIMESTAMP_NTZ
+                    FROM {path}
+                )
+                FILE_FORMAT = (TYPE = JSON COMPRESSION = GZIP)
+                PURGE = TRUE
+            """)
+        else:
+            for chunk in values_chunks(records):
+                cur.execute(
+                    f"INSERT INTO {stage} (record_key, payload, fetched_at) "
+                    "SELECT column1, PARSE_JSON(column2), column3 FROM VALUES "
+                    + ", ".join(["(%s, %s, %s)"] * len(chunk)),
+                    [v for record in chunk for v in record],
+                )
+
+        cur.execute(f"""
+            MERGE INTO {table} t
+            USING {stage} s
+            ON t.record_key = s.record_key
+            WHEN MATCHED THEN UPDATE SET
+                t.payload = s.payload,
+                t.fetched_at = s.fetched_at
+            WHEN NOT MATCHED THEN INSERT (record_key, payload, fetched_at)
+                VALUES (s.record_key, s.payload, s.fetched_at)
+        """)
 
         conn.commit()
-        cur.close()
-        conn.close()
 
-        print(f"[DEST] Batch pushed {len(rows)} rows to Snowflake", flush=True)
+    except Exception:
+        conn.rollback()
+        raise
 
-        return len(rows)
+    finally:
+        cur.execute(f"DROP TABLE IF EXISTS {stage}")
+        cur.close()
 
-    except Exception as e:
-        print("[SNOWFLAKE ERROR]", e, flush=True)
-        raise e
\ No newline at end of file
+    print(f"[DEST] Merged {len(records)} rows into Snowflake ({table})", flush=True)
+
+    return len(records)
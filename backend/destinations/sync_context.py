@@ -0,0 +1,99 @@
+"""
+Per-sync destination state.
+
+Every push used to pay for a destination_configs format lookup and a
+destination_push_logs INSERT, each on its own connection. A SyncContext
+is created when a sync request starts and found again by the sync id the
+router puts on each dest config, so buffer flushes, pipeline workers and
+fan-out threads (none of which see flask.g) share it:
+
+  * active destinations per (uid, source), read and decrypted once
+  * one prepared handle per destination: resolved config, format and
+    writer function
+  * push log rows, kept in memory and written in one multi-row INSERT
+    when the sync ends
+"""
+
+import threading
+
+from backend.destinations.write_buffer import destination_key
+
+
+class DestinationHandle:
+    """A destination ready to write to: final config + writer function."""
+
+    def __init__(self, cfg, writer):
+        self.cfg = cfg
+        self.writer = writer
+
+    @property
+    def type(self):
+        return self.cfg.get("type")
+
+    @property
+    def format(self):
+        return self.cfg.get("format")
+
+
+class SyncContext:
+
+    def __init__(self, sync_id):
+        self.sync_id = sync_id
+        self._lock = threading.Lock()
+        self._destinations = {}
+        self._handles = {}
+        self._push_logs = []
+
+    def active_destinations(self, uid, source, load):
+        """Cached `load()` result for (uid, source); callers get copies."""
+        key = (uid, source)
+        with self._lock:
+            cached = self._destinations.get(key)
+        if cached is None:
+            cached = load()
+            with self._lock:
+                cached = self._destinations.setdefault(key, cached)
+        return [dict(d) for d in cached]
+
+    def handle(self, dest_cfg, source, prepare):
+        """Prepared DestinationHandle for this destination, built once."""
+        key = (source, destination_key(dest_cfg))
+        with self._lock:
+            handle = self._handles.get(key)
+        if handle is None:
+            handle = prepare(dest_cfg, source)
+            with self._lock:
+                handle = self._handles.setdefault(key, handle)
+        return handle
+
+    def log_push(self, entry):
+        with self._lock:
+            self._push_logs.append(entry)
+
+    def take_push_logs(self):
+        with self._lock:
+            logs, self._push_logs = self._push_logs, []
+        return logs
+
+
+_contexts = {}
+_contexts_lock = threading.Lock()
+
+
+def start_sync_context(sync_id):
+    ctx = SyncContext(sync_id)
+    with _contexts_lock:
+        _contexts[sync_id] = ctx
+    return ctx
+
+
+def sync_context(sync_id):
+    if not sync_id:
+        return None
+    with _contexts_lock:
+        return _contexts.get(sync_id)
+
+
+def end_sync_context(sync_id):
+    with _contexts_lock:
+        return _contexts.pop(sync_id, None)
@@ -0,0 +1,100 @@
+"""
+Stage-and-merge support for the warehouse writers (Snowflake, Redshift,
+Databricks).
+
+Instead of executemany of single-row INSERTs, a batch is
+
+  1. keyed and de-duplicated on its record key (see record_keys),
+  2. written as one gzip NDJSON file to the engine's stage,
+  3. loaded with COPY into a staging table, and
+  4. MERGEd into <source>_data on record_key,
+
+so re-syncing the same records updates them instead of appending copies.
+
+The target table is created (and checked for record_key) once per
+destination and table, not per batch; ensure_table() remembers it until
+a write on it fails.
+
+  * write mode                 "append" (default, the old INSERT path) or
+                               "merge"; see record_keys.write_mode
+  * WAREHOUSE_STAGE_MIN_ROWS   smaller batches skip the file and fill the
+                               staging table with multi-row INSERTs
+  * WAREHOUSE_VALUES_BATCH     rows per multi-row INSERT
+"""
+
+import gzip
+import io
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from backend.destinations.client_pool import client_key
+from backend.destinations.record_keys import keyed_rows, merge_fields, record_scope
+
+STAGE_MIN_ROWS = int(os.getenv("WAREHOUSE_STAGE_MIN_ROWS", "1000"))
+VALUES_BATCH = int(os.getenv("WAREHOUSE_VALUES_BATCH", "500"))
+
+
+_ensured = set()
+_ensured_lock = threading.Lock()
+
+
+def ensure_table(dest, kind, table, create):
+    """Run create() (CREATE TABLE, column checks) once per destination and table."""
+    key = (client_key(dest, kind), table)
+    with _ensured_lock:
+        if key in _ensured:
+            return
+    create()
+    with _ensured_lock:
+        _ensured.add(key)
+
+
+def forget_table(dest, kind, table):
+    """Check the table again on the next batch, e.g. after a write failed."""
+    with _ensured_lock:
+        _ensured.discard((client_key(dest, kind), table))
+
+
+def use_file_stage(records):
+    return len(records) >= STAGE_MIN_ROWS
+
+
+def stage_records(dest, rows, now=None):
+    """[(record_key, payload_json, fetched_at)] — one per key, last wins."""
+    now = now or datetime.utcnow()
+    dumps = json.JSONEncoder(default=str).encode
+    return [
+        (key, dumps(row), now)
+        for key, row in keyed_rows(rows, merge_fields(dest), record_scope(dest))
+    ]
+
+
+def gzip_ndjson(records):
+    """
+    One gzip NDJSON file in memory:
+    {"record_key": ..., "payload": "<json text>", "fetched_at": "<iso>"}
+    """
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=6) as gz:
+        for key, payload, fetched_at in records:
+            line = json.dumps({
+                "record_key": key,
+                "payload": payload,
+                "fetched_at": fetched_at.isoformat(sep=" "),
+            })
+            gz.write(line.encode("utf-8") + b"\n")
+    buf.seek(0)
+    return buf
+
+
+def values_chunks(records, size=None):
+    size = max(1, size or VALUES_BATCH)
+    for i in range(0, len(records), size):
+        yield records[i:i + size]
+
+
+def batch_id():
+    return uuid.uuid4().hex[:12]
@@ -0,0 +1,206 @@
+"""
+Micro-batch coalescing in front of the destination writers.
+
+Connectors push whatever they have: one metadata row, one API page, one
+scan page. Every push_to_destination call used to cost a recovery-buffer
+insert, a format lookup, a writer connection, a push log row and (for
+object stores) one more tiny file. While a WriteBuffer is active, pushes
+are appended per (uid, source, destination) and handed to the writer as
+one right-sized batch once any threshold is crossed:
+
+  * DEST_BUFFER_MAX_ROWS   rows pending for the key
+  * DEST_BUFFER_MAX_BYTES  approximate serialized size pending
+  * DEST_BUFFER_MAX_AGE    seconds since the oldest pending row arrived
+                           (checked on the next push for that key)
+
+Anything left is flushed at the end of the sync.
+
+Opt-in (DEST_BUFFER_ENABLED=1): while buffering, push_to_destination
+returns before rows are written, so write errors surface only in the
+end-of-request flush instead of in the connector's own response.
+"""
+
+import json
+import os
+import threading
+import time
+
+from backend.destinations.client_pool import client_key
+
+BUFFER_ENABLED = os.getenv("DEST_BUFFER_ENABLED", "0") == "1"
+MAX_ROWS = int(os.getenv("DEST_BUFFER_MAX_ROWS", "5000"))
+MAX_BYTES = int(os.getenv("DEST_BUFFER_MAX_BYTES", str(16 * 1024 * 1024)))
+MAX_AGE = float(os.getenv("DEST_BUFFER_MAX_AGE", "30"))
+
+_SIZE_SAMPLE = 8
+
+
+def approx_size(rows):
+    """Serialized size estimate from a small sample of the rows."""
+    if not rows:
+        return 0
+    sample = rows[:_SIZE_SAMPLE]
+    total = sum(len(json.dumps(r, default=str)) for r in sample)
+    return total * len(rows) // len(sample)
+
+
+def destination_key(dest_cfg):
+    """Key for one destination config, or for a fan-out list of them."""
+    if isinstance(dest_cfg, (list, tuple)):
+        return tuple(destination_key(d) for d in dest_cfg)
+    return (
+        client_key(dest_cfg, dest_cfg.get("type") or ""),
+        (dest_cfg.get("format") or "").lower(),
+    )
+
+
+def buffer_key(uid, source, dest_cfg, skip_storage=False):
+    return (uid, source, destination_key(dest_cfg), bool(skip_storage))
+
+
+def _dest_types(dest_cfg):
+    if isinstance(dest_cfg, (list, tuple)):
+        return ",".join(str(d.get("type")) for d in dest_cfg)
+    return dest_cfg.get("type")
+
+
+class _Pending:
+
+    def __init__(self, uid, source, dest_cfg, skip_storage):
+        self.uid = uid
+        self.source = source
+        if isinstance(dest_cfg, (list, tuple)):
+            self.dest_cfg = [dict(d) for d in dest_cfg]
+        else:
+            self.dest_cfg = dict(dest_cfg)
+        self.skip_storage = skip_storage
+        self.rows = []
+        self.bytes = 0
+        self.since = None
+
+
+class WriteBuffer:
+    """
+    Per-key row buffer. `flush_fn(dest_cfg, source, rows, skip_storage, uid)`
+    performs the real push and returns the number of rows written.
+    """
+
+    def __init__(self, flush_fn, max_rows=MAX_ROWS, max_bytes=MAX_BYTES, max_age=MAX_AGE):
+        self.flush_fn = flush_fn
+        self.max_rows = max(1, max_rows)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.pushes_in = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    def _due(self, p, now):
+        """'all' to flush everything pending, 'full' for whole max_rows chunks only."""
+        if (self.max_bytes and p.bytes >= self.max_bytes) or (
+            self.max_age and p.since is not None and now - p.since >= self.max_age
+        ):
+            return "all"
+        if len(p.rows) >= self.max_rows:
+            return "full"
+        return None
+
+    def add(self, dest_cfg, source, rows, uid=None, skip_storage=False):
+        """Queue rows; flushes the key first if a threshold is reached."""
+        if not rows:
+            return 0
+
+        key = buffer_key(uid, source, dest_cfg, skip_storage)
+        now = time.monotonic()
+
+        with self._lock:
+            p = self._pending.get(key)
+            if p is None:
+                p = self._pending[key] = _Pending(uid, source, dest_cfg, skip_storage)
+            if p.since is None:
+                p.since = now
+            p.rows.extend(rows)
+            p.bytes += approx_size(rows)
+            self.pushes_in += 1
+
+            due = self._due(p, now)
+            if due == "all":
+                ready = self._take(key)
+            elif due == "full":
+                ready = self._split(p, now)
+            else:
+                ready = None
+
+        if ready is not None:
+            self._flush_pending(ready)
+
+        return len(rows)
+
+    def _take(self, key):
+        p = self._pending.pop(key, None)
+        if p is None or not p.rows:
+            return None
+        return p
+
+    def _split(self, p, now):
+        # Hand over whole chunks, keep the tail pending for the next push.
+        cut = len(p.rows) - len(p.rows) % self.max_rows
+        ready = _Pending(p.uid, p.source, p.dest_cfg, p.skip_storage)
+        ready.rows = p.rows[:cut]
+        p.rows = p.rows[cut:]
+        p.bytes = approx_size(p.rows)
+        p.since = now if p.rows else None
+        return ready
+
+    def _flush_pending(self, p):
+        # Writers get at most max_rows per call even if one push was larger.
+        count = 0
+        for i in range(0, len(p.rows), self.max_rows):
+            count += self.flush_fn(
+                p.dest_cfg, p.source, p.rows[i:i + self.max_rows],
+                p.skip_storage, p.uid,
+            ) or 0
+            self.flushes += 1
+        self.rows_flushed += count
+        return count
+
+    def flush(self):
+        """
+        Push everything pending. Every key is attempted; if any failed the
+        first error is re-raised after the rest have been written.
+        """
+        with self._lock:
+            pending = [self._take(k) for k in list(self._pending)]
+
+        total = 0
+        first_error = None
+        for p in pending:
+            if p is None:
+                continue
+            try:
+                total += self._flush_pending(p)
+            except Exception as e:
+                print(
+                    f"[BUFFER] Flush failed (source={p.source}, "
+                    f"dest_type={_dest_types(p.dest_cfg)}, rows={len(p.rows)}): {e}",
+                    flush=True,
+                )
+                if first_error is None:
+                    first_error = e
+
+        if first_error is not None:
+            raise first_error
+        return total
+
+    def pending_rows(self):
+        with self._lock:
+            return sum(len(p.rows) for p in self._pending.values())
+
+    def stats(self):
+        return {
+            "pushes_in": self.pushes_in,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "pending_rows": self.pending_rows(),
+        }
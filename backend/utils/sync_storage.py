@@ -88,7 +88,9 @@ def get_recent_sync_data(uid, source):
         now = datetime.datetime.utcnow().isoformat()
         
         con = sqlite3.connect(DB)
-        cur = con.cursor()
+        # Server-side cursor: batches are parsed as they stream in instead of
+        # holding every raw JSON blob and its parsed copy at once.
+        cur = con.cursor(server_side=True, itersize=50)
         
         cur.execute("""
             SELECT data FROM connector_sync_log
@@ -98,7 +100,7 @@ def get_recent_sync_data(uid, source):
         """, (uid, source))
         
         recent_data_batches = []
-        for row in cur.fetchall():
+        for row in cur:
             try:
                 batch_rows = json.loads(row[0])
                 if batch_rows:
@@ -0,0 +1,76 @@
+"""
+Micro-benchmark for Cursor.executemany in the sqlite3 shim.
+
+Inserts the same 10k-row batch with each executemany strategy and reports
+rows/second. Needs DATABASE_URL; run from the repo root:
+
+    python scratch/bench_executemany.py [rows] [page_size]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3  # noqa: E402  (the PostgreSQL shim at the repo root)
+
+TABLE = "bench_executemany"
+
+
+def run(mode, rows, page_size):
+    sqlite3.EXECUTEMANY_MODE = mode
+    sqlite3.EXECUTEMANY_PAGE_SIZE = page_size
+
+    con = sqlite3.connect(isolation_level="DEFERRED")
+    con.execute(f"DELETE FROM {TABLE}")
+    con.commit()
+
+    start = time.perf_counter()
+    con.executemany(
+        f"INSERT INTO {TABLE} (uid, source, payload, n) VALUES (?, ?, ?, ?)",
+        rows,
+    )
+    con.commit()
+    elapsed = time.perf_counter() - start
+
+    con.close()
+    return elapsed
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else sqlite3.EXECUTEMANY_PAGE_SIZE
+
+    con = sqlite3.connect()
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABLE} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            uid TEXT,
+            source TEXT,
+            payload TEXT,
+            n INTEGER
+        )
+    """)
+    con.close()
+
+    rows = [
+        (f"user-{i % 50}", "bench", f'{{"i": {i}, "text": "row\\t{i}"}}', i)
+        for i in range(n)
+    ]
+
+    print(f"rows={n} page_size={page_size}")
+    baseline = None
+    for mode in ("row", "values", "copy"):
+        elapsed = run(mode, rows, page_size)
+        rate = n / elapsed if elapsed else float("inf")
+        baseline = baseline or rate
+        print(f"{mode:>7}: {elapsed:8.3f}s  {rate:12,.0f} rows/s  x{rate / baseline:.1f}")
+
+    con = sqlite3.connect()
+    con.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark server-side prepared statements in the sqlite3 shim.
+
+Replays the hot per-request query mix (session lookup, connector existence
+checks, api_usage_logs insert) against scratch copies of those tables, with
+and without PREPARE/EXECUTE, and reports:
+
+  * wall-clock time for the whole replay
+  * planning vs execution time per query from EXPLAIN (ANALYZE, SUMMARY)
+
+Needs DATABASE_URL; run from the repo root:
+
+    python scratch/bench_prepared.py [requests] [rows]
+"""
+
+import os
+import re
+import sys
+import time
+import uuid
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3  # noqa: E402  (the PostgreSQL shim at the repo root)
+from backend.db.postgres import acquire_connection, release_connection  # noqa: E402
+
+PREFIX = "bench_ps_"
+
+SCHEMA = [
+    f"CREATE TABLE IF NOT EXISTS {PREFIX}user_sessions (session_id TEXT, user_id TEXT, created_at TEXT)",
+    f"CREATE TABLE IF NOT EXISTS {PREFIX}google_connections (uid TEXT, source TEXT, enabled INTEGER)",
+    f"CREATE TABLE IF NOT EXISTS {PREFIX}connector_configs (uid TEXT, connector TEXT, config TEXT)",
+    f"CREATE TABLE IF NOT EXISTS {PREFIX}api_usage_logs (uid TEXT, endpoint TEXT, method TEXT, created_at TEXT)",
+]
+
+SOURCES = ["github", "gmail", "stripe", "slack", "notion", "hubspot"]
+
+
+def request_mix(sessions, uids, i):
+    """The statements one authenticated /sync or /api request issues."""
+    uid = uids[i % len(uids)]
+    source = SOURCES[i % len(SOURCES)]
+    return [
+        (f"SELECT user_id FROM {PREFIX}user_sessions WHERE session_id=?", (sessions[i % len(sessions)],)),
+        (
+            f"INSERT INTO {PREFIX}api_usage_logs (uid, endpoint, method, created_at) VALUES (?, ?, ?, ?)",
+            (uid, f"/api/status/{source}", "GET", datetime.datetime.utcnow().isoformat()),
+        ),
+        (f"SELECT 1 FROM {PREFIX}connector_configs WHERE uid=? AND connector=? LIMIT 1", (uid, source)),
+        (f"SELECT enabled FROM {PREFIX}google_connections WHERE uid=? AND source=? LIMIT 1", (uid, source)),
+    ]
+
+
+def seed(rows):
+    con = sqlite3.connect()
+    for stmt in SCHEMA:
+        con.execute(stmt)
+    sessions = [str(uuid.uuid4()) for _ in range(rows)]
+    uids = [str(uuid.uuid4()) for _ in range(max(rows // 10, 1))]
+    con.executemany(
+        f"INSERT INTO {PREFIX}user_sessions (session_id, user_id, created_at) VALUES (?, ?, ?)",
+        [(s, uids[i % len(uids)], "2024-01-01") for i, s in enumerate(sessions)],
+    )
+    con.executemany(
+        f"INSERT INTO {PREFIX}google_connections (uid, source, enabled) VALUES (?, ?, ?)",
+        [(u, s, 1) for u in uids for s in SOURCES],
+    )
+    con.executemany(
+        f"INSERT INTO {PREFIX}connector_configs (uid, connector, config) VALUES (?, ?, ?)",
+        [(u, s, "{}") for u in uids for s in SOURCES[::2]],
+    )
+    con.execute(f"ANALYZE {PREFIX}user_sessions")
+    con.close()
+    return sessions, uids
+
+
+def replay(prepared, n, sessions, uids):
+    sqlite3.PREPARED_STATEMENTS = prepared
+    con = sqlite3.connect()
+    start = time.perf_counter()
+    for i in range(n):
+        for sql, params in request_mix(sessions, uids, i):
+            cur = con.execute(sql, params)
+            if cur.description:
+                cur.fetchall()
+    elapsed = time.perf_counter() - start
+    con.close()
+    return elapsed
+
+
+def _explain_times(cur, sql, params):
+    cur.execute(f"EXPLAIN (ANALYZE, SUMMARY) {sql}", params)
+    text = "\n".join(r[0] for r in cur.fetchall())
+    plan = re.search(r"Planning Time: ([\d.]+)", text)
+    execute = re.search(r"Execution Time: ([\d.]+)", text)
+    return float(plan.group(1)) if plan else 0.0, float(execute.group(1)) if execute else 0.0
+
+
+def plan_breakdown(sessions, uids, samples=50):
+    """Average planning/execution ms per query shape, plain vs prepared."""
+    raw = acquire_connection()
+    raw.autocommit = True
+    cur = raw.cursor()
+    results = []
+    try:
+        for q, (sql, _) in enumerate(request_mix(sessions, uids, 0)):
+            if not sql.lstrip().upper().startswith("SELECT"):
+                continue
+            pg_sql = sqlite3._replace_qmark_params(sql)
+            dollar_sql, nparams = sqlite3._to_dollar_params(pg_sql)
+            name = f"bench_ps_{q}"
+            cur.execute(f"PREPARE {name} AS {dollar_sql}")
+            placeholders = ", ".join(["%s"] * nparams)
+
+            plain = [0.0, 0.0]
+            prepared = [0.0, 0.0]
+            for i in range(samples):
+                params = request_mix(sessions, uids, i)[q][1]
+                p, e = _explain_times(cur, pg_sql, params)
+                plain[0] += p
+                plain[1] += e
+                p, e = _explain_times(cur, f"EXECUTE {name} ({placeholders})", params)
+                prepared[0] += p
+                prepared[1] += e
+            cur.execute(f"DEALLOCATE {name}")
+            results.append((sql, [v / samples for v in plain], [v / samples for v in prepared]))
+    finally:
+        cur.close()
+        release_connection(raw)
+    return results
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    sessions, uids = seed(rows)
+    try:
+        plain = replay(False, n, sessions, uids)
+        prepared = replay(True, n, sessions, uids)
+        stmts = n * len(request_mix(sessions, uids, 0))
+        print(f"replayed {n} requests ({stmts} statements), {rows} sessions")
+        print(f"   plain: {plain:8.3f}s  {stmts / plain:10,.0f} stmt/s")
+        print(f"prepared: {prepared:8.3f}s  {stmts / prepared:10,.0f} stmt/s  x{plain / prepared:.2f}")
+        print()
+        print(f"{'query':60} {'plan ms':>9} {'exec ms':>9} {'prep plan':>10} {'prep exec':>10}")
+        for sql, p, e in plan_breakdown(sessions, uids):
+            label = " ".join(sql.split())[:60]
+            print(f"{label:60} {p[0]:9.4f} {p[1]:9.4f} {e[0]:10.4f} {e[1]:10.4f}")
+    finally:
+        con = sqlite3.connect()
+        for stmt in SCHEMA:
+            table = stmt.split()[5]
+            con.execute(f"DROP TABLE IF EXISTS {table}")
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark for the warehouse writers: old row-by-row INSERT path vs
+stage-and-merge.
+
+Pushes the same synthetic batch through push_snowflake / push_redshift /
+push_databricks with write_mode "append" and then "merge" (twice, the
+second run re-syncing identical records), and reports rows/second.
+The destination comes from BENCH_DEST as JSON, e.g.
+
+    BENCH_DEST='{"type": "redshift", "host": "...", "port": 5439,
+                 "username": "...", "password": "...",
+                 "database_name": "dev.public"}' \\
+        python scratch/bench_warehouse_merge.py [rows]
+
+The bench_<type> table is left behind so the results can be inspected.
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WRITERS = {
+    "snowflake": ("backend.destinations.snowflake_writer", "push_snowflake"),
+    "redshift": ("backend.destinations.redshift_writer", "push_redshift"),
+    "databricks": ("backend.destinations.databricks_writer", "push_databricks"),
+}
+
+
+def make_rows(n):
+    return [
+        {
+            "uid": "bench",
+            "source": "bench",
+            "record_id": str(i),
+            "name": f"record {i}",
+            "amount": i * 1.5,
+            "tags": ["a", "b"],
+            "nested": {"i": i, "text": "row\t" + str(i)},
+        }
+        for i in range(n)
+    ]
+
+
+def run(push, dest, source, rows, mode):
+    cfg = dict(dest, write_mode=mode)
+    start = time.perf_counter()
+    count = push(cfg, source, rows)
+    return count, time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    dest = json.loads(os.environ["BENCH_DEST"])
+    module, name = WRITERS[dest["type"]]
+    push = getattr(__import__(module, fromlist=[name]), name)
+
+    source = f"bench_{dest['type']}"
+    rows = make_rows(n)
+
+    print(f"type={dest['type']} rows={n}")
+    baseline = None
+    for label, mode in (("append", "append"), ("merge", "merge"), ("re-merge", "merge")):
+        count, elapsed = run(push, dest, source, rows, mode)
+        rate = n / elapsed if elapsed else float("inf")
+        baseline = baseline or rate
+        print(f"{label:>9}: {count:>8} rows  {elapsed:8.3f}s  {rate:12,.0f} rows/s  x{rate / baseline:.1f}")
+
+
+if __name__ == "__main__":
+    main()
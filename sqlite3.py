@@ -7,7 +7,16 @@ while routing all DB operations to PostgreSQL using DATABASE_URL.
 
 from __future__ import annotations
 
+import contextvars
+import datetime
+import decimal
+import io
+import itertools
+import os
 import re
+import threading
+import weakref
+from collections import OrderedDict
 from typing import Iterable
 
 import psycopg2
@@ -62,10 +71,10 @@ def _map_error(exc: Exception) -> Exception:
 
 
 class _CompatRow:
-    def __init__(self, columns: list[str], values: tuple):
+    def __init__(self, columns: list[str], values: tuple, index: dict | None = None):
         self._columns = columns
         self._values = tuple(values)
-        self._index = {k: i for i, k in enumerate(columns)}
+        self._index = index if index is not None else {k: i for i, k in enumerate(columns)}
 
     def __getitem__(self, key):
         if isinstance(key, int):
@@ -165,6 +174,438 @@ def _quote_reserved_user_identifier(sql: str) -> str:
     return "".join(out)
 
 
+_DDL_RE = re.compile(r"(?is)^\s*(CREATE|ALTER|DROP)\b")
+_INSERT_TABLE_RE = re.compile(r'(?is)^\s*INSERT\s+INTO\s+"?([a-zA-Z_][\w]*)"?')
+_RETURNING_RE = re.compile(r"(?is)\bRETURNING\b")
+_RETURNING_ID_SUFFIX = " RETURNING id"
+_QUERY_RE = re.compile(r"(?is)^\s*(SELECT|WITH)\b")
+
+# Rows fetched per round trip by server-side (named) cursors.
+SERVER_CURSOR_ITERSIZE = int(os.getenv("SQL_SERVER_CURSOR_ITERSIZE", "2000"))
+_server_cursor_ids = itertools.count(1)
+
+
+def _is_ddl(sql: str) -> bool:
+    return bool(_DDL_RE.match(sql))
+
+
+class _StatementCache:
+    """
+    Bounded LRU of raw SQL text -> (rewritten PostgreSQL text, mode).
+
+    The codebase issues a few hundred distinct statements, so caching the
+    rewrite turns the regex/scanner pipeline into a dict lookup on hot paths.
+    Rewrites of INSERT OR REPLACE depend on catalog state, so the whole cache
+    is cleared whenever the shim executes DDL.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[str, tuple[str, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sql: str):
+        with self._lock:
+            entry = self._data.get(sql)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(sql)
+            self.hits += 1
+            return entry
+
+    def put(self, sql: str, entry: tuple[str, str]) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[sql] = entry
+            self._data.move_to_end(sql)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+_STATEMENT_CACHE = _StatementCache(int(os.getenv("SQL_REWRITE_CACHE_SIZE", "1024")))
+
+
+def statement_cache_info() -> dict:
+    """Hit/miss counters and occupancy of the SQL rewrite cache."""
+    return _STATEMENT_CACHE.info()
+
+
+def clear_statement_cache() -> None:
+    _STATEMENT_CACHE.clear()
+
+
+class _TableMetadataCache:
+    """
+    Process-wide primary key / unique / column lists per table, plus the
+    columns whose value the server generates (serial, identity, uuid default)
+    and the emulated PRAGMA table_info rows (loaded lazily, not warmed).
+
+    INSERT OR REPLACE rewriting needs these on every upsert; the catalog only
+    changes through DDL, which clears the cache.
+    """
+
+    KINDS = ("pk", "unique", "columns", "generated")
+
+    def __init__(self):
+        self._data: dict[str, dict[str, list[str]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, table: str, kind: str):
+        # Callers must treat the returned list as read-only.
+        with self._lock:
+            return self._data.get(table, {}).get(kind)
+
+    def put(self, table: str, kind: str, cols: list[str]) -> None:
+        with self._lock:
+            self._data.setdefault(table, {})[kind] = list(cols)
+
+    def replace_all(self, data: dict[str, dict[str, list[str]]]) -> None:
+        with self._lock:
+            self._data = data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+_TABLE_METADATA = _TableMetadataCache()
+
+_BULK_METADATA_SQL = """
+    SELECT 'columns' AS kind, table_name::text, column_name::text,
+           0::bigint AS index_id, ordinal_position::int AS pos
+    FROM information_schema.columns
+    WHERE table_schema = current_schema()
+    UNION ALL
+    SELECT 'generated', table_name::text, column_name::text,
+           0::bigint, ordinal_position::int
+    FROM information_schema.columns
+    WHERE table_schema = current_schema()
+      AND (is_identity = 'YES'
+           OR column_default LIKE 'nextval(%'
+           OR column_default LIKE 'gen_random_uuid()%')
+    UNION ALL
+    SELECT CASE WHEN i.indisprimary THEN 'pk' ELSE 'unique' END,
+           c.relname::text, a.attname::text,
+           i.indexrelid::bigint, array_position(i.indkey, a.attnum)::int
+    FROM pg_index i
+    JOIN pg_attribute a
+      ON a.attrelid = i.indrelid
+     AND a.attnum = ANY(i.indkey)
+    JOIN pg_class c
+      ON c.oid = i.indrelid
+    JOIN pg_namespace n
+      ON n.oid = c.relnamespace
+    WHERE i.indisunique = true
+      AND n.nspname = current_schema()
+    ORDER BY 2, 1, 4, 5
+"""
+
+
+def warm_table_metadata() -> int:
+    """
+    Load pk/unique/column lists for every table in one catalog query.
+
+    Returns the number of tables cached. Tables created later are still
+    resolved lazily on first use.
+    """
+    raw = acquire_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(_BULK_METADATA_SQL)
+        rows = cur.fetchall()
+        cur.close()
+    finally:
+        release_connection(raw)
+
+    data: dict[str, dict[str, list[str]]] = {}
+    for kind, table, column, _index_id, _pos in rows:
+        entry = data.setdefault(table, {k: [] for k in _TableMetadataCache.KINDS})
+        entry[kind].append(column)
+
+    for entry in data.values():
+        # Mirror _table_unique_columns, which caps the lookup at 10 rows.
+        entry["unique"] = entry["unique"][:10]
+
+    _TABLE_METADATA.replace_all(data)
+    return len(data)
+
+
+def clear_table_metadata() -> None:
+    _TABLE_METADATA.clear()
+
+
+# executemany strategy for INSERTs: "values" sends multi-row VALUES pages,
+# "copy" streams plain inserts through COPY FROM STDIN, "row" keeps
+# psycopg2's one-statement-per-row behaviour.
+EXECUTEMANY_MODE = os.getenv("SQL_EXECUTEMANY_MODE", "values").lower()
+EXECUTEMANY_PAGE_SIZE = int(os.getenv("SQL_EXECUTEMANY_PAGE_SIZE", "1000"))
+
+_INSERT_HEAD_RE = re.compile(
+    r'(?is)^\s*INSERT\s+INTO\s+("?[a-zA-Z_][\w]*"?)\s*(?:\((.*?)\))?\s*VALUES\s*(?=\()'
+)
+_CONFLICT_RE = re.compile(
+    r"(?is)^\s*ON\s+CONFLICT\s*(?:\(([^)]*)\))?\s*DO\s+(NOTHING|UPDATE\s+SET\s+(.+))\s*$"
+)
+_EXCLUDED_ASSIGN_RE = re.compile(r"(?is)^\s*\"?(\w+)\"?\s*=\s*EXCLUDED\.\"?(\w+)\"?\s*$")
+
+
+def _match_paren(sql: str, start: int) -> int:
+    """Index of the parenthesis closing the one at `start`, or -1."""
+    depth = 0
+    in_single = False
+    for i in range(start, len(sql)):
+        ch = sql[i]
+        if in_single:
+            if ch == "'":
+                in_single = False
+        elif ch == "'":
+            in_single = True
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def _parse_batch_insert(sql: str):
+    """
+    Split a rewritten single-row INSERT into the pieces execute_values needs.
+
+    Returns a dict with table, columns, the per-row template, the trailing
+    ON CONFLICT clause and the dedupe key for DO UPDATE, or None when the
+    statement cannot be batched safely.
+    """
+    m = _INSERT_HEAD_RE.match(sql)
+    if not m:
+        return None
+    start = m.end()
+    end = _match_paren(sql, start)
+    if end == -1:
+        return None
+
+    template = sql[start:end + 1]
+    tail = sql[end + 1:].strip().rstrip(";").strip()
+    columns = _split_columns(m.group(2)) if m.group(2) else None
+
+    info = {
+        "head": sql[:start],
+        "table": m.group(1),
+        "columns": columns,
+        "template": template,
+        "tail": tail,
+        "plain": not tail,
+        "dedupe_key": None,
+    }
+    if not tail:
+        return info
+
+    conflict = _CONFLICT_RE.match(tail)
+    if not conflict:
+        return None
+    if conflict.group(2).upper() == "NOTHING":
+        return info
+
+    # DO UPDATE may not touch the same row twice in one statement. Keeping the
+    # last row per key is only equivalent to row-by-row upserts when every
+    # assignment is col=EXCLUDED.col, they cover every inserted non-key
+    # column (otherwise the first row's values survive in the columns the
+    # SET list leaves alone) and the key columns map to parameters.
+    if not conflict.group(1) or not columns:
+        return None
+    assigned = set()
+    for a in _split_columns(conflict.group(3)):
+        am = _EXCLUDED_ASSIGN_RE.match(a)
+        if not am or am.group(1).lower() != am.group(2).lower():
+            return None
+        assigned.add(am.group(1).lower())
+    key_columns = {c.lower() for c in _split_columns(conflict.group(1))}
+    if not {c.lower() for c in columns} - key_columns <= assigned:
+        return None
+
+    slots = _split_columns(template[1:-1])
+    if len(slots) != len(columns):
+        return None
+    param_index = {}
+    n = 0
+    for col, slot in zip(columns, slots):
+        if slot == "%s":
+            param_index[col.lower()] = n
+            n += 1
+        elif "%s" in slot:
+            return None
+
+    key = []
+    for col in _split_columns(conflict.group(1)):
+        if col.lower() not in param_index:
+            return None
+        key.append(param_index[col.lower()])
+    info["dedupe_key"] = key
+    return info
+
+
+def _dedupe_last(rows: list, key: list[int]) -> list:
+    seen = {}
+    for r in rows:
+        seen[tuple(r[i] for i in key)] = r
+    return list(seen.values())
+
+
+def _copy_text(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "\\\\x" + bytes(value).hex()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+# Optional server-side prepared statements for repeated parameterised
+# queries. Off by default; statements are prepared per pooled connection
+# once seen PREPARE_THRESHOLD times on it.
+PREPARED_STATEMENTS = os.getenv("SQL_PREPARED_STATEMENTS", "0") == "1"
+PREPARE_THRESHOLD = int(os.getenv("SQL_PREPARE_THRESHOLD", "2"))
+PREPARED_MAX_PER_CONN = int(os.getenv("SQL_PREPARED_MAX_PER_CONN", "256"))
+
+_PREPARABLE_RE = re.compile(r"(?is)^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b")
+# Server errors after which a prepared statement is dropped and the query is
+# retried as plain SQL: missing statement, cached plan result type changed.
+_STALE_PREPARED_CODES = {"26000", "0A000"}
+
+# Declared PREPARE parameter types, mirroring how psycopg2 would inline each
+# Python value as a literal. Strings and NULLs stay "unknown" so PostgreSQL
+# infers them from context exactly as it does for quoted literals. Floats
+# are inlined as bare numeric constants, so they are declared numeric, not
+# float8; aware datetimes keep their offset as timestamptz.
+_PG_PARAM_TYPES = {
+    bool: "boolean",
+    int: "bigint",
+    float: "numeric",
+    decimal.Decimal: "numeric",
+    datetime.date: "date",
+    bytes: "bytea",
+}
+
+
+def _pg_param_type(value) -> str:
+    if type(value) is datetime.datetime:
+        return "timestamptz" if value.tzinfo is not None else "timestamp"
+    return _PG_PARAM_TYPES.get(type(value), "unknown")
+
+_prepared_ids = itertools.count(1)
+_prepared_lock = threading.Lock()
+_prepared_by_conn = weakref.WeakKeyDictionary()
+_unpreparable: set[str] = set()
+_ddl_generation = 0
+
+
+class _PreparedStatements:
+    """
+    Prepared statement names on one raw connection, LRU-bounded and keyed by
+    (rewritten SQL, declared parameter types).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.generation = _ddl_generation
+        self.names: OrderedDict[tuple, str] = OrderedDict()
+        self.seen: OrderedDict[tuple, int] = OrderedDict()
+
+    def lookup(self, sql: tuple):
+        name = self.names.get(sql)
+        if name is not None:
+            self.names.move_to_end(sql)
+        return name
+
+    def should_prepare(self, sql: tuple) -> bool:
+        count = self.seen.pop(sql, 0) + 1
+        if count >= PREPARE_THRESHOLD:
+            return True
+        self.seen[sql] = count
+        while len(self.seen) > PREPARED_MAX_PER_CONN:
+            self.seen.popitem(last=False)
+        return False
+
+    def add(self, sql: tuple, name: str):
+        """Register a statement; returns the name evicted to make room, if any."""
+        self.names[sql] = name
+        if len(self.names) > PREPARED_MAX_PER_CONN:
+            return self.names.popitem(last=False)[1]
+        return None
+
+    def discard(self, sql: tuple) -> None:
+        self.names.pop(sql, None)
+
+
+def _prepared_for(raw) -> _PreparedStatements:
+    with _prepared_lock:
+        reg = _prepared_by_conn.get(raw)
+        if reg is None:
+            reg = _PreparedStatements()
+            _prepared_by_conn[raw] = reg
+        return reg
+
+
+def _to_dollar_params(sql: str) -> tuple[str, int]:
+    """Turn psycopg2 %s placeholders into $1..$n for PREPARE."""
+    out = []
+    n = 0
+    in_single = False
+    in_double = False
+    i = 0
+    while i < len(sql):
+        ch = sql[i]
+        if ch == "'" and not in_double:
+            in_single = not in_single
+        elif ch == '"' and not in_single:
+            in_double = not in_double
+        elif ch == "%" and i + 1 < len(sql):
+            nxt = sql[i + 1]
+            if nxt == "%":
+                out.append("%")
+                i += 2
+                continue
+            if nxt == "s" and not in_single and not in_double:
+                n += 1
+                out.append(f"${n}")
+                i += 2
+                continue
+        out.append(ch)
+        i += 1
+    return "".join(out), n
+
+
 def _split_columns(raw: str) -> list[str]:
     cols = []
     current = []
@@ -185,36 +626,118 @@ def _split_columns(raw: str) -> list[str]:
 
 
 class Cursor:
-    def __init__(self, conn: "Connection"):
+    """
+    sqlite3-style cursor over a psycopg2 cursor.
+
+    With server_side=True, SELECT/WITH statements run through a named
+    PostgreSQL cursor that fetches `itersize` rows per round trip, so
+    iterating or calling fetchmany() keeps memory flat on large results.
+    Everything else (DML, catalog lookups) still uses the client cursor.
+    """
+
+    def __init__(self, conn: "Connection", server_side: bool = False, itersize: int | None = None):
         self._conn = conn
-        self._cur = conn._raw.cursor()
+        self._client = conn._raw.cursor()
+        self._cur = self._client
+        self._server_side = server_side
+        self.itersize = itersize or SERVER_CURSOR_ITERSIZE
+        self.arraysize = 1
+        self._row_shape = None
         self._description = None
         self._last_rows = None
+        self._last_pos = 0
+        self._returning_id = False
+        self._lastrowid = None
         self.rowcount = -1
-        self.lastrowid = None
 
     @property
     def description(self):
         if self._description is not None:
             return self._description
+        if self._returning_id:
+            return None
         return self._cur.description
 
+    @property
+    def lastrowid(self):
+        # The RETURNING row is already buffered client-side; only unpack it
+        # when someone asks.
+        if self._returning_id:
+            self._returning_id = False
+            try:
+                rows = self._cur.fetchall()
+                self._lastrowid = rows[-1][0] if rows else None
+            except Exception:
+                self._lastrowid = None
+        return self._lastrowid
+
     def close(self):
+        self._close_named()
+        try:
+            self._client.close()
+        except Exception:
+            pass
+
+    def _close_named(self):
+        if self._cur is self._client:
+            return
         try:
             self._cur.close()
         except Exception:
             pass
+        self._cur = self._client
+        self._conn._untrack_cursor(self)
+
+    def _open_named(self):
+        raw = self._conn._raw
+        # Autocommit sessions need WITH HOLD for the cursor to outlive the
+        # implicit transaction of DECLARE.
+        self._cur = raw.cursor(
+            name=f"shim_cursor_{next(_server_cursor_ids)}",
+            withhold=raw.autocommit,
+        )
+        self._cur.itersize = self.itersize
+        self._conn._track_cursor(self)
 
     def _set_memory_result(self, columns: list[str], rows: list[tuple]):
         self._description = [(c, None, None, None, None, None, None) for c in columns]
+        # Emulated results are read through an index, never mutated, so the
+        # cached table_info list can be handed over without copying.
         self._last_rows = rows
+        self._last_pos = 0
         self.rowcount = len(rows)
 
     def _clear_memory_result(self):
         self._description = None
         self._last_rows = None
+        self._last_pos = 0
+
+    def _take_memory_rows(self, size: int | None) -> list:
+        start = self._last_pos
+        end = len(self._last_rows) if size is None else min(start + size, len(self._last_rows))
+        self._last_pos = end
+        return self._last_rows[start:end]
+
+    def _cached_metadata(self, table_name: str, kind: str, loader) -> list[str]:
+        cols = _TABLE_METADATA.get(table_name, kind)
+        if cols is None:
+            cols = loader(table_name)
+            _TABLE_METADATA.put(table_name, kind, cols)
+        return cols
 
     def _table_pk_columns(self, table_name: str) -> list[str]:
+        return self._cached_metadata(table_name, "pk", self._query_pk_columns)
+
+    def _table_unique_columns(self, table_name: str) -> list[str]:
+        return self._cached_metadata(table_name, "unique", self._query_unique_columns)
+
+    def _table_columns(self, table_name: str) -> list[str]:
+        return self._cached_metadata(table_name, "columns", self._query_columns)
+
+    def _table_generated_columns(self, table_name: str) -> list[str]:
+        return self._cached_metadata(table_name, "generated", self._query_generated_columns)
+
+    def _query_pk_columns(self, table_name: str) -> list[str]:
         q = """
             SELECT a.attname
             FROM pg_index i
@@ -233,7 +756,7 @@ class Cursor:
         self._cur.execute(q, (table_name,))
         return [r[0] for r in self._cur.fetchall()]
 
-    def _table_unique_columns(self, table_name: str) -> list[str]:
+    def _query_unique_columns(self, table_name: str) -> list[str]:
         q = """
             SELECT a.attname
             FROM pg_index i
@@ -255,17 +778,72 @@ class Cursor:
         rows = self._cur.fetchall()
         return [r[0] for r in rows]
 
-    def _table_columns(self, table_name: str) -> list[str]:
+    def _query_columns(self, table_name: str) -> list[str]:
+        q = """
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = %s
+            ORDER BY ordinal_position
+        """
+        self._cur.execute(q, (table_name,))
+        return [r[0] for r in self._cur.fetchall()]
+
+    def _query_generated_columns(self, table_name: str) -> list[str]:
         q = """
             SELECT column_name
             FROM information_schema.columns
             WHERE table_schema = current_schema()
               AND table_name = %s
+              AND (is_identity = 'YES'
+                   OR column_default LIKE 'nextval(%%'
+                   OR column_default LIKE 'gen_random_uuid()%%')
             ORDER BY ordinal_position
         """
         self._cur.execute(q, (table_name,))
         return [r[0] for r in self._cur.fetchall()]
 
+    def _query_table_info(self, table_name: str) -> list[tuple]:
+        q = """
+            WITH pk_cols AS (
+                SELECT kcu.column_name
+                FROM information_schema.table_constraints tc
+                JOIN information_schema.key_column_usage kcu
+                  ON tc.constraint_name = kcu.constraint_name
+                 AND tc.table_schema = kcu.table_schema
+                WHERE tc.constraint_type = 'PRIMARY KEY'
+                  AND tc.table_schema = current_schema()
+                  AND tc.table_name = %s
+            )
+            SELECT
+                c.ordinal_position - 1 AS cid,
+                c.column_name AS name,
+                c.data_type AS type,
+                CASE WHEN c.is_nullable = 'NO' THEN 1 ELSE 0 END AS notnull,
+                c.column_default AS dflt_value,
+                CASE WHEN p.column_name IS NULL THEN 0 ELSE 1 END AS pk
+            FROM information_schema.columns c
+            LEFT JOIN pk_cols p
+              ON p.column_name = c.column_name
+            WHERE c.table_schema = current_schema()
+              AND c.table_name = %s
+            ORDER BY c.ordinal_position
+        """
+        self._cur.execute(q, (table_name, table_name))
+        return [tuple(r) for r in self._cur.fetchall()]
+
+    def _rewrite_returning_id(self, sql: str) -> tuple[str, str]:
+        """
+        Append RETURNING id to inserts into tables with a server-generated id,
+        so lastrowid comes back with the insert instead of a LASTVAL() trip.
+        """
+        m = _INSERT_TABLE_RE.match(sql)
+        if not m or _RETURNING_RE.search(sql):
+            return sql, "db"
+        if "id" not in self._table_generated_columns(m.group(1)):
+            return sql, "db"
+        return f"{sql.rstrip().rstrip(';')}{_RETURNING_ID_SUFFIX}", "returning_id"
+
     def _rewrite_insert_or(self, sql: str) -> str:
         m = re.match(
             r"(?is)^\s*INSERT\s+OR\s+(REPLACE|IGNORE)\s+INTO\s+([a-zA-Z_][\w]*)\s*(\((.*?)\))?\s*VALUES\s*(\(.+\))\s*$",
@@ -308,35 +886,9 @@ class Cursor:
         pragma_tbl = re.match(r"(?is)^PRAGMA\s+table_info\s*\(\s*([^)]+)\s*\)\s*;?$", s)
         if pragma_tbl:
             table = pragma_tbl.group(1).strip().strip("'").strip('"')
-            q = """
-                WITH pk_cols AS (
-                    SELECT kcu.column_name
-                    FROM information_schema.table_constraints tc
-                    JOIN information_schema.key_column_usage kcu
-                      ON tc.constraint_name = kcu.constraint_name
-                     AND tc.table_schema = kcu.table_schema
-                    WHERE tc.constraint_type = 'PRIMARY KEY'
-                      AND tc.table_schema = current_schema()
-                      AND tc.table_name = %s
-                )
-                SELECT
-                    c.ordinal_position - 1 AS cid,
-                    c.column_name AS name,
-                    c.data_type AS type,
-                    CASE WHEN c.is_nullable = 'NO' THEN 1 ELSE 0 END AS notnull,
-                    c.column_default AS dflt_value,
-                    CASE WHEN p.column_name IS NULL THEN 0 ELSE 1 END AS pk
-                FROM information_schema.columns c
-                LEFT JOIN pk_cols p
-                  ON p.column_name = c.column_name
-                WHERE c.table_schema = current_schema()
-                  AND c.table_name = %s
-                ORDER BY c.ordinal_position
-            """
-            self._cur.execute(q, (table, table))
             self._set_memory_result(
                 ["cid", "name", "type", "notnull", "dflt_value", "pk"],
-                self._cur.fetchall(),
+                self._cached_metadata(table, "table_info", self._query_table_info),
             )
             return None, "memory"
 
@@ -376,43 +928,174 @@ class Cursor:
         out = self._rewrite_insert_or(out)
         out = _replace_qmark_params(out)
 
-        return out, "db"
+        return self._rewrite_returning_id(out)
+
+    def _rewrite_cached(self, sql: str) -> tuple[str | None, str | None]:
+        if _is_ddl(sql):
+            return self._rewrite_sql(sql)
+
+        entry = _STATEMENT_CACHE.get(sql)
+        if entry is not None:
+            return entry
+
+        rewritten, mode = self._rewrite_sql(sql)
+        # Emulated results (PRAGMA) must run every time; only cache SQL text.
+        if mode != "memory":
+            _STATEMENT_CACHE.put(sql, (rewritten, mode))
+        return rewritten, mode
 
     def execute(self, sql: str, parameters: Iterable | None = None):
         try:
+            # Resolve a pending lastrowid before the cursor result is replaced,
+            # matching sqlite3, where lastrowid survives later non-INSERTs.
+            _ = self.lastrowid
+            self._close_named()
             self._clear_memory_result()
-            rewritten, mode = self._rewrite_sql(sql)
+            rewritten, mode = self._rewrite_cached(sql)
             if mode == "memory":
                 return self
 
+            if self._server_side and mode == "db" and _QUERY_RE.match(rewritten):
+                self._open_named()
+
             params = tuple(parameters) if parameters is not None else None
-            self._cur.execute(rewritten, params)
+            if not (
+                PREPARED_STATEMENTS
+                and params
+                and self._cur is self._client
+                and self._execute_prepared(rewritten, params)
+            ):
+                self._cur.execute(rewritten, params)
             self.rowcount = self._cur.rowcount
-            if self._cur.description:
+            if _is_ddl(sql):
+                # Catalog changes can alter INSERT OR REPLACE conflict targets
+                # and the result shape of prepared statements.
+                global _ddl_generation
+                _STATEMENT_CACHE.clear()
+                _TABLE_METADATA.clear()
+                _ddl_generation += 1
+            if mode == "returning_id":
+                self._returning_id = True
+            elif _INSERT_TABLE_RE.match(rewritten):
+                self._lastrowid = None
+            if not self._returning_id and self._cur.description:
                 self._description = self._cur.description
-            try:
-                if sql.strip().upper().startswith("INSERT"):
-                    self._cur.execute("SELECT LASTVAL()")
-                    v = self._cur.fetchone()
-                    self.lastrowid = v[0] if v else None
-            except Exception:
-                self.lastrowid = None
             return self
         except Exception as exc:
             raise _map_error(exc)
 
+    def _execute_prepared(self, rewritten: str, params: tuple) -> bool:
+        """
+        Run `rewritten` through PREPARE/EXECUTE on this pooled connection.
+
+        Returns False when the statement should run as plain SQL instead:
+        not hot enough yet, not preparable, or inside an explicit
+        transaction, where a failed PREPARE would abort the caller's work.
+        """
+        raw = self._conn._raw
+        if not raw.autocommit or rewritten in _unpreparable or not _PREPARABLE_RE.match(rewritten):
+            return False
+
+        reg = _prepared_for(raw)
+        if reg.generation != _ddl_generation:
+            self._cur.execute("DEALLOCATE ALL")
+            reg.reset()
+
+        types = tuple(_pg_param_type(v) for v in params)
+        key = (rewritten, types)
+        name = reg.lookup(key)
+        if name is None:
+            if not reg.should_prepare(key):
+                return False
+            pg_sql, nparams = _to_dollar_params(rewritten)
+            if nparams != len(params):
+                _unpreparable.add(rewritten)
+                return False
+            name = f"shim_ps_{next(_prepared_ids)}"
+            try:
+                self._cur.execute(f"PREPARE {name} ({', '.join(types)}) AS {pg_sql}")
+            except _PGError:
+                # e.g. parameter types that cannot be inferred without values
+                _unpreparable.add(rewritten)
+                return False
+            evicted = reg.add(key, name)
+            if evicted:
+                self._cur.execute(f"DEALLOCATE {evicted}")
+
+        try:
+            self._cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        except _PGError as exc:
+            if getattr(exc, "pgcode", None) not in _STALE_PREPARED_CODES:
+                raise
+            reg.discard(key)
+            try:
+                self._cur.execute(f"DEALLOCATE {name}")
+            except _PGError:
+                pass
+            return False
+        return True
+
     def executemany(self, sql: str, seq_of_parameters):
         try:
+            _ = self.lastrowid
+            self._close_named()
             self._clear_memory_result()
-            rewritten, mode = self._rewrite_sql(sql)
+            rewritten, mode = self._rewrite_cached(sql)
             if mode == "memory":
                 return self
-            self._cur.executemany(rewritten, list(seq_of_parameters))
-            self.rowcount = self._cur.rowcount
+            if mode == "returning_id":
+                # executemany discards results; lastrowid is not tracked here.
+                rewritten = rewritten[: -len(_RETURNING_ID_SUFFIX)]
+            rows = [tuple(p) for p in seq_of_parameters]
+            self.rowcount = self._executemany_rows(rewritten, rows)
             return self
         except Exception as exc:
             raise _map_error(exc)
 
+    def _executemany_rows(self, sql: str, rows: list[tuple]) -> int:
+        batch = None
+        if EXECUTEMANY_MODE != "row" and len(rows) > 1:
+            batch = _parse_batch_insert(sql)
+
+        if batch is None:
+            self._cur.executemany(sql, rows)
+            return self._cur.rowcount
+
+        if (
+            EXECUTEMANY_MODE == "copy"
+            and batch["plain"]
+            and batch["columns"]
+            and _split_columns(batch["template"][1:-1]) == ["%s"] * len(batch["columns"])
+        ):
+            return self._copy_rows(batch["table"], batch["columns"], rows)
+
+        if batch["dedupe_key"] is not None:
+            rows = _dedupe_last(rows, batch["dedupe_key"])
+
+        stmt = f"{batch['head']}%s {batch['tail']}".rstrip()
+        total = 0
+        page_size = max(EXECUTEMANY_PAGE_SIZE, 1)
+        for i in range(0, len(rows), page_size):
+            _pg_extras.execute_values(
+                self._cur,
+                stmt,
+                rows[i:i + page_size],
+                template=batch["template"],
+                page_size=page_size,
+            )
+            total += max(self._cur.rowcount, 0)
+        return total
+
+    def _copy_rows(self, table: str, columns: list[str], rows: list[tuple]) -> int:
+        buf = io.StringIO()
+        for r in rows:
+            buf.write("\t".join(_copy_text(v) for v in r))
+            buf.write("\n")
+        buf.seek(0)
+        cols = ", ".join(columns)
+        self._cur.copy_expert(f"COPY {table} ({cols}) FROM STDIN", buf)
+        return len(rows)
+
     def executescript(self, script: str):
         for stmt in [s.strip() for s in script.split(";") if s.strip()]:
             self.execute(stmt)
@@ -422,47 +1105,88 @@ class Cursor:
         if row is None:
             return None
         if self._conn.row_factory is Row:
-            cols = [d[0] for d in (self.description or [])]
-            return _CompatRow(cols, row)
+            # Column names and the name->index map are shared by every row of
+            # a result set instead of being rebuilt per row.
+            description = self.description
+            if self._row_shape is None or self._row_shape[0] is not description:
+                cols = [d[0] for d in (description or [])]
+                self._row_shape = (description, cols, {k: i for i, k in enumerate(cols)})
+            _, cols, index = self._row_shape
+            return _CompatRow(cols, row, index)
         return row
 
+    def __iter__(self):
+        if self._returning_id:
+            return
+        if self._last_rows is not None:
+            while self._last_pos < len(self._last_rows):
+                row = self._last_rows[self._last_pos]
+                self._last_pos += 1
+                yield self._convert_row(row)
+            return
+        for row in self._cur:
+            yield self._convert_row(row)
+
+    def iter_batches(self, size: int | None = None):
+        """Yield lists of up to `size` rows (default: itersize) until exhausted."""
+        size = size or self.itersize
+        while True:
+            rows = self.fetchmany(size)
+            if not rows:
+                return
+            yield rows
+
     def fetchone(self):
+        if self._returning_id:
+            return None
         if self._last_rows is not None:
-            if not self._last_rows:
+            if self._last_pos >= len(self._last_rows):
                 return None
-            row = self._last_rows.pop(0)
+            row = self._last_rows[self._last_pos]
+            self._last_pos += 1
             return self._convert_row(row)
         row = self._cur.fetchone()
         return self._convert_row(row)
 
     def fetchall(self):
+        if self._returning_id:
+            return []
         if self._last_rows is not None:
-            rows = self._last_rows
-            self._last_rows = []
-            return [self._convert_row(r) for r in rows]
+            return [self._convert_row(r) for r in self._take_memory_rows(None)]
         rows = self._cur.fetchall()
         return [self._convert_row(r) for r in rows]
 
     def fetchmany(self, size=None):
+        if self._returning_id:
+            return []
         if self._last_rows is not None:
-            size = size or 1
-            rows = self._last_rows[:size]
-            self._last_rows = self._last_rows[size:]
-            return [self._convert_row(r) for r in rows]
-        rows = self._cur.fetchmany(size)
+            return [self._convert_row(r) for r in self._take_memory_rows(size or self.arraysize)]
+        rows = self._cur.fetchmany(size or self.arraysize)
         return [self._convert_row(r) for r in rows]
 
 
 class Connection:
-    def __init__(self, isolation_level=None):
-        self._raw = acquire_connection()
+    def __init__(self, isolation_level=None, raw=None):
+        # A caller-supplied raw connection is borrowed: close() leaves it to
+        # its owner (e.g. the request-scoped connection in api_server).
+        self._owns_raw = raw is None
+        self._raw = acquire_connection() if raw is None else raw
         self._closed = False
+        self._server_cursors = set()
         self.row_factory = None
         self.isolation_level = isolation_level
         self._raw.autocommit = isolation_level is None
 
-    def cursor(self):
-        return Cursor(self)
+    def cursor(self, server_side: bool = False, itersize: int | None = None):
+        return Cursor(self, server_side=server_side, itersize=itersize)
+
+    def _track_cursor(self, cur: "Cursor"):
+        # Server-side cursors are closed with the connection; WITH HOLD ones
+        # would otherwise outlive it on the pooled session.
+        self._server_cursors.add(cur)
+
+    def _untrack_cursor(self, cur: "Cursor"):
+        self._server_cursors.discard(cur)
 
     def execute(self, sql, parameters=None):
         cur = self.cursor()
@@ -490,6 +1214,11 @@ class Connection:
         if self._closed:
             return
         self._closed = True
+        for cur in list(self._server_cursors):
+            cur._close_named()
+        self._server_cursors.clear()
+        if not self._owns_raw:
+            return
         try:
             release_connection(self._raw)
         except Exception as exc:
@@ -515,6 +1244,24 @@ class Connection:
             pass
 
 
+# A web request holds one pooled connection for its whole lifetime (see
+# api_server.get_db). Autocommit connect() calls made while it is bound —
+# connectors, the destination router, run on the request's thread — borrow
+# it instead of taking a second one from the same bounded pool: with every
+# worker holding one connection and waiting for another, the pool runs dry
+# and requests stall until the pool timeout. Other threads don't see it.
+_bound_raw = contextvars.ContextVar("sqlite3_shim_bound_raw", default=None)
+
+
+def bind_connection(raw):
+    """Let autocommit connect() calls in this context borrow `raw`."""
+    _bound_raw.set(raw)
+
+
+def unbind_connection():
+    _bound_raw.set(None)
+
+
 def connect(
     database=None,
     timeout=None,
@@ -526,4 +1273,7 @@ def connect(
     uri=None,
 ):
     _ = (database, timeout, detect_types, check_same_thread, factory, cached_statements, uri)
+    raw = _bound_raw.get()
+    if raw is not None and isolation_level is None and not raw.closed:
+        return Connection(isolation_level=None, raw=raw)
     return Connection(isolation_level=isolation_level)